@@ -0,0 +1,340 @@
+"""
+Benchmarks for the TonePilot Streamlit app's hot paths.
+
+Drives the app script headlessly with Streamlit's AppTest against the deterministic fake
+engine and fake generator, so results are reproducible and need no model or network.
+Writes machine-readable JSON so releases can be compared.
+
+AppTest has no public way to rerun a single fragment, so fragment-scoped interactions use two
+of its internals: AppTest._fragment_storage and local_script_runner.RerunData. They were
+written against Streamlit 1.47 (TESTED_STREAMLIT). On a version without them the benchmark
+falls back to full-script reruns and records "fragment_scoped": false for the affected
+scenarios, and --compare flags scenarios measured with different rerun scopes.
+
+Usage:
+    python benchmarks/bench_app.py --repeat 10 --output bench.json
+    python benchmarks/bench_app.py --compare old.json new.json
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(REPO_ROOT, "src")
+APP_SCRIPT = os.path.join(SRC_DIR, "tonepilot_streamlit_app.py")
+# Streamlit release whose AppTest internals the fragment scoping below was written against
+TESTED_STREAMLIT = "1.47"
+SAMPLE_PROMPT = "I'm feeling overwhelmed with my workload and don't know how to prioritize my tasks."
+
+# Offline, deterministic pipeline for every benchmark run
+FAKE_ENV = {
+    "TONEPILOT_ENGINE": "fake",
+    "TONEPILOT_GENERATOR": "fake",
+    "TONEPILOT_FAKE_DELAY": "0",
+    # Persisted results would turn generate_full into a disk lookup
+    "TONEPILOT_STORE_PATH": "off",
+    # SAMPLE_PROMPT is a sample prompt; a built artifact would skip the pipeline entirely
+    "TONEPILOT_SAMPLE_RESULTS": os.devnull,
+}
+
+
+def summarize(samples_ms):
+    """Summary statistics for a list of millisecond timings"""
+    ordered = sorted(samples_ms)
+    return {
+        "runs": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": round(ordered[len(ordered) // 2], 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "min_ms": round(ordered[0], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def timed(fn):
+    """Run fn once and return (elapsed_ms, value)"""
+    started = time.perf_counter()
+    value = fn()
+    return (time.perf_counter() - started) * 1000, value
+
+
+def payload_bytes(node):
+    """Serialized size of every element the last run sent to the browser"""
+    proto = getattr(node, "proto", None)
+    children = getattr(node, "children", None)
+    if children:
+        return sum(payload_bytes(child) for child in children.values())
+    return len(proto.SerializeToString()) if proto is not None else 0
+
+
+def find_button(at, label):
+    return next(button for button in at.button if button.label == label)
+
+
+def find_toggle(at, label):
+    return next(toggle for toggle in at.toggle if toggle.label == label)
+
+
+def new_app():
+    from streamlit import config
+    from streamlit.testing.v1 import AppTest
+    # Match .streamlit/config.toml, which AppTest does not read
+    config.set_option("server.enableStaticServing", True)
+    return AppTest.from_file(APP_SCRIPT, default_timeout=60)
+
+
+def fragment_id(at, name):
+    """Id of the app's @st.fragment function called name, or None if it cannot be scoped to"""
+    from streamlit.testing.v1 import local_script_runner
+    # Private: AppTest exposes no public fragment lookup or scoped rerun (see the module docstring)
+    fragments = getattr(getattr(at, "_fragment_storage", None), "_fragments", None)
+    if fragments is None or not hasattr(local_script_runner, "RerunData"):
+        return None
+    for fid, fragment in fragments.items():
+        for cell in fragment.__closure__ or ():
+            try:
+                if getattr(cell.cell_contents, "__name__", None) == name:
+                    return fid
+            except ValueError:
+                continue
+    return None
+
+
+@contextmanager
+def scoped_to(fid):
+    """Make AppTest runs fragment-scoped, as a browser interaction inside that fragment is"""
+    if fid is None:
+        yield
+        return
+    from streamlit.testing.v1 import local_script_runner
+    original = local_script_runner.RerunData
+    local_script_runner.RerunData = functools.partial(original, fragment_id_queue=[fid])
+    try:
+        yield
+    finally:
+        local_script_runner.RerunData = original
+
+
+def interaction(at, fragment_name, action):
+    """Wrap action so it reruns only fragment_name when the app defines it, else the whole script"""
+    fid = fragment_id(at, fragment_name)
+
+    def run():
+        with scoped_to(fid):
+            return action()
+    run.fragment_scoped = fid is not None
+    return run
+
+
+def clear_streamlit_caches():
+    import streamlit as st
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+# Each scenario returns a callable that performs exactly the measured interaction
+def scenario_first_load():
+    clear_streamlit_caches()
+    at = new_app()
+    return at.run
+
+
+def scenario_random_sample():
+    at = new_app().run()
+    return interaction(at, "render_prompt_input", lambda: find_button(at, "🎲 Random Sample").click().run())
+
+
+def scenario_type_prompt():
+    at = new_app().run()
+    return interaction(at, "render_prompt_input", lambda: at.text_area[0].set_value(SAMPLE_PROMPT).run())
+
+
+def scenario_toggle_prompt_only():
+    at = new_app().run()
+    return interaction(at, "render_sidebar",
+                       lambda: find_toggle(at, "🧾 Prompt Only (No AI Response)").set_value(True).run())
+
+
+def scenario_generate_mobile():
+    at = new_app().run()
+    find_toggle(at, "📱 Mobile Mode (Demo Only)").set_value(True).run()
+    at.text_area[0].set_value(SAMPLE_PROMPT).run()
+    return interaction(at, "render_results", lambda: find_button(at, "🚀 Generate").click().run())
+
+
+def scenario_generate_full():
+    # Fresh caches so every run goes through both pipeline stages
+    clear_streamlit_caches()
+    at = new_app().run()
+    at.text_area[0].set_value(SAMPLE_PROMPT).run()
+    return interaction(at, "render_results", lambda: find_button(at, "🚀 Generate").click().run())
+
+
+# Interactions inside a fragment rerun only that fragment, like they do in the browser
+SCENARIOS = {
+    "first_load": scenario_first_load,
+    "random_sample": scenario_random_sample,
+    "type_prompt": scenario_type_prompt,
+    "toggle_prompt_only": scenario_toggle_prompt_only,
+    "generate_mobile": scenario_generate_mobile,
+    "generate_full": scenario_generate_full,
+}
+
+
+def bench_scenarios(repeat):
+    """Full script rerun time, peak traced memory and bytes sent for each interaction"""
+    results = {}
+    for name, setup in SCENARIOS.items():
+        samples = []
+        peaks_kb = []
+        fragment_scoped = None
+        for _ in range(repeat):
+            interaction = setup()
+            fragment_scoped = getattr(interaction, "fragment_scoped", None)
+            elapsed_ms, at = timed(interaction)
+            if at.exception:
+                raise RuntimeError(f"{name} raised in the app: {at.exception}")
+            samples.append(elapsed_ms)
+        sent_bytes = payload_bytes(at.main) + payload_bytes(at.sidebar)
+        # Memory is traced in a separate pass so tracing overhead never skews timings
+        for _ in range(max(1, repeat // 5)):
+            interaction = setup()
+            tracemalloc.start()
+            interaction()
+            peaks_kb.append(tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+        if fragment_scoped is False:
+            print(f"Warning: {name} fell back to full-script reruns (AppTest internals changed)", file=sys.stderr)
+        results[name] = dict(summarize(samples), peak_alloc_kb=round(max(peaks_kb), 1),
+                             payload_bytes=sent_bytes)
+        if fragment_scoped is not None:
+            results[name]["fragment_scoped"] = fragment_scoped
+    return results
+
+
+def bench_background_image(repeat):
+    """Cost of resolving the served background and size of the markup sent per rerun"""
+    import tempfile
+    from assets import background_css, ensure_static_assets
+
+    with tempfile.TemporaryDirectory() as static_dir:
+        cold_ms, assets = timed(lambda: ensure_static_assets(SRC_DIR, static_dir))
+        samples = [timed(lambda: ensure_static_assets(SRC_DIR, static_dir))[0] for _ in range(repeat)]
+    payload = background_css(assets["background"]) if assets["background"] else ""
+    return dict(summarize(samples), cold_build_ms=round(cold_ms, 3), payload_bytes=len(payload.encode("utf-8")))
+
+
+COLD_START_SNIPPET = """
+import sys, time, json
+sys.path.insert(0, {src!r})
+t0 = time.perf_counter()
+import streamlit
+import pipeline
+t1 = time.perf_counter()
+pipeline.build_engine()
+t2 = time.perf_counter()
+print(json.dumps({{"import_ms": (t1 - t0) * 1000, "engine_ms": (t2 - t1) * 1000}}))
+"""
+
+
+def bench_cold_start(repeat, real_engine):
+    """Imports plus engine construction in a fresh interpreter"""
+    env = dict(os.environ)
+    if real_engine:
+        env.pop("TONEPILOT_ENGINE", None)
+    imports, engines = [], []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START_SNIPPET.format(src=SRC_DIR)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        timing = json.loads(output.strip().splitlines()[-1])
+        imports.append(timing["import_ms"])
+        engines.append(timing["engine_ms"])
+    return {"imports": summarize(imports), "engine_construction": summarize(engines),
+            "engine": "tonepilot" if real_engine else "fake"}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(args):
+    import streamlit
+    if not streamlit.__version__.startswith(TESTED_STREAMLIT + "."):
+        print(f"Note: fragment scoping was written against Streamlit {TESTED_STREAMLIT}, running on {streamlit.__version__}",
+              file=sys.stderr)
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "streamlit": streamlit.__version__,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "scenarios": bench_scenarios(args.repeat),
+        "background_image": bench_background_image(args.repeat),
+        "cold_start": bench_cold_start(max(1, args.repeat // 2), args.real_engine),
+    }
+    return report
+
+
+def compare(old_path, new_path):
+    """Print mean-time changes between two benchmark reports"""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    for name, new_stats in new["scenarios"].items():
+        old_stats = old.get("scenarios", {}).get(name)
+        if not old_stats:
+            print(f"{name:20s} {new_stats['mean_ms']:10.2f} ms  (new)")
+            continue
+        change = (new_stats["mean_ms"] - old_stats["mean_ms"]) / old_stats["mean_ms"] * 100
+        # Only interactions inside a fragment carry the flag; older reports were always scoped
+        differs = "fragment_scoped" in new_stats and old_stats.get("fragment_scoped", True) != new_stats["fragment_scoped"]
+        note = "  (rerun scope differs, not comparable)" if differs else ""
+        print(f"{name:20s} {old_stats['mean_ms']:10.2f} -> {new_stats['mean_ms']:10.2f} ms  ({change:+.1f}%){note}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the TonePilot Streamlit app")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per scenario")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--real-engine", action="store_true", help="Time cold start with the real tonepilot engine")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two JSON reports")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    os.environ.update(FAKE_ENV)
+    # The app resolves its assets relative to the working directory, like `streamlit run`
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, SRC_DIR)
+    report = run_all(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Headless HTTP/JSON API for TonePilot.
+
+A small ASGI app over the same pipeline as the Streamlit UI:
+    POST /tag             {"text": ...}                  -> input and response tags
+    POST /prompt          {"text": ...}                  -> tags and final prompt
+    POST /generate        {"text": ..., "respond": true} -> full result, same shape as engine.run
+    POST /generate:batch  {"texts": [...], "respond": true} -> {"results": [...]}
+    GET  /health
+
+Set TONEPILOT_API_PORT to serve it from inside the Streamlit process, sharing the engine
+and caches with the UI, or run it on its own:
+    python src/api_server.py --port 8600
+uvicorn keeps HTTP/1.1 connections alive between requests, so clients should reuse them.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from gemini_client import GeminiError
+from model_server import ModelServerError
+from pipeline import StageUnavailable
+from worker_pool import QueueFull
+
+MAX_BODY_BYTES = 1024 * 1024
+KEEP_ALIVE_SECONDS = 30
+
+# Servers outlive a "Clear Cache & Restart" and are pointed at the new pipeline
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+class BadRequest(ValueError):
+    """Raised for a request body the API cannot use"""
+
+
+def _read_text(payload):
+    text = payload.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise BadRequest('"text" must be a non-empty string')
+    return text
+
+
+class TonePilotAPI:
+    """ASGI app; blocking pipeline calls run on a dedicated thread pool"""
+
+    def __init__(self, pipeline, max_threads=32, max_batch=64):
+        self.pipeline = pipeline
+        self.max_batch = max(1, int(max_batch))
+        self.executor = ThreadPoolExecutor(max(1, int(max_threads)), thread_name_prefix="tonepilot-api")
+        self.routes = {
+            ("GET", "/health"): self.health,
+            ("POST", "/tag"): self.tag,
+            ("POST", "/prompt"): self.prompt,
+            ("POST", "/generate"): self.generate,
+            ("POST", "/generate:batch"): self.generate_batch,
+        }
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def _local(self, text):
+        # Even the cache lookup leaves the event loop: with a model server it is a socket round trip
+        return await self._call(self.pipeline.run_local, text)
+
+    async def health(self, payload):
+        return {"status": "ok"}
+
+    async def tag(self, payload):
+        local = await self._local(_read_text(payload))
+        return {"input_tags": local.get("input_tags"), "response_tags": local.get("response_tags")}
+
+    async def prompt(self, payload):
+        return dict(await self._local(_read_text(payload)))
+
+    async def generate(self, payload):
+        return await self._call(self.pipeline.run, _read_text(payload), bool(payload.get("respond", True)))
+
+    async def generate_batch(self, payload):
+        texts = payload.get("texts")
+        if not isinstance(texts, list) or not texts:
+            raise BadRequest('"texts" must be a non-empty list of strings')
+        if len(texts) > self.max_batch:
+            raise BadRequest(f"At most {self.max_batch} texts per batch")
+        if not all(isinstance(text, str) and text.strip() for text in texts):
+            raise BadRequest('Every entry of "texts" must be a non-empty string')
+        respond = bool(payload.get("respond", True))
+
+        results = [None] * len(texts)
+        if respond:
+            cached = await self._call(lambda: [self.pipeline.cached_result(text) for text in texts])
+            results = [dict(result) if result is not None else None for result in cached]
+        pending = [index for index, result in enumerate(results) if result is None]
+        if not pending:
+            return {"results": results}
+        # Every uncached input is tagged in one engine batch
+        locals_ = await self._call(self.pipeline.run_local_many, [texts[index] for index in pending])
+        if not respond:
+            for index, local in zip(pending, locals_):
+                results[index] = dict(local)
+            return {"results": results}
+        # Remote generations run concurrently; one failure does not fail the batch
+        outcomes = await asyncio.gather(
+            *(self._call(self.pipeline.run_remote, texts[index], local) for index, local in zip(pending, locals_)),
+            return_exceptions=True,
+        )
+        for index, outcome in zip(pending, outcomes):
+            results[index] = {"error": str(outcome)} if isinstance(outcome, Exception) else outcome
+        return {"results": results}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        handler = self.routes.get((scope["method"], scope["path"]))
+        if handler is None:
+            allowed = any(path == scope["path"] for _, path in self.routes)
+            await self._send(send, 405 if allowed else 404, {"error": "Method not allowed" if allowed else "Not found"})
+            return
+        try:
+            payload = await self._read_json(receive) if scope["method"] == "POST" else {}
+            status, body = 200, await handler(payload)
+        except BadRequest as e:
+            status, body = 400, {"error": str(e)}
+        except QueueFull as e:
+            await self._send(send, 429, {"error": str(e)}, extra_headers=[(b"retry-after", b"1")])
+            return
+        except (StageUnavailable, ModelServerError) as e:
+            status, body = 503, {"error": str(e)}
+        except GeminiError as e:
+            status, body = (503 if e.retryable else 502), {"error": str(e)}
+        except Exception as e:
+            status, body = 500, {"error": f"Processing error: {e}"}
+        await self._send(send, status, body)
+
+    async def _read_json(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise BadRequest("Request body too large")
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        try:
+            payload = json.loads(b"".join(chunks) or b"{}")
+        except ValueError:
+            raise BadRequest("Request body must be JSON")
+        if not isinstance(payload, dict):
+            raise BadRequest("Request body must be a JSON object")
+        return payload
+
+    async def _send(self, send, status, body, extra_headers=()):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers + list(extra_headers)})
+        await send({"type": "http.response.body", "body": data})
+
+
+def build_api(pipeline):
+    """ASGI app for a pipeline, sized by TONEPILOT_API_THREADS and TONEPILOT_API_MAX_BATCH"""
+    return TonePilotAPI(
+        pipeline,
+        max_threads=int(os.getenv("TONEPILOT_API_THREADS", "32")),
+        max_batch=int(os.getenv("TONEPILOT_API_MAX_BATCH", "64")),
+    )
+
+
+def _server_config(app, host, port):
+    import uvicorn
+    return uvicorn.Config(app, host=host, port=port, lifespan="off", access_log=False,
+                          log_level="warning", timeout_keep_alive=KEEP_ALIVE_SECONDS)
+
+
+def start_api_server(pipeline, port, host="127.0.0.1"):
+    """Serve the API from a daemon thread of this process and return the app"""
+    import uvicorn
+    app = build_api(pipeline)
+    server = uvicorn.Server(_server_config(app, host, port))
+    threading.Thread(target=server.run, name="tonepilot-api-server", daemon=True).start()
+    return app
+
+
+def api_port():
+    return int(os.getenv("TONEPILOT_API_PORT", "0"))
+
+
+def serve_api_from_env(pipeline):
+    """Start (or re-point) the in-process API configured by TONEPILOT_API_PORT; None when off"""
+    port = api_port()
+    if not port:
+        return None
+    host = os.getenv("TONEPILOT_API_HOST", "127.0.0.1")
+    with _servers_lock:
+        app = _servers.get((host, port))
+        if app is not None:
+            app.pipeline = pipeline
+        else:
+            try:
+                app = _servers[(host, port)] = start_api_server(pipeline, port, host)
+            except ImportError:
+                print("TONEPILOT_API_PORT is set but uvicorn is not installed", file=sys.stderr)
+                return None
+    return app
+
+
+def build_standalone_pipeline(prompt_only=False):
+    """Pipeline with the same caches, pools and batching as the app, for a separate API process"""
+    from generation import build_generator
+    from micro_batcher import build_batcher
+    from model_server import ModelServerClient, RemoteCache, RemoteEngine, model_server_path
+    from pipeline import TonePilotPipeline, build_engine, run_local_batch
+    from result_cache import build_result_cache
+    from result_store import build_result_store, warm_count
+    from semantic_cache import build_semantic_cache
+    from worker_pool import build_local_pool, build_remote_pool
+
+    generator = None if prompt_only else build_generator()
+    local_pool = build_local_pool()
+    if model_server_path():
+        # Engine, caches and store live in the shared model server
+        client = ModelServerClient(model_server_path())
+        engine = RemoteEngine(client)
+        caches = dict(prompt_cache=RemoteCache(client, "prompt"), result_cache=RemoteCache(client, "result"))
+    else:
+        engine = build_engine()
+        caches = dict(
+            prompt_cache=build_result_cache(),
+            result_cache=build_result_cache(),
+            store=build_result_store(),
+            semantic_cache=build_semantic_cache(),
+        )
+    pipeline = TonePilotPipeline(
+        get_engine=lambda: engine,
+        get_generator=lambda: generator,
+        local_pool=local_pool,
+        remote_pool=build_remote_pool(),
+        batcher=build_batcher(lambda texts: run_local_batch(engine, texts), pool=local_pool),
+        **caches,
+    )
+    pipeline.warm_from_store(warm_count())
+    return pipeline
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the TonePilot pipeline over HTTP/JSON")
+    parser.add_argument("--host", default=os.getenv("TONEPILOT_API_HOST", "127.0.0.1"), help="Bind address")
+    parser.add_argument("--port", type=int, default=api_port() or 8600, help="Port (default: 8600)")
+    parser.add_argument("--prompt-only", action="store_true", help="Disable remote response generation")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    app = build_api(build_standalone_pipeline(prompt_only=args.prompt_only))
+    uvicorn.Server(_server_config(app, args.host, args.port)).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Static image assets for the app.
+
+Images are converted once per process into content-hashed files in the `static/` folder next
+to the main script. Streamlit serves that folder at app/static/ (server.enableStaticServing)
+with ETag/Last-Modified headers, so pages reference short URLs instead of inlining base64.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import sys
+
+STATIC_URL = "app/static"
+SMALL_BACKGROUND_WIDTH = 768
+LOGO_WIDTH = 400  # 2x the 200px display size for sharp logos on high-DPI screens
+
+
+def get_static_dir():
+    """Folder Streamlit serves as app/static - next to the main script that was launched"""
+    main_file = getattr(sys.modules.get("__main__"), "__file__", None)
+    base_dir = os.path.dirname(os.path.abspath(main_file)) if main_file else os.getcwd()
+    return os.path.join(base_dir, "static")
+
+
+def _content_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:10]
+
+
+def _save_variant(image, target, fmt, **options):
+    """Write one image variant unless it already exists; False if the format is unsupported"""
+    if os.path.exists(target):
+        return True
+    try:
+        image.save(target, fmt, **options)
+        return True
+    except (KeyError, OSError, ValueError):
+        # Pillow built without this encoder
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+
+
+def _resized(image, width):
+    if image.width <= width:
+        return image
+    height = round(image.height * width / image.width)
+    return image.resize((width, height))
+
+
+def build_image_variants(source, static_dir, name, variants):
+    """Copy source plus modern-format variants into static_dir, returning {variant: url}"""
+    digest = _content_hash(source)
+    extension = os.path.splitext(source)[1]
+    original = f"{name}-{digest}{extension}"
+    target = os.path.join(static_dir, original)
+    if not os.path.exists(target):
+        shutil.copyfile(source, target)
+    urls = {"original": f"{STATIC_URL}/{original}"}
+
+    try:
+        from PIL import Image
+    except ImportError:
+        # Without Pillow the original file is still served by URL
+        return urls
+
+    missing = {}
+    for variant, (suffix, fmt, width, options) in variants.items():
+        filename = f"{name}-{digest}{suffix}"
+        if os.path.exists(os.path.join(static_dir, filename)):
+            urls[variant] = f"{STATIC_URL}/{filename}"
+        else:
+            missing[variant] = (filename, fmt, width, options)
+    if not missing:
+        return urls
+
+    # Only decode the source image when a variant still has to be written
+    with Image.open(source) as image:
+        image.load()
+        for variant, (filename, fmt, width, options) in missing.items():
+            if _save_variant(_resized(image, width) if width else image,
+                             os.path.join(static_dir, filename), fmt, **options):
+                urls[variant] = f"{STATIC_URL}/{filename}"
+    return urls
+
+
+# No AVIF: app/static only sends its safe extensions with a real MIME type, and an
+# .avif would arrive as text/plain with nosniff, so browsers would drop the background
+BACKGROUND_VARIANTS = {
+    "webp": (".webp", "WEBP", None, {"quality": 80}),
+    "small_webp": (f"-{SMALL_BACKGROUND_WIDTH}.webp", "WEBP", SMALL_BACKGROUND_WIDTH, {"quality": 75}),
+}
+
+LOGO_VARIANTS = {
+    "webp": (f"-{LOGO_WIDTH}.webp", "WEBP", LOGO_WIDTH, {"quality": 90}),
+}
+
+
+def ensure_static_assets(source_dir, static_dir=None):
+    """Build the served background and logo files once and return their URLs"""
+    static_dir = static_dir or get_static_dir()
+    assets = {"background": None, "logo": None}
+    try:
+        os.makedirs(static_dir, exist_ok=True)
+    except OSError:
+        return assets
+    for name, variants in (("background", BACKGROUND_VARIANTS), ("logo", LOGO_VARIANTS)):
+        source = os.path.join(source_dir, f"{name}.png")
+        if not os.path.exists(source):
+            continue
+        try:
+            assets[name] = build_image_variants(source, static_dir, name, variants)
+        except OSError:
+            # Read-only or full disk: the page falls back to gradient/emoji styling
+            continue
+    return assets
+
+
+def _image_set(urls, order):
+    entries = [
+        f'url("{urls[variant]}") type("{mime}")'
+        for variant, mime in order
+        if variant in urls
+    ]
+    return f"image-set({', '.join(entries)})"
+
+
+def background_css(urls):
+    """Background rules referencing the served files (a few hundred bytes, not megabytes)"""
+    full = _image_set(urls, (("webp", "image/webp"), ("original", "image/png")))
+    small = _image_set(urls, (("small_webp", "image/webp"), ("original", "image/png")))
+    return f"""
+    .stApp {{
+        background-image: url("{urls['original']}");
+        background-image: {full};
+    }}
+    @media (max-width: 1280px) {{
+        .stApp {{
+            background-image: {small};
+        }}
+    }}
+    """
+
+
+def logo_html(urls, width=200):
+    """<picture> tag for the logo with a WebP source and the original as fallback"""
+    webp = urls.get("webp")
+    source = f'<source srcset="{webp}" type="image/webp">' if webp else ""
+    return (
+        f'<picture>{source}<img src="{urls["original"]}" width="{width}" height="{width}" '
+        f'alt="TonePilot logo"></picture>'
+    )
+
+
+def minify_css(css):
+    """Strip comments and redundant whitespace from a stylesheet"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def build_stylesheet(css_path, background_urls=None):
+    """Minify the theme plus background rules for inlining in a <style> tag.
+
+    The stylesheet is inlined rather than served from static/: app/static only sends
+    image, font, PDF, XML and JSON files with their real MIME type, and a .css file would
+    arrive as text/plain with nosniff, which browsers refuse to apply.
+    """
+    with open(css_path, encoding="utf-8") as f:
+        css = f.read()
+    if background_urls:
+        css += background_css(background_urls)
+    return minify_css(css)
+
+
+if __name__ == "__main__":
+    # Pre-build assets at deploy time: python src/assets.py
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    static_dir = os.path.join(os.path.dirname(src_dir), "static")
+    assets = ensure_static_assets(src_dir, static_dir)
+    print(assets)
@@ -0,0 +1,192 @@
+"""
+Headless batch runner for TonePilot.
+
+Streams records from a JSONL or CSV file through the same pipeline as the Streamlit app
+and writes one JSON result per line. Progress is checkpointed so a crashed run can resume;
+records that failed (API errors, timeouts) are retried on resume.
+
+Usage:
+    python src/batch_cli.py messages.jsonl -o results.jsonl --workers 8
+    python src/batch_cli.py messages.csv -o results.jsonl --text-field body --prompt-only
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from generation import build_generator
+from pipeline import TonePilotPipeline, build_engine
+from result_cache import build_result_cache
+from worker_pool import split_torch_threads
+
+
+def iter_records(path, text_field):
+    """Yield (record_id, text) pairs from a JSONL or CSV file without loading it all"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for index, row in enumerate(rows):
+            yield row.get("id", index), row.get(text_field) or ""
+
+
+def load_checkpoint(path):
+    """Return (records_done, output_bytes, failed_indices) from a checkpoint file, or zeros"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return data["records_done"], data["output_bytes"], data.get("failed", [])
+    except (OSError, ValueError, KeyError):
+        return 0, 0, []
+
+
+def save_checkpoint(path, records_done, output_bytes, failed=()):
+    """Atomically record how many records have been written and which of them failed"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"records_done": records_done, "output_bytes": output_bytes, "failed": sorted(failed)}, f)
+    os.replace(tmp_path, path)
+
+
+def process_record(pipeline, record_id, text, respond):
+    """Run one record through the pipeline, capturing errors in the output row"""
+    row = {"id": record_id, "text": text}
+    if not text.strip():
+        row["error"] = "empty text"
+        return row
+    try:
+        row.update(pipeline.run(text, respond=respond))
+    except Exception as e:
+        row["error"] = str(e)
+    return row
+
+
+def should_retry(row):
+    """Whether an output row is a failure worth retrying (empty input never succeeds)"""
+    return "error" in row and bool(row["text"].strip())
+
+
+def retry_failed(args, pipeline, executor, failed, output_bytes):
+    """Re-run failed records and rewrite their output lines in place
+
+    Returns (output_bytes, still_failed) for the rewritten output prefix.
+    """
+    wanted = set(failed)
+    futures = {
+        index: executor.submit(process_record, pipeline, record_id, text, not args.prompt_only)
+        for index, (record_id, text) in enumerate(iter_records(args.input, args.text_field))
+        if index in wanted
+    }
+    still_failed = set()
+    tmp_path = args.output + ".tmp"
+    with open(args.output, "rb") as src, open(tmp_path, "wb") as dst:
+        index = 0
+        # Only the checkpointed prefix; anything after it is a partial write
+        while src.tell() < output_bytes:
+            line = src.readline()
+            if index in futures:
+                row = futures[index].result()
+                if should_retry(row):
+                    still_failed.add(index)
+                line = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+            dst.write(line)
+            index += 1
+        output_bytes = dst.tell()
+    os.replace(tmp_path, args.output)
+    retried = len(futures) - len(still_failed)
+    print(f"retried {len(futures)} failed records ({retried} succeeded)", file=sys.stderr)
+    return output_bytes, still_failed
+
+
+def run_batch(args):
+    """Process the input file and return the number of records written"""
+    engine = build_engine()
+    # Workers call the engine concurrently; share the cores instead of oversubscribing them
+    split_torch_threads(args.workers)
+    generator = None if args.prompt_only else build_generator()
+    if not args.prompt_only and generator is None:
+        sys.exit("No API key found! Set GOOGLE_API_KEY or GEMINI_API_KEY, or pass --prompt-only")
+    pipeline = TonePilotPipeline(
+        get_engine=lambda: engine,
+        get_generator=lambda: generator,
+        prompt_cache=build_result_cache(),
+        result_cache=build_result_cache(),
+    )
+
+    checkpoint_path = args.checkpoint or args.output + ".ckpt"
+    records_done, output_bytes, failed = load_checkpoint(checkpoint_path) if args.resume else (0, 0, [])
+
+    resuming = records_done and os.path.exists(args.output)
+    if not resuming:
+        records_done, output_bytes, failed = 0, 0, []
+    failed = set(failed)
+    written = 0
+    started = time.perf_counter()
+    last_report = started
+    with ThreadPoolExecutor(args.workers) as executor:
+        if failed:
+            output_bytes, failed = retry_failed(args, pipeline, executor, failed, output_bytes)
+            save_checkpoint(checkpoint_path, records_done, output_bytes, failed)
+        with open(args.output, "r+b" if resuming else "wb") as out:
+            # Drop any partial lines written after the last checkpoint
+            out.seek(output_bytes)
+            out.truncate()
+            in_flight = deque()
+
+            def write_oldest():
+                nonlocal written, last_report
+                index, future = in_flight.popleft()
+                row = future.result()
+                if should_retry(row):
+                    failed.add(index)
+                out.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+                written += 1
+                if written % args.checkpoint_every == 0:
+                    out.flush()
+                    save_checkpoint(checkpoint_path, records_done + written, out.tell(), failed)
+                now = time.perf_counter()
+                if now - last_report >= args.report_every:
+                    last_report = now
+                    rate = written / (now - started)
+                    print(f"processed {records_done + written} records ({rate:.1f} rec/s)", file=sys.stderr)
+
+            for index, (record_id, text) in enumerate(iter_records(args.input, args.text_field)):
+                if index < records_done:
+                    continue
+                in_flight.append((index, executor.submit(process_record, pipeline, record_id, text, not args.prompt_only)))
+                # Bounded window keeps memory flat and output in input order
+                if len(in_flight) >= args.workers * 4:
+                    write_oldest()
+            while in_flight:
+                write_oldest()
+            out.flush()
+            save_checkpoint(checkpoint_path, records_done + written, out.tell(), failed)
+
+    elapsed = time.perf_counter() - started
+    rate = written / elapsed if elapsed else 0.0
+    print(f"done: {written} records in {elapsed:.1f}s ({rate:.1f} rec/s), {len(failed)} failed", file=sys.stderr)
+    return written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run TonePilot over a JSONL or CSV corpus")
+    parser.add_argument("input", help="Input .jsonl or .csv file")
+    parser.add_argument("-o", "--output", required=True, help="Output .jsonl file")
+    parser.add_argument("--text-field", default="text", help="Field holding the message text (default: text)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Parallel workers")
+    parser.add_argument("--prompt-only", action="store_true", help="Skip remote response generation")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint, retrying failed records")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.ckpt)")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="Records between checkpoints")
+    parser.add_argument("--report-every", type=float, default=5.0, help="Seconds between progress reports")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run_batch(parse_args())
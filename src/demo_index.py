@@ -0,0 +1,106 @@
+"""
+Similarity index for mobile/demo mode canned results.
+
+Prompts are embedded as hashed TF-IDF vectors (word unigrams, word bigrams and character
+trigrams of the content words) in one contiguous NumPy matrix. A lookup is then a single matrix-vector product,
+which stays well under a millisecond for thousands of canned results.
+"""
+
+import os
+import re
+import zlib
+
+import numpy as np
+
+DEFAULT_DIMENSIONS = 512
+# Unrelated prompts score about 0.1 against the canned set once stopwords are dropped
+DEFAULT_THRESHOLD = 0.3
+
+_WORD_RE = re.compile(r"\w+")
+
+# With only a handful of canned prompts IDF cannot tell that "I", "my" or "how" carry no
+# meaning, so they are dropped before embedding. Includes the pieces \w+ splits contractions into.
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further
+had has have having he her here hers herself him himself his how i if in into is it its
+itself just me more most my myself now of off on once only or other our ours ourselves out
+over own same she should so some such than that the their theirs them themselves then there
+these they this those through to too under until up very was we were what when where which
+while who whom why will with would you your yours yourself yourselves
+d don ll m re s t ve
+""".split())
+
+
+def _features(text, stopwords=None):
+    """Word unigrams, word bigrams and character trigrams of a normalized prompt
+
+    Words in stopwords are skipped, unless that would leave nothing to embed.
+    """
+    words = _WORD_RE.findall((text or "").casefold())
+    if stopwords:
+        words = [word for word in words if word not in stopwords] or words
+    features = list(words)
+    features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    return features
+
+
+class DemoIndex:
+    """Nearest canned result by cosine similarity over hashed TF-IDF vectors"""
+
+    def __init__(self, entries, dimensions=DEFAULT_DIMENSIONS, threshold=DEFAULT_THRESHOLD):
+        # entries maps a canned prompt to its result dict
+        self.dimensions = dimensions
+        self.threshold = threshold
+        self.prompts = list(entries)
+        self.results = [entries[prompt] for prompt in self.prompts]
+
+        counts = np.zeros((len(self.prompts), dimensions), dtype=np.float32)
+        for row, prompt in enumerate(self.prompts):
+            self._accumulate(counts[row], prompt)
+        document_frequency = np.count_nonzero(counts, axis=0)
+        self.idf = (np.log((1 + len(self.prompts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.matrix = self._normalize(counts * self.idf)
+
+    def _accumulate(self, vector, text):
+        for feature in _features(text, STOPWORDS):
+            vector[zlib.crc32(feature.encode("utf-8")) % self.dimensions] += 1.0
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def embed(self, text):
+        """TF-IDF vector of a query, L2-normalized"""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        self._accumulate(vector, text)
+        return self._normalize(vector * self.idf)
+
+    def search(self, text, top_k=1):
+        """Return up to top_k (score, prompt, result) tuples, best first"""
+        if not self.prompts:
+            return []
+        scores = self.matrix @ self.embed(text)
+        if top_k == 1:
+            best = [int(np.argmax(scores))]
+        else:
+            best = np.argsort(scores)[::-1][:top_k]
+        return [(float(scores[i]), self.prompts[i], self.results[i]) for i in best]
+
+    def best_match(self, text):
+        """Best canned result scoring at least the threshold, or None"""
+        matches = self.search(text)
+        if matches and matches[0][0] >= self.threshold:
+            return matches[0][2]
+        return None
+
+
+def build_demo_index(entries):
+    """Build the index with TONEPILOT_DEMO_MATCH_THRESHOLD applied"""
+    threshold = float(os.getenv("TONEPILOT_DEMO_MATCH_THRESHOLD", str(DEFAULT_THRESHOLD)))
+    return DemoIndex(entries, threshold=threshold)
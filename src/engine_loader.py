@@ -0,0 +1,61 @@
+"""
+One-time TonePilot engine construction that can start in the background.
+Every caller waits on the same in-flight load, so the engine is never built twice.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+
+class EngineLoader:
+    """Builds the engine once, either eagerly (warm-up) or on first use"""
+
+    def __init__(self, build_fn):
+        self._build_fn = build_fn
+        self._lock = threading.Lock()
+        self._future = None
+        self.started_at = None
+        self.duration_seconds = None
+        self.error = None
+
+    def start(self):
+        """Start loading in a background thread if no load is running or done"""
+        with self._lock:
+            if self._future is not None:
+                return self._future
+            self._future = Future()
+            self.started_at = time.time()
+        threading.Thread(target=self._load, name="tonepilot-warmup", daemon=True).start()
+        return self._future
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            engine = self._build_fn()
+        except Exception as e:
+            # A failed load reports None, matching the old get_tonepilot_engine() contract
+            self.error = str(e)
+            engine = None
+        self.duration_seconds = time.perf_counter() - started
+        self._future.set_result(engine)
+
+    def get(self, timeout=None):
+        """Return the engine, joining an in-flight load instead of starting a second one"""
+        return self.start().result(timeout)
+
+    def status(self):
+        """One of 'idle', 'warming', 'ready' or 'failed'"""
+        with self._lock:
+            future = self._future
+        if future is None:
+            return "idle"
+        if not future.done():
+            return "warming"
+        return "ready" if future.result() is not None else "failed"
+
+
+def warmup_enabled():
+    """Whether TONEPILOT_WARMUP asks for the engine to load at startup"""
+    return os.getenv("TONEPILOT_WARMUP", "").lower() in ("1", "true", "yes")
@@ -0,0 +1,59 @@
+"""
+Deterministic stand-in for TonePilotEngine.
+Used by benchmarks and offline runs (TONEPILOT_ENGINE=fake) - no model download, no network.
+"""
+
+import hashlib
+from collections import namedtuple
+
+EMOTIONS = ("anxious", "curious", "excited", "frustrated", "hopeful", "lonely", "overwhelmed", "sad")
+PERSONALITIES = ("empathetic_listener", "confident_mentor", "nurturing_teacher", "supportive", "encouraging")
+
+# Fields of tonepilot's PromptData that the pipeline reads
+PromptData = namedtuple("PromptData", "final_prompt response_length")
+
+
+class FakePromptBuilder:
+    """Stand-in for tonepilot's PromptBuilder, in the same prompt format"""
+
+    def blend(self, input_text, response_tags, weights):
+        traits = ", ".join(name.replace("_", " ") for name in response_tags)
+        response_length = 40 + int(sum(weights.values()) * 100) % 80
+        personality = f"Respond as a {traits} voice. Acknowledge how the user feels and offer practical support."
+        return PromptData(f"{personality}\nUser: {input_text}\nAssistant: (Aim to respond in about {response_length} words)",
+                          response_length)
+
+
+class FakeTonePilotEngine:
+    """Same run() result shape as TonePilotEngine, derived from a hash of the input"""
+
+    def __init__(self, mode='gemini', respond=False):
+        self.mode = mode
+        self.respond = respond
+        self.mapper_mode = "fake"
+        self.prompt_builder = FakePromptBuilder()
+
+    def run(self, input_text):
+        digest = hashlib.sha256(input_text.encode("utf-8")).digest()
+        input_tags = {
+            EMOTIONS[digest[i] % len(EMOTIONS)]: round(0.5 + digest[i + 3] / 510, 2)
+            for i in range(3)
+        }
+        response_tags = {PERSONALITIES[digest[i] % len(PERSONALITIES)]: True for i in range(3, 6)}
+        response_weights = {name: round(0.1 + digest[i + 6] / 1275, 3) for i, name in enumerate(response_tags)}
+        prompt_data = self.prompt_builder.blend(input_text, response_tags, response_weights)
+        result = {
+            "input_text": input_text,
+            "input_tags": input_tags,
+            "response_tags": response_tags,
+            "response_weights": response_weights,
+            "final_prompt": prompt_data.final_prompt,
+            "response_length": prompt_data.response_length,
+            "mapper_mode": self.mapper_mode,
+        }
+        if self.respond:
+            result["response_text"] = "Thank you for sharing that. Let's take it one step at a time."
+        return result
+
+    def run_batch(self, input_texts):
+        return [self.run(text) for text in input_texts]
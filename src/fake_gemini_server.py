@@ -0,0 +1,125 @@
+"""
+Local stand-in for the Gemini REST API.
+Answers generateContent and streamGenerateContent (SSE) with a canned reply, plus an
+OpenAI-compatible /chat/completions for the second HTTP backend, with optional
+latency and a share of failing requests, so the client's pooling, retries and hedging can be
+exercised offline:
+
+    python src/fake_gemini_server.py --port 8700 --latency 0.5 --fail-rate 0.2
+    GEMINI_BASE_URL=http://127.0.0.1:8700/v1beta GEMINI_API_KEY=fake streamlit run streamlit_app.py
+    OPENAI_BASE_URL=http://127.0.0.1:8700/v1 streamlit run streamlit_app.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _instruction(prompt):
+    # TonePilot prompts put the tone instruction before the "User:" turn
+    return (prompt or "").split("User:", 1)[0].strip() or "Responding with warmth and care."
+
+
+def _reply(body):
+    contents = body.get("contents") or [{}]
+    prompt = (contents[-1].get("parts") or [{}])[0].get("text")
+    return f"Thank you for sharing that. (fake Gemini) {_instruction(prompt)}"
+
+
+def _chat_reply(body):
+    prompt = next((m.get("content") for m in reversed(body.get("messages", [])) if m.get("role") == "user"), None)
+    return f"Thank you for sharing that. (fake chat) {_instruction(prompt)}"
+
+
+def _payload(text):
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+def _chat_payload(text, stream):
+    key = "delta" if stream else "message"
+    return {"choices": [{"index": 0, key: {"role": "assistant", "content": text}}]}
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.lock:
+            server.requests += 1
+        if server.latency:
+            time.sleep(random.uniform(0.5, 1.5) * server.latency)
+        if random.random() < server.fail_rate:
+            self._send_json(random.choice((429, 503)), {"error": {"message": "fake transient failure"}})
+            return
+        if self.path.endswith("/chat/completions"):
+            text, stream = _chat_reply(body), bool(body.get("stream"))
+            make_payload = lambda chunk: _chat_payload(chunk, stream)
+        else:
+            text, stream = _reply(body), ":streamGenerateContent" in self.path
+            make_payload = _payload
+        if not stream:
+            self._send_json(200, make_payload(text))
+            return
+        events = [f"data: {json.dumps(make_payload(word if i == 0 else ' ' + word))}\r\n\r\n"
+                  for i, word in enumerate(text.split(" "))]
+        if self.path.endswith("/chat/completions"):
+            events.append("data: [DONE]\r\n\r\n")
+        data = "".join(events).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading part way through the stream
+            self.close_connection = True
+
+
+def start_fake_gemini(port=0, latency=0.0, fail_rate=0.0, host="127.0.0.1"):
+    """Serve the fake API from a daemon thread; returns the server (base URL in .base_url)"""
+    server = ThreadingHTTPServer((host, port), FakeGeminiHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.fail_rate = fail_rate
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1beta"
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a fake Gemini REST API for offline testing")
+    parser.add_argument("--port", type=int, default=8700, help="Port (default: 8700)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean seconds of delay per request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with 429/503")
+    args = parser.parse_args(argv)
+    server = start_fake_gemini(args.port, args.latency, args.fail_rate)
+    print(f"Fake Gemini API at {server.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Managed HTTP client for the Gemini REST API.
+
+One client is shared by every session. It keeps HTTP/1.1 connections alive in a small pool,
+caps concurrent calls with a semaphore, paces calls with a token bucket sized to the API
+quota and retries transient failures with jittered exponential backoff. Optionally, a
+`generateContent` call that is still running after the recent p95 latency gets a hedged
+duplicate, and whichever answer arrives first is used. Other JSON-over-HTTP providers reuse
+the same client with their own auth headers (see generation.py).
+"""
+
+import http.client
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+LATENCY_WINDOW = 200
+
+
+class GeminiError(RuntimeError):
+    """Raised when a Gemini call fails; `retryable` marks transient failures"""
+
+    def __init__(self, message, status=None, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def _error_message(raw):
+    try:
+        return json.loads(raw).get("error", {}).get("message") or raw.decode("utf-8", "replace")
+    except (ValueError, AttributeError):
+        return raw.decode("utf-8", "replace")
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available right now"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, timeout=None):
+        """Wait for a token; False if none became available within timeout seconds"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                delay = (1 - self._tokens) / self.rate
+            if deadline is not None and now + delay > deadline:
+                return False
+            time.sleep(delay)
+
+
+class ConnectionPool:
+    """Keep-alive connections to one host, handed out one caller at a time"""
+
+    def __init__(self, base_url, max_idle=16, timeout=60):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path_prefix = parts.path.rstrip("/")
+        self.max_idle = max(0, int(max_idle))
+        self.timeout = timeout
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def acquire(self):
+        """Return (connection, was_reused)"""
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop(), True
+            self.opened += 1
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout), False
+
+    def release(self, connection, reusable=True):
+        """Put a connection back for reuse, or close it"""
+        if reusable:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(connection)
+                    return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection in idle:
+            connection.close()
+
+
+class GeminiClient:
+    """Pooled, rate-limited, retrying Gemini client shared by all sessions"""
+
+    def __init__(self, base_url, api_key, timeout=60, max_concurrency=16, rate_per_second=None,
+                 burst=None, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 hedge=False, hedge_min_samples=20, name="Gemini", auth_headers=None):
+        self.name = name
+        self.headers = {"Content-Type": "application/json"}
+        self.headers.update(auth_headers if auth_headers is not None else {"x-goog-api-key": api_key})
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.pool = ConnectionPool(base_url, max_idle=max_concurrency, timeout=timeout)
+        self._slots = threading.BoundedSemaphore(max(1, int(max_concurrency)))
+        self.rate_limiter = TokenBucket(rate_per_second, burst) if rate_per_second else None
+        # Hedged calls need a second thread while the caller waits on the first
+        self._hedge_executor = ThreadPoolExecutor(max(2, int(max_concurrency) * 2), thread_name_prefix="tonepilot-gemini")
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def p95_seconds(self):
+        """p95 of recent successful call latencies, or None before enough samples"""
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(self.backoff_max, retry_after)
+        # Full jitter keeps many sessions from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _open(self, path, body, wait_for_rate=True):
+        """Send one request; return (connection, response) for a 200, raise GeminiError otherwise"""
+        if self.rate_limiter is not None:
+            if wait_for_rate:
+                self.rate_limiter.acquire()
+            elif not self.rate_limiter.try_acquire():
+                raise GeminiError(f"{self.name} rate limit reached", retryable=True)
+        connection, _ = self.pool.acquire()
+        try:
+            connection.request("POST", self.pool.path_prefix + path, body=body, headers=self.headers)
+            response = connection.getresponse()
+        except (OSError, http.client.HTTPException) as e:
+            self.pool.release(connection, reusable=False)
+            # A stale keep-alive connection fails on first use, which is always worth a retry
+            raise GeminiError(f"Could not reach {self.name}: {e}", retryable=True) from e
+        if response.status != 200:
+            raw = response.read()
+            self.pool.release(connection, reusable=not response.will_close)
+            retry_after = response.getheader("Retry-After")
+            raise GeminiError(f"{self.name} API error {response.status}: {_error_message(raw)}",
+                              status=response.status, retryable=response.status in RETRYABLE_STATUSES,
+                              retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        return connection, response
+
+    def _post_once(self, path, body, wait_for_rate=True):
+        with self._slots:
+            started = time.perf_counter()
+            connection, response = self._open(path, body, wait_for_rate)
+            try:
+                payload = json.loads(response.read().decode("utf-8"))
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                self.pool.release(connection, reusable=False)
+                raise GeminiError(f"Incomplete {self.name} response: {e}", retryable=True) from e
+            self.pool.release(connection, reusable=not response.will_close)
+        with self._lock:
+            self._latencies.append(time.perf_counter() - started)
+        return payload
+
+    def _post_hedged(self, path, body):
+        """Start a duplicate call when the first is slower than p95; first success wins"""
+        threshold = self.p95_seconds() if self.hedge else None
+        if threshold is None:
+            return self._post_once(path, body)
+        primary = self._hedge_executor.submit(self._post_once, path, body)
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+        self._count("hedged")
+        # The hedge never waits on the rate limiter, so it cannot eat into the quota for new requests
+        hedge = self._hedge_executor.submit(self._post_once, path, body, False)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except GeminiError as e:
+                    # Report the original call's error unless it succeeded
+                    if future is primary or error is None:
+                        error = e
+                    continue
+                if future is hedge:
+                    self._count("hedge_wins")
+                return result
+        raise error
+
+    def _with_retries(self, attempt_fn):
+        self._count("calls")
+        attempt = 0
+        while True:
+            try:
+                return attempt_fn()
+            except GeminiError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                time.sleep(self._backoff(attempt, e.retry_after))
+                attempt += 1
+                self._count("retries")
+
+    def post(self, path, payload):
+        """POST a JSON payload and return the decoded JSON response"""
+        body = json.dumps(payload).encode("utf-8")
+        return self._with_retries(lambda: self._post_hedged(path, body))
+
+    def stream_lines(self, path, payload):
+        """POST a JSON payload and yield the response body line by line"""
+        body = json.dumps(payload).encode("utf-8")
+
+        def open_stream():
+            self._slots.acquire()
+            try:
+                return self._open(path, body)
+            except BaseException:
+                self._slots.release()
+                raise
+
+        # Retries only cover opening the stream; once text has been shown it is not repeated
+        connection, response = self._with_retries(open_stream)
+        finished = False
+        try:
+            for line in response:
+                yield line
+            finished = True
+        except (OSError, http.client.HTTPException) as e:
+            raise GeminiError(f"{self.name} stream interrupted: {e}") from e
+        finally:
+            # A stream abandoned part way leaves unread bytes on the connection, so drop it
+            self.pool.release(connection, reusable=finished and not response.will_close)
+            self._slots.release()
+
+    def stats(self):
+        """Snapshot of call, retry and hedge counts for display"""
+        p95 = self.p95_seconds()
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "failures": self.failures,
+                "connections_opened": self.pool.opened,
+                "connections_reused": self.pool.reused,
+                "p95_ms": p95 * 1000 if p95 is not None else None,
+            }
+
@@ -0,0 +1,378 @@
+"""
+Response generation backends for the TonePilot pipeline.
+Gemini and OpenAI-compatible providers are called over their REST APIs, and a small
+CPU-only local model (opt-in, about 2 GB in memory) covers full mode without network
+access. build_generator() puts every configured backend behind a latency-aware router
+(see generation_router.py).
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+from gemini_client import GeminiClient
+from generation_router import GenerationRouter
+
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+DEFAULT_GEMINI_MODEL = "gemini-2.0-flash"
+OPENAI_API_BASE = "https://api.openai.com/v1"
+DEFAULT_OPENAI_MODEL = "gpt-4o-mini"
+DEFAULT_LOCAL_MODEL = "Qwen/Qwen2.5-0.5B-Instruct"
+# The local model is opt-in: add "local" to TONEPILOT_GENERATORS to load it
+DEFAULT_GENERATORS = "gemini,openai"
+
+
+def get_api_key():
+    """Return the Gemini API key from the environment, if any"""
+    return os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY')
+
+
+# Sampling settings of tonepilot's GeminiResponder
+GENERATION_CONFIG = {"temperature": 0.7, "topP": 0.8, "topK": 40}
+ASSISTANT_MARKER = "Assistant:"
+
+
+def prepare_prompt(final_prompt, user_input):
+    """The text sent to the model: the blended prompt, which already ends with the user turn"""
+    return (final_prompt or user_input).replace("\n\n", "\n").strip()
+
+
+def max_output_tokens(response_length):
+    """Twice the suggested response length, like tonepilot's responder (None = provider default)"""
+    return int(response_length) * 2 if response_length else None
+
+
+def build_request_body(final_prompt, user_input, response_length=None):
+    """Gemini request with the TonePilot prompt as the single user turn"""
+    config = dict(GENERATION_CONFIG)
+    if response_length:
+        config["maxOutputTokens"] = max_output_tokens(response_length)
+    return {
+        "contents": [{"role": "user", "parts": [{"text": prepare_prompt(final_prompt, user_input)}]}],
+        "generationConfig": config,
+    }
+
+
+def extract_response(text):
+    """Keep only the reply after an echoed "Assistant:" marker"""
+    text = text.strip()
+    if ASSISTANT_MARKER in text:
+        return text.split(ASSISTANT_MARKER, 1)[1].strip()
+    return text
+
+
+def strip_assistant_marker(chunks):
+    """Streaming version of extract_response: drops an "Assistant:" the reply starts with"""
+    # Only the start is checked, so streaming never has to hold back text it already has
+    buffer = ""
+    started = False
+    for chunk in chunks:
+        if started:
+            yield chunk
+            continue
+        buffer += chunk
+        head = buffer.lstrip()
+        if ASSISTANT_MARKER.startswith(head):
+            continue
+        if head.startswith(ASSISTANT_MARKER):
+            head = head[len(ASSISTANT_MARKER):].lstrip()
+        if head:
+            started = True
+            yield head
+    if not started and extract_response(buffer):
+        yield extract_response(buffer)
+
+
+def extract_text(payload):
+    """Concatenate the text parts of the first candidate in a Gemini response"""
+    candidates = payload.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = candidates[0].get("content", {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+def build_chat_messages(final_prompt, user_input):
+    """Chat-completions messages with the TonePilot prompt as the single user turn"""
+    return [{"role": "user", "content": prepare_prompt(final_prompt, user_input)}]
+
+
+def extract_chat_text(payload):
+    """Text of the first choice in a chat-completions response or stream event"""
+    choices = payload.get("choices") or []
+    if not choices:
+        return ""
+    message = choices[0].get("delta") or choices[0].get("message") or {}
+    return message.get("content") or ""
+
+
+def iter_sse_payloads(lines):
+    """Decode the JSON payload of each `data:` event in a server-sent event stream"""
+    for raw_line in lines:
+        line = raw_line.decode("utf-8") if isinstance(raw_line, bytes) else raw_line
+        line = line.strip()
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data and data != "[DONE]":
+            yield json.loads(data)
+
+
+class GeminiGenerator:
+    """Gemini client for the remote generation stage"""
+
+    def __init__(self, api_key, model=None, base_url=None, timeout=60, client=None):
+        self.model = model or os.getenv("GEMINI_MODEL", DEFAULT_GEMINI_MODEL)
+        base_url = (base_url or os.getenv("GEMINI_BASE_URL", GEMINI_API_BASE)).rstrip("/")
+        # Pooled connections, rate limiting and retries are shared by every call (see gemini_client.py)
+        self.client = client or GeminiClient(base_url, api_key, timeout=timeout)
+
+    def generate(self, final_prompt, user_input, response_length=None):
+        """Generate a full response for the given prompt"""
+        payload = self.client.post(f"/models/{self.model}:generateContent",
+                                   build_request_body(final_prompt, user_input, response_length))
+        return extract_response(extract_text(payload))
+
+    def stream(self, final_prompt, user_input, response_length=None):
+        """Yield response text chunks as Gemini produces them"""
+        lines = self.client.stream_lines(f"/models/{self.model}:streamGenerateContent?alt=sse",
+                                         build_request_body(final_prompt, user_input, response_length))
+        chunks = (extract_text(payload) for payload in iter_sse_payloads(lines))
+        yield from strip_assistant_marker(chunk for chunk in chunks if chunk)
+
+
+class OpenAICompatibleGenerator:
+    """Chat-completions client for OpenAI and compatible HTTP providers (Groq, vLLM, Ollama, ...)"""
+
+    def __init__(self, client, model=None):
+        self.model = model or os.getenv("OPENAI_MODEL", DEFAULT_OPENAI_MODEL)
+        self.client = client
+
+    def _body(self, final_prompt, user_input, response_length, stream):
+        body = {
+            "model": self.model,
+            "messages": build_chat_messages(final_prompt, user_input),
+            "temperature": GENERATION_CONFIG["temperature"],
+            "top_p": GENERATION_CONFIG["topP"],
+            "stream": stream,
+        }
+        if response_length:
+            body["max_tokens"] = max_output_tokens(response_length)
+        return body
+
+    def generate(self, final_prompt, user_input, response_length=None):
+        """Generate a full response for the given prompt"""
+        payload = self.client.post("/chat/completions", self._body(final_prompt, user_input, response_length, False))
+        return extract_response(extract_chat_text(payload))
+
+    def stream(self, final_prompt, user_input, response_length=None):
+        """Yield response text chunks as the provider produces them"""
+        lines = self.client.stream_lines("/chat/completions", self._body(final_prompt, user_input, response_length, True))
+        chunks = (extract_chat_text(payload) for payload in iter_sse_payloads(lines))
+        yield from strip_assistant_marker(chunk for chunk in chunks if chunk)
+
+
+class LocalGenerator:
+    """Small instruction-tuned model run on CPU with transformers, loaded on first use"""
+
+    def __init__(self, model_name=DEFAULT_LOCAL_MODEL, max_new_tokens=256, token_timeout=60.0):
+        self.model_name = model_name
+        self.max_new_tokens = max_new_tokens
+        # Longest wait for the next token before the stream gives up on a stuck model
+        self.token_timeout = token_timeout
+        self._model = None
+        self._tokenizer = None
+        self._load_lock = threading.Lock()
+        # One generation at a time: a CPU model gains nothing from running calls side by side
+        self._run_lock = threading.Lock()
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is None:
+                from transformers import AutoModelForCausalLM, AutoTokenizer
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self._model = AutoModelForCausalLM.from_pretrained(self.model_name)
+                self._model.eval()
+        return self._model, self._tokenizer
+
+    def _inputs(self, tokenizer, final_prompt, user_input):
+        text = tokenizer.apply_chat_template(build_chat_messages(final_prompt, user_input),
+                                             tokenize=False, add_generation_prompt=True)
+        return tokenizer(text, return_tensors="pt")
+
+    def generate(self, final_prompt, user_input, response_length=None):
+        """Generate a full response for the given prompt"""
+        return extract_response("".join(self.stream(final_prompt, user_input, response_length)))
+
+    def stream(self, final_prompt, user_input, response_length=None):
+        """Yield decoded text as the local model produces tokens"""
+        yield from strip_assistant_marker(self._stream_tokens(final_prompt, user_input, response_length))
+
+    def _stream_tokens(self, final_prompt, user_input, response_length):
+        from transformers import TextIteratorStreamer
+        model, tokenizer = self._load()
+        inputs = self._inputs(tokenizer, final_prompt, user_input)
+        streamer = TextIteratorStreamer(tokenizer, timeout=self.token_timeout, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+
+        def run():
+            try:
+                model.generate(
+                    **inputs,
+                    streamer=streamer,
+                    max_new_tokens=max_output_tokens(response_length) or self.max_new_tokens,
+                    do_sample=True,
+                    temperature=GENERATION_CONFIG["temperature"],
+                    top_p=GENERATION_CONFIG["topP"],
+                    top_k=GENERATION_CONFIG["topK"],
+                )
+            except BaseException as e:
+                errors.append(e)
+                # Without an end marker the reader would wait for tokens that never come
+                streamer.end()
+
+        with self._run_lock:
+            worker = threading.Thread(target=run, name="tonepilot-local-generate", daemon=True)
+            worker.start()
+            try:
+                for chunk in streamer:
+                    if chunk:
+                        yield chunk
+            except queue.Empty:
+                raise TimeoutError(f"Local model {self.model_name} produced no token for {self.token_timeout:g}s") from None
+            worker.join()
+            if errors:
+                raise errors[0]
+
+
+class FakeGenerator:
+    """Offline generator that streams a canned reply word by word (no network)"""
+
+    def __init__(self, delay_seconds=0.02):
+        self.delay_seconds = delay_seconds
+
+    def _reply(self, final_prompt, user_input):
+        return (
+            "Thank you for sharing that. Here is a thoughtful response shaped by the "
+            f"instruction: {(final_prompt or '').split('User:', 1)[0].strip() or 'respond with warmth and care.'}"
+        )
+
+    def generate(self, final_prompt, user_input, response_length=None):
+        """Return the whole canned reply at once"""
+        return "".join(self.stream(final_prompt, user_input, response_length))
+
+    def stream(self, final_prompt, user_input, response_length=None):
+        """Yield the canned reply one word at a time"""
+        for i, word in enumerate(self._reply(final_prompt, user_input).split(" ")):
+            if self.delay_seconds:
+                time.sleep(self.delay_seconds)
+            yield word if i == 0 else " " + word
+
+
+def _http_client(base_url, api_key, name, auth_headers=None):
+    """Pooled, retrying client with the shared GEMINI_* connection and rate settings"""
+    return GeminiClient(
+        base_url.rstrip("/"),
+        api_key,
+        timeout=float(os.getenv("GEMINI_TIMEOUT", "60")),
+        max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", os.getenv("TONEPILOT_REMOTE_WORKERS", "16"))),
+        rate_per_second=float(os.getenv("GEMINI_RATE_LIMIT", "0")) or None,
+        burst=int(os.getenv("GEMINI_RATE_BURST", "0")) or None,
+        max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+        hedge=os.getenv("GEMINI_HEDGE", "0") == "1",
+        name=name,
+        auth_headers=auth_headers,
+    )
+
+
+def build_gemini_generator():
+    """Gemini backend, or None when no API key is configured"""
+    api_key = get_api_key()
+    if not api_key:
+        return None
+    client = _http_client(os.getenv("GEMINI_BASE_URL", GEMINI_API_BASE), api_key, "Gemini")
+    return GeminiGenerator(api_key, client=client)
+
+
+def build_openai_generator():
+    """OpenAI-compatible backend, or None unless OPENAI_API_KEY or OPENAI_BASE_URL is set"""
+    api_key = os.getenv("OPENAI_API_KEY")
+    base_url = os.getenv("OPENAI_BASE_URL")
+    if not (api_key or base_url):
+        return None
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    client = _http_client(base_url or OPENAI_API_BASE, api_key, os.getenv("OPENAI_PROVIDER_NAME", "OpenAI"), headers)
+    return OpenAICompatibleGenerator(client)
+
+
+def build_local_generator(shared=True):
+    """CPU-only local model, or None when transformers is missing or TONEPILOT_LOCAL_MODEL=off"""
+    model_name = os.getenv("TONEPILOT_LOCAL_MODEL", DEFAULT_LOCAL_MODEL)
+    if model_name.lower() in ("", "0", "off"):
+        return None
+    if shared:
+        from model_server import ModelServerClient, RemoteGenerator, model_server_path
+        if model_server_path():
+            # Frontends of a model server use its single copy of the model
+            return RemoteGenerator(ModelServerClient(model_server_path()))
+    try:
+        import transformers  # noqa: F401
+    except ImportError:
+        return None
+    return LocalGenerator(
+        model_name,
+        int(os.getenv("TONEPILOT_LOCAL_MAX_TOKENS", "256")),
+        float(os.getenv("TONEPILOT_LOCAL_TOKEN_TIMEOUT", "60")),
+    )
+
+
+def build_fake_generator():
+    """Canned offline generator"""
+    return FakeGenerator(float(os.getenv("TONEPILOT_FAKE_DELAY", "0.02")))
+
+
+# Backend name -> builder returning a generator, or None when the backend is not configured
+GENERATOR_BACKENDS = {
+    "gemini": build_gemini_generator,
+    "openai": build_openai_generator,
+    "local": build_local_generator,
+    "fake": build_fake_generator,
+}
+
+# Backends the router only uses once every other backend has failed
+FALLBACK_BACKENDS = {"local"}
+
+
+def register_generator_backend(name, builder, fallback=False):
+    """Add a generation backend that TONEPILOT_GENERATORS can name"""
+    GENERATOR_BACKENDS[name] = builder
+    if fallback:
+        FALLBACK_BACKENDS.add(name)
+
+
+def generator_names():
+    """Backend names from TONEPILOT_GENERATORS, in preference order"""
+    return [name.strip() for name in os.getenv("TONEPILOT_GENERATORS", DEFAULT_GENERATORS).split(",") if name.strip()]
+
+
+def build_generator():
+    """Create the response generator, or None when no backend is available
+
+    TONEPILOT_GENERATORS lists backends in preference order; with more than one available,
+    calls are routed by measured latency and error rate.
+    """
+    if os.getenv("TONEPILOT_GENERATOR") == "fake":
+        return build_fake_generator()
+    backends = []
+    for name in generator_names():
+        builder = GENERATOR_BACKENDS.get(name)
+        generator = builder() if builder is not None else None
+        if generator is not None:
+            backends.append((name, generator, name in FALLBACK_BACKENDS))
+    if not backends:
+        return None
+    if len(backends) == 1:
+        return backends[0][1]
+    return GenerationRouter(backends)
@@ -0,0 +1,143 @@
+"""
+Latency-aware routing across generation backends.
+
+Each backend keeps an EWMA of its recent call latency and error rate. Every call goes to the
+healthy backend with the lowest expected latency, and on failure moves on to the next one.
+A backend that fails several times in a row is skipped for a cool-down period and then
+probed again. Fallback backends (the local model) are only used once every other backend
+has failed, so full mode keeps working without network access.
+"""
+
+import threading
+import time
+
+
+class BackendHealth:
+    """Recent latency and error rate for one backend"""
+
+    def __init__(self, name, generator, fallback=False):
+        self.name = name
+        self.generator = generator
+        self.fallback = fallback
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.failed_at = None
+        self.calls = 0
+        self.failures = 0
+
+    def score(self, error_penalty, now, probe_seconds):
+        """Expected seconds per call; untried backends score 0 so they get measured first"""
+        if self.latency_ewma is None:
+            # A backend that has only ever failed is tried again once its last failure is old
+            recently_failed = self.failed_at is not None and now - self.failed_at < probe_seconds
+            return float("inf") if recently_failed else 0.0
+        return self.latency_ewma * (1 + error_penalty * self.error_ewma)
+
+
+class GenerationRouter:
+    """Generator that dispatches each call to the best available backend"""
+
+    def __init__(self, backends, ewma_alpha=0.3, error_penalty=4.0, max_failures=3, cooldown_seconds=30.0):
+        # backends: (name, generator, is_fallback) in preference order
+        self.backends = [BackendHealth(name, generator, fallback) for name, generator, fallback in backends]
+        self.ewma_alpha = ewma_alpha
+        self.error_penalty = error_penalty
+        self.max_failures = max_failures
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+
+    def _ewma(self, previous, value):
+        return value if previous is None else previous + self.ewma_alpha * (value - previous)
+
+    def _record(self, backend, seconds=None):
+        """Record one finished call; seconds is None for a failure"""
+        with self._lock:
+            backend.calls += 1
+            if seconds is None:
+                backend.failures += 1
+                backend.error_ewma = self._ewma(backend.error_ewma, 1.0)
+                backend.consecutive_failures += 1
+                backend.failed_at = time.monotonic()
+                if backend.consecutive_failures >= self.max_failures:
+                    backend.open_until = time.monotonic() + self.cooldown_seconds
+            else:
+                backend.latency_ewma = self._ewma(backend.latency_ewma, seconds)
+                backend.error_ewma = self._ewma(backend.error_ewma, 0.0)
+                backend.consecutive_failures = 0
+                backend.open_until = 0.0
+
+    def candidates(self):
+        """Backends in the order the next call should try them, skipping any in cool-down"""
+        now = time.monotonic()
+        with self._lock:
+            ranked = sorted(
+                enumerate(self.backends),
+                key=lambda item: (
+                    item[1].fallback,
+                    item[1].score(self.error_penalty, now, self.cooldown_seconds),
+                    item[0],
+                ),
+            )
+            available = [backend for _, backend in ranked if backend.open_until <= now]
+        # With every backend cooling down, trying them beats failing without a call
+        return available or [backend for _, backend in ranked]
+
+    def generate(self, final_prompt, user_input, response_length=None):
+        """Generate a full response, moving to the next backend when one fails"""
+        error = None
+        for backend in self.candidates():
+            started = time.perf_counter()
+            try:
+                text = backend.generator.generate(final_prompt, user_input, response_length)
+            except Exception as e:
+                self._record(backend)
+                error = e
+                continue
+            self._record(backend, time.perf_counter() - started)
+            return text
+        raise error
+
+    def stream(self, final_prompt, user_input, response_length=None):
+        """Yield response chunks; a backend failing before its first chunk hands over to the next"""
+        error = None
+        for backend in self.candidates():
+            started = time.perf_counter()
+            started_output = False
+            try:
+                for chunk in backend.generator.stream(final_prompt, user_input, response_length):
+                    started_output = True
+                    yield chunk
+            except Exception as e:
+                self._record(backend)
+                # Text already shown cannot be taken back, so only a silent failure falls through
+                if started_output:
+                    raise
+                error = e
+                continue
+            self._record(backend, time.perf_counter() - started)
+            return
+        raise error
+
+    def clients(self):
+        """HTTP clients of the backends that call a remote API, for their own stats"""
+        clients = (getattr(backend.generator, "client", None) for backend in self.backends)
+        return [client for client in clients if client is not None]
+
+    def stats(self):
+        """Per-backend latency, error rate and state for display"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "name": backend.name,
+                    "fallback": backend.fallback,
+                    "calls": backend.calls,
+                    "failures": backend.failures,
+                    "latency_ms": backend.latency_ewma * 1000 if backend.latency_ewma is not None else None,
+                    "error_rate": backend.error_ewma,
+                    "available": backend.open_until <= now,
+                }
+                for backend in self.backends
+            ]
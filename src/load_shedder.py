@@ -0,0 +1,163 @@
+"""
+Adaptive load shedding for full-mode requests.
+
+Watches in-flight local-stage runs, worker-pool queue depth and recent generation latency, and
+degrades new requests one tier at a time when they get too high:
+- full: tags, prompt and AI response
+- tags_only: skip the remote Gemini call (generation is slow or backed up)
+- canned: serve a recorded demo result (the local engine is overloaded)
+Cached results are always served first, at any tier. A tier is only relaxed once load
+has dropped well below its trigger and the tier has held for a while, so it never flaps.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from pipeline import StageUnavailable
+
+TIERS = ("full", "tags_only", "canned")
+
+
+class LoadShedder:
+    """Picks the service tier for each new request from live load signals"""
+
+    def __init__(self, local_pool=None, remote_pool=None, max_in_flight=16, max_latency_seconds=8.0,
+                 queue_ratio=0.75, recover_ratio=0.6, min_dwell_seconds=10.0, probe_seconds=15.0,
+                 ewma_alpha=0.3, enabled=True):
+        # Disabled controllers still track load for display but always pick "full"
+        self.enabled = enabled
+        self.local_pool = local_pool
+        self.remote_pool = remote_pool
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_latency_seconds = max_latency_seconds
+        # Shed once a pool's queue is this full
+        self.queue_ratio = queue_ratio
+        # Relax only once every signal is below recover_ratio of its trigger
+        self.recover_ratio = recover_ratio
+        self.min_dwell_seconds = min_dwell_seconds
+        # While generation is skipped, let one request through this often to re-measure latency
+        self.probe_seconds = probe_seconds
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self.tier = "full"
+        self.changed_at = time.monotonic()
+        self.in_flight = 0
+        self.latency_ewma = None
+        self._latency_at = 0.0
+        self.served = {tier: 0 for tier in TIERS}
+        self.transitions = 0
+
+    @contextmanager
+    def track(self):
+        """Count the enclosed local-stage run as in flight"""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    @contextmanager
+    def measure(self):
+        """Record the enclosed remote generation's duration, including failed and timed-out calls"""
+        started = time.perf_counter()
+        measured = True
+        try:
+            yield
+        except StageUnavailable:
+            # No backend is configured, so nothing ran that says how slow generation is
+            measured = False
+            raise
+        finally:
+            if measured:
+                self.record_latency(time.perf_counter() - started)
+
+    def record_latency(self, seconds):
+        """Feed one remote generation time into the latency average"""
+        with self._lock:
+            if self.latency_ewma is None:
+                self.latency_ewma = seconds
+            else:
+                self.latency_ewma += self.ewma_alpha * (seconds - self.latency_ewma)
+            self._latency_at = time.monotonic()
+
+    @staticmethod
+    def _queue_fill(pool):
+        if pool is None:
+            return 0.0
+        stats = pool.stats()
+        return stats["queued"] / stats["max_queue"] if stats["max_queue"] else 0.0
+
+    def pressures(self):
+        """(local, remote) load as a fraction of the level that triggers shedding"""
+        local = max(self.in_flight / self.max_in_flight,
+                    self._queue_fill(self.local_pool) / self.queue_ratio)
+        latency = (self.latency_ewma or 0.0) / self.max_latency_seconds if self.max_latency_seconds else 0.0
+        remote = max(latency, self._queue_fill(self.remote_pool) / self.queue_ratio)
+        return local, remote
+
+    def _target(self, local, remote, threshold):
+        if local >= threshold:
+            return "canned"
+        if remote >= threshold:
+            return "tags_only"
+        return "full"
+
+    def choose(self):
+        """Tier for a new request; updates the shared tier with hysteresis"""
+        if not self.enabled:
+            with self._lock:
+                self.served["full"] += 1
+            return "full"
+        local, remote = self.pressures()
+        now = time.monotonic()
+        with self._lock:
+            current = TIERS.index(self.tier)
+            wanted = TIERS.index(self._target(local, remote, 1.0))
+            if wanted > current:
+                # Degrade straight away
+                self.tier = TIERS[wanted]
+                self.changed_at = now
+                self.transitions += 1
+            elif (current > 0 and now - self.changed_at >= self.min_dwell_seconds
+                  and TIERS.index(self._target(local, remote, self.recover_ratio)) < current):
+                # Recover one tier at a time
+                self.tier = TIERS[current - 1]
+                self.changed_at = now
+                self.transitions += 1
+            tier = self.tier
+            if tier == "tags_only" and now - self._latency_at >= self.probe_seconds:
+                # Probe request: measures whether generation has recovered
+                self._latency_at = now
+                tier = "full"
+            self.served[tier] += 1
+            return tier
+
+    def stats(self):
+        """Current tier and signals for display"""
+        local, remote = self.pressures()
+        with self._lock:
+            return {
+                "tier": self.tier,
+                "in_flight": self.in_flight,
+                "latency_ewma": self.latency_ewma,
+                "local_pressure": local,
+                "remote_pressure": remote,
+                "served": dict(self.served),
+                "transitions": self.transitions,
+            }
+
+
+def build_load_shedder(local_pool=None, remote_pool=None):
+    """Create the controller from TONEPILOT_SHED_* settings (TONEPILOT_SHED=0 turns shedding off)"""
+    return LoadShedder(
+        local_pool=local_pool,
+        remote_pool=remote_pool,
+        max_in_flight=int(os.getenv("TONEPILOT_SHED_MAX_IN_FLIGHT", "16")),
+        max_latency_seconds=float(os.getenv("TONEPILOT_SHED_MAX_LATENCY", "8")),
+        min_dwell_seconds=float(os.getenv("TONEPILOT_SHED_DWELL", "10")),
+        enabled=os.getenv("TONEPILOT_SHED", "1").lower() not in ("0", "false", "no", "off"),
+    )
@@ -0,0 +1,182 @@
+"""
+Memory accounting and a memory budget for the TonePilot app.
+
+Streamlit Cloud kills the container when it runs out of memory, long before Python raises
+MemoryError. The budget watches the process RSS and, as it nears the limit, first sheds
+the shared caches and then rejects new full-mode requests, which demo mode can still serve.
+"""
+
+import gc
+import os
+import sys
+import threading
+
+# Fractions of the budget at which caches are shed and full-mode requests are rejected
+DEFAULT_SHED_RATIO = 0.85
+DEFAULT_REJECT_RATIO = 0.95
+# Below this fraction a later crossing of the shed line sheds the caches again
+DEFAULT_REARM_RATIO = 0.75
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """Raised instead of starting a full-mode request that could get the container OOM-killed"""
+
+
+def rss_bytes():
+    """Resident set size of this process in bytes (0 if unknown)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS, but the best macOS offers without psutil
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+def container_limit_bytes():
+    """Memory limit of the container (cgroup v2 or v1), or None when unlimited"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    return None
+
+
+def approx_size(obj, _seen=None):
+    """Approximate deep size in bytes of plain data (dicts, lists, strings, numbers)"""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, seen) + approx_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item, seen) for item in obj)
+    return size
+
+
+def model_size_bytes(engine):
+    """Bytes held by torch parameters and buffers reachable from the engine's components"""
+    # Engines running elsewhere (see model_server.RemoteEngine) report their own size
+    reported = getattr(engine, "model_size_bytes", None)
+    if callable(reported):
+        return reported()
+    seen_tensors = set()
+    total = 0
+    pending = [engine]
+    visited = set()
+    # Models sit a few attributes deep (engine.tagger.classifier.model, engine.mapper.model, ...)
+    for _ in range(5):
+        next_pending = []
+        for obj in pending:
+            if obj is None or id(obj) in visited:
+                continue
+            visited.add(id(obj))
+            parameters = getattr(obj, "parameters", None)
+            buffers = getattr(obj, "buffers", None)
+            if callable(parameters) and callable(buffers):
+                try:
+                    for tensor in list(parameters()) + list(buffers()):
+                        key = tensor.data_ptr()
+                        if key not in seen_tensors:
+                            seen_tensors.add(key)
+                            total += tensor.numel() * tensor.element_size()
+                except Exception:
+                    pass
+                continue
+            next_pending.extend(getattr(obj, "__dict__", {}).values())
+        pending = next_pending
+    return total
+
+
+class MemoryBudget:
+    """Sheds caches, then rejects full-mode requests, as the process RSS nears the budget"""
+
+    def __init__(self, budget_bytes, caches=(), shed_ratio=DEFAULT_SHED_RATIO,
+                 reject_ratio=DEFAULT_REJECT_RATIO, rearm_ratio=DEFAULT_REARM_RATIO):
+        # budget_bytes=None only reports figures and never sheds or rejects
+        self.budget_bytes = budget_bytes
+        self.caches = list(caches)
+        self.shed_ratio = shed_ratio
+        self.reject_ratio = reject_ratio
+        self.rearm_ratio = rearm_ratio
+        self._lock = threading.Lock()
+        # Cache bytes just before the last shed; None until the next shed is allowed
+        self._shed_from_bytes = None
+        self.sheds = 0
+        self.rejections = 0
+
+    def usage(self):
+        """Current RSS as a fraction of the budget (0.0 without a budget)"""
+        if not self.budget_bytes:
+            return 0.0
+        return rss_bytes() / self.budget_bytes
+
+    def _cache_bytes(self):
+        return sum(cache.approx_bytes() for cache in self.caches)
+
+    def check(self):
+        """Shed caches if needed and return 'ok', 'shed' or 'reject'"""
+        if not self.budget_bytes:
+            return "ok"
+        usage = self.usage()
+        if usage < self.shed_ratio:
+            if usage < self.rearm_ratio and self._shed_from_bytes is not None:
+                with self._lock:
+                    self._shed_from_bytes = None
+            return "ok"
+        with self._lock:
+            # Freed memory mostly stays with the allocator, so RSS seldom drops after a shed.
+            # Shed once per crossing, and again only after a drop below rearm_ratio or once the
+            # caches have grown back to their size before the last shed.
+            cache_bytes = self._cache_bytes()
+            refilled = bool(self._shed_from_bytes) and cache_bytes >= self._shed_from_bytes
+            if self._shed_from_bytes is None or refilled:
+                self._shed_from_bytes = cache_bytes
+                for cache in self.caches:
+                    cache.shrink(0.5)
+                gc.collect()
+                self.sheds += 1
+        return "reject" if self.usage() >= self.reject_ratio else "shed"
+
+    def admit(self):
+        """Raise MemoryBudgetExceeded when a new full-mode request would not fit"""
+        if self.check() == "reject":
+            with self._lock:
+                self.rejections += 1
+            raise MemoryBudgetExceeded(
+                "Memory limit reached - full AI mode is paused until memory frees up."
+            )
+
+    def stats(self):
+        """Live figures for display"""
+        rss = rss_bytes()
+        return {
+            "rss_bytes": rss,
+            "budget_bytes": self.budget_bytes,
+            "usage": rss / self.budget_bytes if self.budget_bytes else None,
+            "cache_bytes": self._cache_bytes(),
+            "sheds": self.sheds,
+            "rejections": self.rejections,
+        }
+
+
+def build_memory_budget(caches=()):
+    """Budget from TONEPILOT_MEMORY_BUDGET_MB, else 90% of the container limit, else report-only"""
+    budget_mb = os.getenv("TONEPILOT_MEMORY_BUDGET_MB")
+    if budget_mb:
+        budget_bytes = int(float(budget_mb) * 1024 * 1024) or None
+    else:
+        limit = container_limit_bytes()
+        budget_bytes = int(limit * 0.9) if limit else None
+    return MemoryBudget(budget_bytes, caches=caches)
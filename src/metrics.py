@@ -0,0 +1,214 @@
+"""
+Per-stage latency metrics for TonePilot requests.
+
+Every stage of a Generate (engine fetch, tagging, tag mapping, prompt assembly, remote
+generation, rendering) is timed with a span. Spans feed Prometheus-style histograms plus a
+window of recent samples for p50/p95/p99, exported as Prometheus text over a local HTTP
+endpoint (TONEPILOT_METRICS_PORT) or dumped to a file (TONEPILOT_METRICS_FILE).
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+SAMPLE_WINDOW = 1024
+
+# Methods of the tonepilot engine's components, timed as separate stages
+ENGINE_SPANS = (
+    ("tagger", "classify", "input_tagging"),
+    ("mapper", "map_tags", "response_mapping"),
+    ("prompt_builder", "blend", "prompt_assembly"),
+)
+
+
+# Exporters outlive a "Clear Cache & Restart" and are pointed at the new registry
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class StageHistogram:
+    """Cumulative bucket counts plus a bounded window of recent samples for percentiles"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.recent = deque(maxlen=SAMPLE_WINDOW)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def summary(self):
+        ordered = sorted(self.recent)
+        if not ordered:
+            return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000,
+            "p50_ms": _percentile(ordered, 0.50) * 1000,
+            "p95_ms": _percentile(ordered, 0.95) * 1000,
+            "p99_ms": _percentile(ordered, 0.99) * 1000,
+        }
+
+
+class Metrics:
+    """Thread-safe registry of per-stage latency histograms"""
+
+    def __init__(self, prefix="tonepilot"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stages = {}
+        self.started_at = time.time()
+
+    def observe(self, stage, seconds):
+        """Record one duration for a stage"""
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = StageHistogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        """Time the enclosed block as one sample of stage (failed blocks are timed too)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def summary(self):
+        """{stage: {count, mean_ms, p50_ms, p95_ms, p99_ms}} for display"""
+        with self._lock:
+            return {stage: histogram.summary() for stage, histogram in sorted(self._stages.items())}
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+
+    def prometheus_text(self):
+        """All histograms in the Prometheus text exposition format"""
+        name = f"{self.prefix}_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Duration of each TonePilot request stage.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, histogram.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Write the Prometheus text to path atomically (for node_exporter's textfile collector)"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+
+def instrument_engine(engine, metrics):
+    """Wrap the engine's tagger, mapper and prompt builder so each records its own span"""
+    if engine is None or metrics is None:
+        return engine
+    for component_name, method_name, stage in ENGINE_SPANS:
+        component = getattr(engine, component_name, None)
+        method = getattr(component, method_name, None)
+        if method is None:
+            # Fake and replay engines have no separate components
+            continue
+
+        def timed(*args, _method=method, _stage=stage, **kwargs):
+            with metrics.span(_stage):
+                return _method(*args, **kwargs)
+        setattr(component, method_name, timed)
+    return engine
+
+
+def start_metrics_server(metrics, port, host="127.0.0.1"):
+    """Serve GET /metrics from a daemon thread; returns the server"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = self.server.metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Keep scrapes out of the Streamlit log
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, name="tonepilot-metrics", daemon=True).start()
+    return server
+
+
+class FileDump:
+    """Rewrites the Prometheus text file every interval_seconds from a daemon thread"""
+
+    def __init__(self, metrics, path, interval_seconds=15.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval_seconds = interval_seconds
+        threading.Thread(target=self._loop, name="tonepilot-metrics-dump", daemon=True).start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval_seconds)
+            try:
+                self.metrics.dump(self.path)
+            except OSError:
+                pass
+
+
+def build_metrics():
+    """Create the registry and start the exporters configured by TONEPILOT_METRICS_*"""
+    metrics = Metrics()
+    port = int(os.getenv("TONEPILOT_METRICS_PORT", "0"))
+    path = os.getenv("TONEPILOT_METRICS_FILE")
+    with _exporters_lock:
+        if port:
+            server = _exporters.get(("http", port))
+            if server is not None:
+                server.metrics = metrics
+            else:
+                try:
+                    _exporters[("http", port)] = start_metrics_server(metrics, port)
+                except OSError:
+                    # Port taken, e.g. by another Streamlit process: the sidebar panel still works
+                    pass
+        if path:
+            dump = _exporters.get(("file", path))
+            if dump is not None:
+                dump.metrics = metrics
+            else:
+                interval_seconds = float(os.getenv("TONEPILOT_METRICS_INTERVAL", "15"))
+                _exporters[("file", path)] = FileDump(metrics, path, interval_seconds)
+    return metrics
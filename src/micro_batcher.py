@@ -0,0 +1,110 @@
+"""
+Micro-batching for the local tagging stage.
+Inputs that arrive within a few milliseconds of each other are classified as one batch,
+which is far cheaper than batch-size-1 transformer inference on CPU.
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+# Upper bounds (ms) of the wait-time histogram buckets, Prometheus style
+WAIT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 250, float("inf"))
+
+
+class MicroBatcher:
+    """Collects items for up to max_wait_ms or max_batch_size, then runs them together"""
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10, pool=None):
+        # batch_fn(items) must return one result per item, in order
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.pool = pool
+        self._pending = []
+        self._cond = threading.Condition()
+        self._batch_sizes = Counter()
+        self._wait_buckets = Counter()
+        self._thread = threading.Thread(target=self._collect_loop, name="tonepilot-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue one item and return a Future for its result"""
+        future = Future()
+        with self._cond:
+            self._pending.append((item, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def _collect_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # The oldest pending item decides how long this batch may keep collecting
+                deadline = self._pending[0][2] + self.max_wait_ms / 1000
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+            self._record(batch)
+            if self.pool is None:
+                self._run_batch(batch)
+                continue
+            try:
+                self.pool.submit(self._run_batch, batch)
+            except Exception as e:
+                # Pool backpressure fails the whole batch instead of killing the collector
+                for _, future, _ in batch:
+                    future.set_exception(e)
+
+    def _record(self, batch):
+        now = time.perf_counter()
+        with self._cond:
+            self._batch_sizes[len(batch)] += 1
+            for _, _, queued_at in batch:
+                waited_ms = (now - queued_at) * 1000
+                bucket = next(b for b in WAIT_BUCKETS_MS if waited_ms <= b)
+                self._wait_buckets[bucket] += 1
+
+    def _run_batch(self, batch):
+        items = [item for item, _, _ in batch]
+        try:
+            results = self.batch_fn(items)
+        except BaseException as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self):
+        """Batch-size and wait-time histograms for display and export"""
+        with self._cond:
+            batches = sum(self._batch_sizes.values())
+            items = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "batches": batches,
+                "items": items,
+                "avg_batch_size": items / batches if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "wait_ms_histogram": {
+                    ("+Inf" if b == float("inf") else b): self._wait_buckets.get(b, 0)
+                    for b in WAIT_BUCKETS_MS
+                },
+                "pending": len(self._pending),
+            }
+
+
+def build_batcher(batch_fn, pool=None):
+    """Create a batcher from TONEPILOT_BATCH_* settings, or None when batching is off"""
+    max_wait_ms = float(os.getenv("TONEPILOT_BATCH_WAIT_MS", "0"))
+    max_batch_size = int(os.getenv("TONEPILOT_BATCH_SIZE", "8"))
+    if max_wait_ms <= 0 or max_batch_size <= 1:
+        return None
+    return MicroBatcher(batch_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, pool=pool)
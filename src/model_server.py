@@ -0,0 +1,359 @@
+"""
+Local model server shared by several app processes.
+
+One process loads the TonePilot engine and the local fallback generation model, and owns the
+prompt cache, result cache, disk store and semantic cache. Streamlit frontends (and the HTTP API) started with
+TONEPILOT_MODEL_SERVER=<socket path> reach it over a Unix socket instead of loading their own
+copy, so adding frontends adds CPU for rendering without adding model memory.
+
+Protocol: every message is a frame of a 4-byte big-endian payload length, a 1-byte opcode
+(requests) or status (responses), and a UTF-8 JSON payload. Connections are persistent;
+each client thread keeps its own.
+
+    python src/model_server.py --socket /tmp/tonepilot.sock
+    TONEPILOT_MODEL_SERVER=/tmp/tonepilot.sock streamlit run streamlit_app.py --server.port 8501
+    TONEPILOT_MODEL_SERVER=/tmp/tonepilot.sock streamlit run streamlit_app.py --server.port 8502
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+
+from memory_guard import MemoryBudgetExceeded, model_size_bytes
+from pipeline import StageUnavailable
+from worker_pool import QueueFull
+
+DEFAULT_SOCKET_PATH = "/tmp/tonepilot.sock"
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+_HEADER = struct.Struct(">IB")
+
+OP_PING = 1
+OP_RUN_LOCAL = 2
+OP_RUN_LOCAL_MANY = 3
+OP_CACHE_GET = 4
+OP_CACHE_PUT = 5
+OP_CACHE_CLEAR = 6
+OP_CACHE_STATS = 7
+OP_MODEL_SIZE = 8
+OP_GENERATE = 9
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# Errors the frontends handle specially are re-raised there with their own type
+_ERROR_TYPES = {
+    "MemoryBudgetExceeded": MemoryBudgetExceeded,
+    "StageUnavailable": StageUnavailable,
+    "QueueFull": QueueFull,
+}
+
+
+class ModelServerError(RuntimeError):
+    """Raised when the model server cannot be reached or fails a request"""
+
+
+def model_server_path():
+    """Socket path from TONEPILOT_MODEL_SERVER, or None when frontends run standalone"""
+    return os.getenv("TONEPILOT_MODEL_SERVER") or None
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("model server connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_frame(sock, code, payload):
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data), code) + data)
+
+
+def recv_frame(sock):
+    """Return (code, payload) for the next frame"""
+    size, code = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > MAX_FRAME_BYTES:
+        raise ConnectionError(f"model server frame of {size} bytes is too large")
+    return code, json.loads(_recv_exact(sock, size))
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Serves frames on one frontend connection until it closes"""
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                code, payload = recv_frame(self.request)
+            except (ConnectionError, OSError, ValueError):
+                return
+            try:
+                result = server.dispatch(code, payload)
+                send_frame(self.request, STATUS_OK, result)
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                try:
+                    send_frame(self.request, STATUS_ERROR, {"type": type(e).__name__, "message": str(e)})
+                except OSError:
+                    return
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix-socket server in front of one pipeline's engine and caches"""
+
+    daemon_threads = True
+
+    def __init__(self, path, pipeline, memory_budget=None, engine_status=None, generator=None):
+        self.pipeline = pipeline
+        # Loader status callable, so frontends can tell "warming" from "ready" before asking for more
+        self.engine_status = engine_status
+        # Local fallback model shared by every frontend (None when it is not configured)
+        self.generator = generator
+        # Frontends no longer hold the caches, so the server sheds them when memory runs short
+        self.memory_budget = memory_budget
+        self.caches = {"prompt": pipeline.prompt_cache, "result": pipeline.result_cache}
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                # A socket left behind by a crashed server would block the bind
+                os.unlink(path)
+            else:
+                raise ModelServerError(f"A model server is already listening on {path}")
+            finally:
+                probe.close()
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)
+
+    def _cache(self, name):
+        cache = self.caches.get(name)
+        if cache is None:
+            raise ValueError(f"Unknown cache {name!r}")
+        return cache
+
+    def dispatch(self, code, payload):
+        if code == OP_PING:
+            return {"pid": os.getpid(), "engine": self.engine_status() if self.engine_status else "ready"}
+        if code in (OP_RUN_LOCAL, OP_RUN_LOCAL_MANY) and self.memory_budget is not None:
+            self.memory_budget.admit()
+        if code == OP_RUN_LOCAL:
+            return self.pipeline.run_local(payload["text"])
+        if code == OP_RUN_LOCAL_MANY:
+            return self.pipeline.run_local_many(payload["texts"])
+        if code == OP_CACHE_GET:
+            if payload["cache"] == "result":
+                # Falls through to the disk store like a local lookup
+                return self.pipeline.cached_result(payload["text"])
+            return self._cache(payload["cache"]).get(payload["text"])
+        if code == OP_CACHE_PUT:
+            if payload["cache"] == "result":
+                self.pipeline.store_result(payload["text"], payload["result"])
+            else:
+                self._cache(payload["cache"]).put(payload["text"], payload["result"])
+            return None
+        if code == OP_CACHE_CLEAR:
+            self._cache(payload["cache"]).clear()
+            if payload["cache"] == "result":
+                # Clear every tier a result lookup falls through to
+                for tier in (self.pipeline.store, self.pipeline.semantic_cache):
+                    if tier is not None:
+                        tier.clear()
+            return None
+        if code == OP_CACHE_STATS:
+            return self._cache(payload["cache"]).stats()
+        if code == OP_MODEL_SIZE:
+            return {"bytes": model_size_bytes(self.pipeline.get_engine())}
+        if code == OP_GENERATE:
+            if self.generator is None:
+                raise StageUnavailable("The model server has no local generation model")
+            return {"text": self.generator.generate(payload["final_prompt"], payload["user_input"],
+                                                    payload.get("response_length"))}
+        raise ValueError(f"Unknown opcode {code}")
+
+
+class ModelServerClient:
+    """Frontend side of the protocol, one persistent connection per thread"""
+
+    def __init__(self, path, timeout=120.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            raise ModelServerError(f"TonePilot model server is not reachable at {self.path}: {e}") from e
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def call(self, code, payload):
+        """Send one request and return its result, reconnecting once after a dropped connection"""
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            reused = sock is not None
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            try:
+                send_frame(sock, code, payload)
+                status, result = recv_frame(sock)
+                break
+            except (ConnectionError, OSError) as e:
+                self._drop()
+                # Only a kept-alive connection that went stale is worth a second try
+                if not reused or attempt:
+                    raise ModelServerError(f"Lost connection to the TonePilot model server: {e}") from e
+        if status == STATUS_ERROR:
+            raise _ERROR_TYPES.get(result.get("type"), ModelServerError)(result.get("message"))
+        return result
+
+    def ping(self):
+        return self.call(OP_PING, {})
+
+
+class RemoteEngine:
+    """Engine whose run() and run_batch() execute in the model server"""
+
+    # The server puts every result it computes into its own prompt cache
+    caches_local_results = True
+
+    def __init__(self, client):
+        self.client = client
+
+    def status(self):
+        """The server engine's load status, as EngineLoader.status() reports it"""
+        return self.client.ping().get("engine", "ready")
+
+    def model_size_bytes(self):
+        """Bytes of model weights held by the server's engine (blocks until it has loaded)"""
+        return self.client.call(OP_MODEL_SIZE, {})["bytes"]
+
+
+class RemoteGenerator:
+    """Local fallback model run by the model server, so frontends do not each load a copy"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def generate(self, final_prompt, user_input, response_length=None):
+        payload = {"final_prompt": final_prompt, "user_input": user_input, "response_length": response_length}
+        return self.client.call(OP_GENERATE, payload)["text"]
+
+    def stream(self, final_prompt, user_input, response_length=None):
+        # The frame protocol has one response per request, so the reply arrives in one piece
+        yield self.generate(final_prompt, user_input, response_length)
+
+    def run(self, input_text):
+        return self.client.call(OP_RUN_LOCAL, {"text": input_text})
+
+    def run_batch(self, texts):
+        return self.client.call(OP_RUN_LOCAL_MANY, {"texts": list(texts)})
+
+
+class RemoteCache:
+    """ResultCache interface over one of the model server's caches"""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def get(self, prompt):
+        return self.client.call(OP_CACHE_GET, {"cache": self.name, "text": prompt})
+
+    def put(self, prompt, result):
+        if result:
+            self.client.call(OP_CACHE_PUT, {"cache": self.name, "text": prompt, "result": result})
+
+    def shrink(self, keep_fraction):
+        # Entries live in the model server, which enforces its own memory budget
+        pass
+
+    def approx_bytes(self):
+        return 0
+
+    def clear(self):
+        self.client.call(OP_CACHE_CLEAR, {"cache": self.name})
+
+    def stats(self):
+        return self.client.call(OP_CACHE_STATS, {"cache": self.name})
+
+
+def build_server_pipeline():
+    """Pipeline with the real engine and every cache tier, local stages only"""
+    from engine_loader import EngineLoader
+    from memory_guard import build_memory_budget
+    from micro_batcher import build_batcher
+    from pipeline import TonePilotPipeline, build_engine, run_local_batch
+    from result_cache import build_result_cache
+    from result_store import build_result_store, warm_count
+    from semantic_cache import build_semantic_cache
+    from worker_pool import build_local_pool
+
+    loader = EngineLoader(build_engine)
+    loader.start()
+    local_pool = build_local_pool()
+    prompt_cache = build_result_cache()
+    result_cache = build_result_cache()
+    semantic_cache = build_semantic_cache()
+    pipeline = TonePilotPipeline(
+        get_engine=loader.get,
+        prompt_cache=prompt_cache,
+        result_cache=result_cache,
+        local_pool=local_pool,
+        batcher=build_batcher(lambda texts: run_local_batch(loader.get(), texts), pool=local_pool),
+        store=build_result_store(),
+        semantic_cache=semantic_cache,
+    )
+    pipeline.warm_from_store(warm_count())
+    caches = [prompt_cache, result_cache] + ([semantic_cache] if semantic_cache is not None else [])
+    return pipeline, loader, build_memory_budget(caches=caches)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve one TonePilot engine and cache to several app processes")
+    parser.add_argument("--socket", default=model_server_path() or DEFAULT_SOCKET_PATH, help="Unix socket path")
+    args = parser.parse_args(argv)
+
+    from generation import build_local_generator, generator_names
+
+    pipeline, loader, memory_budget = build_server_pipeline()
+    # Only load the local model when it is listed as a backend
+    generator = build_local_generator(shared=False) if "local" in generator_names() else None
+    server = ModelServer(args.socket, pipeline, memory_budget, engine_status=loader.status, generator=generator)
+    # Treat a supervisor's SIGTERM like Ctrl+C so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"TonePilot model server listening on {args.socket} (engine loading in the background)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+        if loader.status() == "failed":
+            print(f"Engine failed to load: {loader.error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+TonePilot pipeline split into two stages:
+- local: input tags -> response tags -> final prompt (milliseconds, cached)
+- remote: response text generated from the final prompt (seconds, network)
+"""
+
+import os
+import time
+from contextlib import nullcontext
+
+from result_cache import ResultCache, normalize_prompt
+from single_flight import FlightAborted, SingleFlight
+
+# Everything engine.run returns except the generated response_text
+LOCAL_KEYS = (
+    "input_text",
+    "input_tags",
+    "response_tags",
+    "response_weights",
+    "final_prompt",
+    "response_length",
+    "mapper_mode",
+)
+
+
+class StageUnavailable(RuntimeError):
+    """Raised when a stage cannot run (missing library or API key)"""
+
+
+def build_engine():
+    """Build a TonePilot engine for the local stages only (no response generation)"""
+    if os.getenv("TONEPILOT_ENGINE") == "fake":
+        from fake_engine import FakeTonePilotEngine
+        return FakeTonePilotEngine(mode='gemini', respond=False)
+    if os.getenv("TONEPILOT_ENGINE") == "replay":
+        from replay_engine import build_replay_engine
+        return build_replay_engine()
+    from tonepilot.core.tonepilot import TonePilotEngine
+    return TonePilotEngine(mode='gemini', respond=False)
+
+
+def run_local_stage(engine, text):
+    """Run emotion tagging, personality mapping and prompt assembly"""
+    result = engine.run(text) or {}
+    return {key: result.get(key) for key in LOCAL_KEYS}
+
+
+def rebuild_local(engine, text, similar):
+    """Local result for text from a similar prompt's tags and weights, or None if it cannot be built"""
+    # The similar prompt's final_prompt quotes its own user text, so only the mapping is reused
+    builder = getattr(engine, "prompt_builder", None)
+    response_tags = similar.get("response_tags")
+    weights = similar.get("response_weights")
+    if builder is None or not response_tags or not weights:
+        return None
+    prompt_data = builder.blend(text, response_tags, weights)
+    return {
+        "input_text": text,
+        "input_tags": similar.get("input_tags"),
+        "response_tags": response_tags,
+        "response_weights": weights,
+        "final_prompt": prompt_data.final_prompt,
+        "response_length": prompt_data.response_length,
+        "mapper_mode": getattr(engine, "mapper_mode", similar.get("mapper_mode")),
+    }
+
+
+def _classify_batch(tagger, texts):
+    """HFTagger.classify for several texts with one zero-shot pipeline call"""
+    # Every (text, label) pair is one NLI input, so a single batch covers the whole group
+    outputs = tagger.classifier(list(texts), tagger.labels, batch_size=len(texts) * len(tagger.labels))
+    if isinstance(outputs, dict):
+        outputs = [outputs]
+    tags = []
+    for output in outputs:
+        scores = {label: round(float(score), 3) for label, score in zip(output["labels"], output["scores"])
+                  if float(score) > 0.2}
+        tags.append(scores or {"curious": 0.250, "thoughtful": 0.220})
+    return tags
+
+
+def _run_engine_batch(engine, texts):
+    """TonePilotEngine.run for several texts, tagging them in one batch; the rest runs per text"""
+    results = []
+    for text, input_tags in zip(texts, _classify_batch(engine.tagger, texts)):
+        response_tags, weights = engine.mapper.map_tags(input_tags)
+        if not response_tags or not weights:
+            response_tags = {"supportive": True, "thoughtful": True}
+            weights = {"supportive": 0.150, "thoughtful": 0.130}
+        prompt_data = engine.prompt_builder.blend(text, response_tags, weights)
+        results.append({
+            "input_text": text,
+            "input_tags": input_tags,
+            "response_tags": response_tags,
+            "response_weights": weights,
+            "final_prompt": prompt_data.final_prompt,
+            "response_length": prompt_data.response_length,
+            "mapper_mode": engine.mapper_mode,
+        })
+    return results
+
+
+def run_local_batch(engine, texts):
+    """Run the local stages for several inputs with one batched tagger call"""
+    run_batch = getattr(engine, "run_batch", None)
+    if run_batch is None and hasattr(getattr(engine, "tagger", None), "classifier"):
+        # TonePilotEngine has no batch API, so its zero-shot tagger is driven directly
+        run_batch = lambda batch: _run_engine_batch(engine, batch)
+    if run_batch is None:
+        return [run_local_stage(engine, text) for text in texts]
+    return [{key: (result or {}).get(key) for key in LOCAL_KEYS} for result in run_batch(texts)]
+
+
+class ResponseStream:
+    """Iterable of response chunks that records timing and stores the finished result"""
+
+    def __init__(self, chunks, text, local, on_complete, metrics=None):
+        self._chunks = chunks
+        self._text = text
+        self._local = local
+        self._on_complete = on_complete
+        self._metrics = metrics
+        self.first_token_seconds = None
+        self.total_seconds = None
+        self.result = None
+
+    def __iter__(self):
+        started = time.perf_counter()
+        parts = []
+        for chunk in self._chunks:
+            if self.first_token_seconds is None:
+                self.first_token_seconds = time.perf_counter() - started
+            parts.append(chunk)
+            yield chunk
+        self.total_seconds = time.perf_counter() - started
+        if self._metrics is not None:
+            if self.first_token_seconds is not None:
+                self._metrics.observe("first_token", self.first_token_seconds)
+            self._metrics.observe("remote_generation", self.total_seconds)
+        # Only complete responses are stored, an interrupted stream never gets here
+        self.result = dict(self._local, response_text="".join(parts))
+        self._on_complete(self._text, self.result)
+
+
+class TonePilotPipeline:
+    """Local and remote TonePilot stages, each fronted by its own cache"""
+
+    def __init__(self, get_engine, get_generator=None, prompt_cache=None, result_cache=None,
+                 local_pool=None, remote_pool=None, batcher=None, recorder=None, store=None,
+                 metrics=None, single_flight=None, semantic_cache=None):
+        # Engine and generator are resolved lazily so cache hits never load them
+        self.get_engine = get_engine
+        self.get_generator = get_generator or (lambda: None)
+        self.prompt_cache = prompt_cache if prompt_cache is not None else ResultCache()
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+        # Optional worker pools; without them stages run on the caller's thread
+        self.local_pool = local_pool
+        self.remote_pool = remote_pool
+        # Optional micro-batcher that groups concurrent local-stage requests
+        self.batcher = batcher
+        # Optional replay store that records every full result (see replay_engine.py)
+        self.recorder = recorder
+        # Optional persistent second tier behind the in-memory cache (see result_store.py)
+        self.store = store
+        # Optional per-stage latency histograms (see metrics.py)
+        self.metrics = metrics
+        # Concurrent requests for the same prompt share one engine run and one generation
+        self.single_flight = single_flight if single_flight is not None else SingleFlight()
+        # Optional nearest-neighbour tier for paraphrased prompts (see semantic_cache.py);
+        # only their tags and weights are reused, the prompt and response are always new
+        self.semantic_cache = semantic_cache
+
+    def _span(self, stage):
+        return self.metrics.span(stage) if self.metrics is not None else nullcontext()
+
+    def _semantic_local(self, text):
+        """Local result for text built from a similar cached prompt's tags, or None"""
+        if self.semantic_cache is None:
+            return None
+        with self._span("semantic_lookup"):
+            try:
+                similar = self.semantic_cache.get(text)
+            except Exception:
+                # A broken encoder only costs the semantic tier, never the request
+                return None
+        if similar is None:
+            return None
+        with self._span("engine_fetch"):
+            engine = self.get_engine()
+        return rebuild_local(engine, text, similar) if engine is not None else None
+
+    def _semantic_put(self, text, result):
+        if self.semantic_cache is not None:
+            try:
+                self.semantic_cache.put(text, result)
+            except Exception:
+                pass
+
+    def store_result(self, text, result):
+        """Save a full result to every cache tier (and the replay recorder)"""
+        self.result_cache.put(text, result)
+        if self.store is not None:
+            self.store.put(text, result)
+        if self.recorder is not None:
+            self.recorder.record(text, result)
+
+    def cached_result(self, text):
+        """Full result (tags, prompt and response) if this prompt was generated before"""
+        with self._span("cache_lookup"):
+            result = self.result_cache.get(text)
+            if result is None and self.store is not None:
+                result = self.store.get(text)
+                if result is not None:
+                    # Promote to memory so repeat hits skip the disk
+                    self.result_cache.put(text, result)
+        return result
+
+    def warm_from_store(self, limit):
+        """Preload the most popular persisted results into the in-memory cache"""
+        if self.store is None or limit <= 0:
+            return 0
+        entries = self.store.most_popular(limit)
+        for text, result in entries:
+            self.result_cache.put(text, result)
+        return len(entries)
+
+    def run_local(self, text, on_wait=None):
+        """Tags and final prompt for a prompt, from cache when possible"""
+        local = self.prompt_cache.get(text)
+        if local is None:
+            local = self._semantic_local(text)
+            if local is not None:
+                self.prompt_cache.put(text, local)
+        if local is None:
+            local = self.single_flight.do(("local", normalize_prompt(text)), self._compute_local, text, on_wait)
+        return local
+
+    def _compute_local(self, text, on_wait):
+        with self._span("engine_fetch"):
+            engine = self.get_engine()
+        if engine is None:
+            raise StageUnavailable("TonePilot library not available. Install with: pip install tonepilot")
+        # Includes queueing; tagging, mapping and assembly are timed inside the engine
+        with self._span("local_stage"):
+            if self.batcher is not None:
+                local = self.batcher.submit(text).result()
+            elif self.local_pool is not None:
+                local = self.local_pool.run(run_local_stage, engine, text, on_wait=on_wait)
+            else:
+                local = run_local_stage(engine, text)
+        self._cache_local(engine, text, local)
+        return local
+
+    def _cache_local(self, engine, text, local):
+        # A model-server engine has already cached the result on its side of the socket
+        if not getattr(engine, "caches_local_results", False):
+            self.prompt_cache.put(text, local)
+        self._semantic_put(text, local)
+
+    def run_local_many(self, texts):
+        """Local stages for several prompts, tagging every cache miss in one engine batch"""
+        locals_by_key = {}
+        missing = {}
+        for text in texts:
+            key = normalize_prompt(text)
+            local = self.prompt_cache.get(text)
+            if local is None and key not in missing:
+                local = self._semantic_local(text)
+                if local is not None:
+                    self.prompt_cache.put(text, local)
+            if local is not None:
+                locals_by_key[key] = local
+            else:
+                missing.setdefault(key, text)
+        if missing:
+            with self._span("engine_fetch"):
+                engine = self.get_engine()
+            if engine is None:
+                raise StageUnavailable("TonePilot library not available. Install with: pip install tonepilot")
+            batch = list(missing.values())
+            with self._span("local_stage"):
+                if self.local_pool is not None:
+                    computed = self.local_pool.run(run_local_batch, engine, batch)
+                else:
+                    computed = run_local_batch(engine, batch)
+            for key, text, local in zip(missing, batch, computed):
+                self._cache_local(engine, text, local)
+                locals_by_key[key] = local
+        return [locals_by_key[normalize_prompt(text)] for text in texts]
+
+    def _require_generator(self):
+        generator = self.get_generator()
+        if generator is None:
+            raise StageUnavailable("No API key found! Please set GOOGLE_API_KEY or GEMINI_API_KEY (or OPENAI_API_KEY) in your environment variables, "
+                                   "or add local to TONEPILOT_GENERATORS to generate with the local model")
+        return generator
+
+    def run_remote(self, text, local, on_wait=None):
+        """Generate the response text for a local-stage result and cache the full result"""
+        generator = self._require_generator()
+        response_text = self.single_flight.do(("remote", normalize_prompt(text)), self._generate,
+                                              generator, text, local, on_wait)
+        result = dict(local, response_text=response_text)
+        self.store_result(text, result)
+        return result
+
+    def _generate(self, generator, text, local, on_wait):
+        with self._span("remote_generation"):
+            if self.remote_pool is not None:
+                return self.remote_pool.run(generator.generate, local.get("final_prompt"), text,
+                                            local.get("response_length"), on_wait=on_wait)
+            return generator.generate(local.get("final_prompt"), text, local.get("response_length"))
+
+    def _stream_chunks(self, generator, text, local, on_wait):
+        if self.remote_pool is not None:
+            return self.remote_pool.stream(generator.stream, local.get("final_prompt"), text,
+                                           local.get("response_length"), on_wait=on_wait)
+        return generator.stream(local.get("final_prompt"), text, local.get("response_length"))
+
+    def _coalesced_chunks(self, generator, text, local, on_wait):
+        """The leader streams; duplicates get the leader's full response once it is done"""
+        # Joining happens on first iteration, so a stream that is never read never holds the key
+        key = ("remote", normalize_prompt(text))
+        future, leader = self.single_flight.begin(key)
+        if leader:
+            yield from self.single_flight.stream(key, future, self._stream_chunks(generator, text, local, on_wait))
+            return
+        try:
+            response_text = future.result()
+        except FlightAborted:
+            # The leading viewer left mid-stream, so generate this copy directly
+            yield from self._stream_chunks(generator, text, local, on_wait)
+            return
+        yield response_text
+
+    def stream_remote(self, text, local, on_wait=None):
+        """Stream the response text for a local-stage result as it is generated"""
+        generator = self._require_generator()
+        chunks = self._coalesced_chunks(generator, text, local, on_wait)
+        return ResponseStream(chunks, text, local, self.store_result, metrics=self.metrics)
+
+    def run(self, text, respond=True):
+        """Both stages in one call, returning engine.run's keys (response_text only when respond)"""
+        if not respond:
+            # Full cached results would leak a response_text into a prompt-only answer
+            return dict(self.run_local(text))
+        result = self.cached_result(text)
+        if result is not None:
+            return result
+        return self.run_remote(text, self.run_local(text))
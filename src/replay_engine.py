@@ -0,0 +1,112 @@
+"""
+Offline replay engine for demo mode and load tests.
+
+Serves recorded TonePilot results from a JSONL file through the same run() interface as
+TonePilotEngine. Each line is either {"prompt": ..., "result": {...}} or the fallback
+{"default": true, "result": {...}}. Live results can be recorded into a second file kept
+outside the source tree, so user prompts never end up in the curated, git-tracked set.
+"""
+
+import json
+import os
+import threading
+import time
+
+from demo_index import build_demo_index
+from result_cache import normalize_prompt
+
+DEFAULT_REPLAY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "demo_responses.jsonl")
+DEFAULT_RECORD_PATH = os.path.join(".tonepilot_cache", "recorded_responses.jsonl")
+
+
+class ReplayEngine:
+    """Returns recorded results: exact match, then most similar prompt, then the default"""
+
+    def __init__(self, path=DEFAULT_REPLAY_PATH, delay_seconds=0.0, record_path=None):
+        self.path = path
+        self.record_path = record_path
+        # No synthetic latency unless explicitly configured
+        self.delay_seconds = delay_seconds
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._curated = []
+        self._exact = {}
+        self._default = None
+        self._index = None
+        self._load()
+
+    def _load(self):
+        for path, curated in ((self.path, True), (self.record_path, False)):
+            if not path or not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line), curated)
+
+    def _add(self, record, curated=False):
+        if record.get("default"):
+            self._default = record["result"]
+            return
+        if curated:
+            self._curated.append(record["prompt"])
+        self._entries[record["prompt"]] = record["result"]
+        self._exact[normalize_prompt(record["prompt"])] = record["result"]
+        # Rebuilt lazily on the next similarity lookup
+        self._index = None
+
+    def prompts(self):
+        """Curated prompts from the replay file (never live recordings), e.g. for Random Sample"""
+        with self._lock:
+            return list(self._curated)
+
+    def lookup(self, input_text):
+        """Recorded result for a prompt, or None when nothing is close enough"""
+        with self._lock:
+            result = self._exact.get(normalize_prompt(input_text))
+            if result is not None:
+                return result
+            if self._index is None:
+                self._index = build_demo_index(self._entries)
+            return self._index.best_match(input_text)
+
+    def run(self, input_text):
+        """Same result shape as TonePilotEngine.run, served from the recording"""
+        if self.delay_seconds:
+            time.sleep(self.delay_seconds)
+        result = self.lookup(input_text)
+        return dict(result if result is not None else self._default or {})
+
+    def run_batch(self, input_texts):
+        return [self.run(text) for text in input_texts]
+
+    def record(self, input_text, result):
+        """Append a live result to the record file so later runs can replay it"""
+        if not self.record_path:
+            return
+        record = {"prompt": input_text, "result": result}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if normalize_prompt(input_text) in self._exact:
+                return
+            directory = os.path.dirname(self.record_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.record_path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._add(record)
+
+
+def build_replay_engine():
+    """Replay engine from TONEPILOT_REPLAY_PATH / TONEPILOT_REPLAY_DELAY / TONEPILOT_RECORD_PATH"""
+    path = os.getenv("TONEPILOT_REPLAY_PATH", DEFAULT_REPLAY_PATH)
+    delay_seconds = float(os.getenv("TONEPILOT_REPLAY_DELAY", "0"))
+    record_path = os.getenv("TONEPILOT_RECORD_PATH", DEFAULT_RECORD_PATH)
+    if record_path.lower() in ("", "0", "off"):
+        record_path = None
+    return ReplayEngine(path, delay_seconds=delay_seconds, record_path=record_path)
+
+
+def recording_enabled():
+    """Whether TONEPILOT_RECORD asks for live results to be recorded for replay"""
+    return os.getenv("TONEPILOT_RECORD", "").lower() in ("1", "true", "yes")
@@ -0,0 +1,114 @@
+"""
+Process-wide result cache for TonePilot runs.
+Shared by every Streamlit session so repeated prompts skip the engine entirely.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from memory_guard import approx_size
+
+
+def normalize_prompt(text):
+    """Normalize a prompt for cache lookups (collapse whitespace, ignore case)"""
+    return " ".join((text or "").split()).casefold()
+
+
+class ResultCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss counters"""
+
+    def __init__(self, max_entries=256, ttl_seconds=3600):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+
+    def _pop_oldest(self):
+        # Caller holds the lock
+        _, (_, _, size) = self._entries.popitem(last=False)
+        self._bytes -= size
+        self.evictions += 1
+
+    def get(self, prompt):
+        """Return the cached result for a prompt, or None on a miss"""
+        key = normalize_prompt(prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, result, size = entry
+                if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                    # Expired entries count as misses and are dropped right away
+                    del self._entries[key]
+                    self._bytes -= size
+                    self.evictions += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+            self.misses += 1
+            return None
+
+    def put(self, prompt, result):
+        """Store a result, evicting the least recently used entries when full"""
+        if not result:
+            return
+        key = normalize_prompt(prompt)
+        size = approx_size(key) + approx_size(result)
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (time.monotonic(), result, size)
+            self._bytes += size
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._pop_oldest()
+
+    def shrink(self, keep_fraction):
+        """Evict least recently used entries until only keep_fraction of them remain"""
+        with self._lock:
+            keep = int(len(self._entries) * keep_fraction)
+            while len(self._entries) > keep:
+                self._pop_oldest()
+
+    def approx_bytes(self):
+        """Approximate memory held by the cached prompts and results"""
+        with self._lock:
+            return self._bytes
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Snapshot of size and hit/miss counters for display"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "approx_bytes": self._bytes,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def build_result_cache():
+    """Create a result cache sized from TONEPILOT_CACHE_SIZE / TONEPILOT_CACHE_TTL"""
+    max_entries = int(os.getenv("TONEPILOT_CACHE_SIZE", "256"))
+    ttl_seconds = int(os.getenv("TONEPILOT_CACHE_TTL", "3600"))
+    return ResultCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
@@ -0,0 +1,198 @@
+"""
+Persistent on-disk store for TonePilot results.
+
+Results survive process restarts and "Clear Cache & Restart". Keys hash the normalized
+prompt together with the engine mode and tonepilot version, so upgrading either one never
+serves stale results. Backed by SQLite in WAL mode, with one connection per thread.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from result_cache import normalize_prompt
+
+DEFAULT_STORE_PATH = os.path.join(".tonepilot_cache", "results.sqlite3")
+# Recency/hit updates from reads are buffered and written in one transaction per batch
+ACCESS_FLUSH_COUNT = 64
+ACCESS_FLUSH_SECONDS = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+CREATE INDEX IF NOT EXISTS results_popular ON results (namespace, hits);
+"""
+
+
+def tonepilot_version():
+    """Installed tonepilot version, or 'unknown'"""
+    try:
+        from importlib.metadata import version
+        return version("tonepilot")
+    except Exception:
+        return "unknown"
+
+
+def engine_namespace():
+    """Engine mode + tonepilot version + generator model, used to scope stored keys"""
+    engine = os.getenv("TONEPILOT_ENGINE", "tonepilot")
+    generator = os.getenv("TONEPILOT_GENERATOR", "gemini")
+    model = os.getenv("GEMINI_MODEL", "")
+    return f"{engine}:{tonepilot_version()}:{generator}:{model}"
+
+
+class ResultStore:
+    """SQLite-backed result store with least-recently-used eviction"""
+
+    def __init__(self, path, max_entries=10000, namespace=""):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.namespace = namespace
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._puts_since_evict = 0
+        # key -> [last accessed, hits] not yet written
+        self._pending_access = {}
+        self._last_flush = time.monotonic()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self):
+        # sqlite3 connections must not be shared across threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def key(self, prompt):
+        """Hash of the namespace and normalized prompt"""
+        raw = f"{self.namespace}\0{normalize_prompt(prompt)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, prompt):
+        """Stored result for a prompt, or None"""
+        key = self.key(prompt)
+        row = self._connection().execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        # Reads stay read-only; the access is recorded with the next batch of updates
+        with self._write_lock:
+            pending = self._pending_access.setdefault(key, [0.0, 0])
+            pending[0] = time.time()
+            pending[1] += 1
+            due = (len(self._pending_access) >= ACCESS_FLUSH_COUNT
+                   or time.monotonic() - self._last_flush >= ACCESS_FLUSH_SECONDS)
+        if due:
+            self.flush_access()
+        return json.loads(row[0])
+
+    def flush_access(self):
+        """Write buffered access times and hit counts in a single transaction"""
+        with self._write_lock:
+            pending, self._pending_access = self._pending_access, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        connection = self._connection()
+        connection.execute("BEGIN")
+        try:
+            connection.executemany(
+                "UPDATE results SET accessed = MAX(accessed, ?), hits = hits + ? WHERE key = ?",
+                [(accessed, hits, key) for key, (accessed, hits) in pending.items()],
+            )
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            connection.execute("ROLLBACK")
+            raise
+
+    def put(self, prompt, result):
+        """Store a result, evicting the least recently used rows beyond max_entries"""
+        if not result:
+            return
+        now = time.time()
+        connection = self._connection()
+        connection.execute(
+            "INSERT INTO results (key, namespace, prompt, result, created, accessed, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0) "
+            "ON CONFLICT(key) DO UPDATE SET result = excluded.result, accessed = excluded.accessed",
+            (self.key(prompt), self.namespace, prompt, json.dumps(result, ensure_ascii=False), now, now),
+        )
+        with self._write_lock:
+            self._puts_since_evict += 1
+            # Evict in batches rather than counting rows on every write
+            if self._puts_since_evict < max(1, self.max_entries // 100):
+                return
+            self._puts_since_evict = 0
+        self.evict()
+
+    def evict(self):
+        """Trim the store to max_entries, dropping the least recently accessed rows"""
+        self.flush_access()
+        self._connection().execute(
+            "DELETE FROM results WHERE key IN ("
+            "SELECT key FROM results ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def most_popular(self, limit):
+        """(prompt, result) pairs with the most hits in this namespace, for warming caches"""
+        self.flush_access()
+        rows = self._connection().execute(
+            "SELECT prompt, result FROM results WHERE namespace = ? "
+            "ORDER BY hits DESC, accessed DESC LIMIT ?",
+            (self.namespace, limit),
+        ).fetchall()
+        return [(prompt, json.loads(result)) for prompt, result in rows]
+
+    def clear(self):
+        """Delete every stored result"""
+        with self._write_lock:
+            self._pending_access.clear()
+        self._connection().execute("DELETE FROM results")
+
+    def stats(self):
+        """Row count and on-disk size for display; rows from older engine versions age out via LRU"""
+        connection = self._connection()
+        entries = connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "size_bytes": page_count * page_size,
+            "namespace": self.namespace,
+        }
+
+
+def build_result_store():
+    """Create the store from TONEPILOT_STORE_PATH / TONEPILOT_STORE_SIZE, or None if 'off'"""
+    path = os.getenv("TONEPILOT_STORE_PATH", DEFAULT_STORE_PATH)
+    if path.lower() in ("", "off", "none"):
+        return None
+    max_entries = int(os.getenv("TONEPILOT_STORE_SIZE", "10000"))
+    try:
+        return ResultStore(path, max_entries=max_entries, namespace=engine_namespace())
+    except (OSError, sqlite3.Error):
+        # Read-only filesystem: run with the in-memory cache only
+        return None
+
+
+def warm_count():
+    """How many popular stored results to preload at startup (TONEPILOT_STORE_WARM)"""
+    return int(os.getenv("TONEPILOT_STORE_WARM", "0"))
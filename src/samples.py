@@ -0,0 +1,150 @@
+"""
+Sample prompts for the Random Sample button and their precomputed results.
+
+Run `python src/samples.py` at build time to push every sample prompt through the full
+pipeline and write src/data/sample_results.json. The app loads that artifact at startup,
+so Random Sample + Generate is an instant lookup while the tonepilot version and engine
+settings still match the ones it was built with.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from result_cache import normalize_prompt
+from result_store import engine_namespace, tonepilot_version
+
+DEFAULT_SAMPLE_RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sample_results.json")
+ARTIFACT_FORMAT = 1
+
+# Memory-optimized sample prompts (reduced size for cloud deployment)
+SAMPLE_PROMPTS = {
+    "Personal Growth": [
+        "I'm feeling overwhelmed with my workload and don't know how to prioritize my tasks.",
+        "I received constructive feedback at work and I'm unsure how to implement the changes.",
+        "How do I stop procrastinating and stay focused while working from home?",
+        "I'm trying to learn a new skill but I keep getting frustrated with my progress.",
+        "I am missing my friends and old school, I am feeling lonely"
+    ],
+    "Relationships": [
+        "I had a disagreement with my friend and I'm not sure how to approach them about it.",
+        "I just had a huge fight with my partner and I am feeling really sad and lonely",
+        "I want to have a difficult conversation with my family about boundaries.",
+        "What are some emotionally intelligent ways to handle passive-aggressive coworkers?",
+        "Can you help me come up with a unique birthday message for my best friend?"
+    ],
+    "Career & Goals": [
+        "I am scared of loosing my job because of AI",
+        "I just got a promotion at work and I'm excited but also nervous about the new responsibilities.",
+        "I'm considering a career change but I'm worried about the financial implications.",
+        "Suggest a few side hustle ideas for someone good at writing and tech."
+    ],
+    "Health & Lifestyle": [
+        "I'm struggling to find motivation to exercise regularly and stay healthy.",
+        "What are some high-protein vegetarian foods I can add to my diet?",
+        "Give me a 3-day meal plan for healthy weight loss with Indian vegetarian recipes.",
+        "Why do I get muscle soreness two days after a workout instead of the next day?"
+    ],
+    "Creative & Learning": [
+        "Explain the concept of transformers in AI in simple, beginner-friendly terms.",
+        "Can you generate some creative Instagram captions for travel photos?",
+        "I just moved to a new city and I'm feeling lonely and disconnected.",
+        "How do I become more creative, can you help me?"
+    ]
+}
+
+
+def all_sample_prompts():
+    """Every sample prompt, flattened in category order"""
+    return [prompt for prompts in SAMPLE_PROMPTS.values() for prompt in prompts]
+
+
+class SampleResults:
+    """Precomputed results for the sample prompts, with a staleness check"""
+
+    def __init__(self, results=None, tonepilot_version=None, engine=None, created=None, path=None):
+        self.results = {normalize_prompt(prompt): result for prompt, result in (results or {}).items()}
+        self.tonepilot_version = tonepilot_version
+        self.engine = engine
+        self.created = created
+        self.path = path
+
+    @property
+    def built(self):
+        return bool(self.results)
+
+    def is_stale(self):
+        """True when built with a different tonepilot version or engine settings than now running"""
+        return self.engine != engine_namespace()
+
+    def get(self, prompt):
+        """Precomputed result for a sample prompt, or None (also None when stale)"""
+        if not self.built or self.is_stale():
+            return None
+        return self.results.get(normalize_prompt(prompt))
+
+
+def load_sample_results(path=None):
+    """Load the artifact; an empty SampleResults when it was never built or is unreadable"""
+    path = path or os.getenv("TONEPILOT_SAMPLE_RESULTS", DEFAULT_SAMPLE_RESULTS_PATH)
+    try:
+        with open(path, encoding="utf-8") as f:
+            artifact = json.load(f)
+    except (OSError, ValueError):
+        return SampleResults(path=path)
+    if artifact.get("format") != ARTIFACT_FORMAT:
+        return SampleResults(path=path)
+    return SampleResults(
+        results=artifact.get("results"),
+        tonepilot_version=artifact.get("tonepilot_version"),
+        engine=artifact.get("engine"),
+        created=artifact.get("created"),
+        path=path,
+    )
+
+
+def build_sample_results(pipeline, prompts, respond=True):
+    """Run every prompt through the pipeline and return the artifact dict"""
+    results = {}
+    for prompt in prompts:
+        started = time.perf_counter()
+        results[prompt] = pipeline.run(prompt, respond=respond)
+        print(f"{time.perf_counter() - started:6.2f}s  {prompt}", file=sys.stderr)
+    return {
+        "format": ARTIFACT_FORMAT,
+        "tonepilot_version": tonepilot_version(),
+        "engine": engine_namespace(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "results": results,
+    }
+
+
+def main(argv=None):
+    from generation import build_generator
+    from pipeline import TonePilotPipeline, build_engine
+
+    parser = argparse.ArgumentParser(description="Precompute results for every sample prompt")
+    parser.add_argument("--output", default=DEFAULT_SAMPLE_RESULTS_PATH, help="Artifact path")
+    parser.add_argument("--prompt-only", action="store_true", help="Tags and prompts only, no AI response")
+    args = parser.parse_args(argv)
+
+    engine = build_engine()
+    generator = None if args.prompt_only else build_generator()
+    if not args.prompt_only and generator is None:
+        sys.exit("No API key found! Set GOOGLE_API_KEY or GEMINI_API_KEY, or pass --prompt-only")
+    pipeline = TonePilotPipeline(get_engine=lambda: engine, get_generator=lambda: generator)
+    artifact = build_sample_results(pipeline, all_sample_prompts(), respond=not args.prompt_only)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    temp_path = args.output + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False, indent=1)
+        f.write("\n")
+    os.replace(temp_path, args.output)
+    print(f"Wrote {len(artifact['results'])} results to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Semantic cache for near-duplicate prompts.
+
+Exact-match caches miss paraphrases and typos ("I'm scared of losing my job to AI" vs "I am
+scared of loosing my job because of AI"). This cache embeds every prompt with a small CPU
+encoder and keeps the L2-normalized vectors in one preallocated NumPy matrix, so a lookup is
+a single matrix-vector product. A cached prompt's tags and weights are reused when cosine
+similarity clears the threshold and both prompts agree on negation ("happy" vs "not happy").
+
+Encoders:
+- sentence-transformers model (e.g. all-MiniLM-L6-v2) when the package is installed
+- hashed word and character n-grams otherwise, which only catches typos and small rewordings
+"""
+
+import os
+import re
+import threading
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+from demo_index import _features
+from memory_guard import approx_size
+from result_cache import normalize_prompt
+
+DEFAULT_ENCODER = "sentence-transformers/all-MiniLM-L6-v2"
+LATENCY_WINDOW = 500
+
+_NEGATION_RE = re.compile(r"\b(?:not|no|never|nothing|nobody|none|cannot)\b|n't\b")
+
+
+def _negated(text):
+    return bool(_NEGATION_RE.search(text.casefold()))
+
+
+class HashedEncoder:
+    """Dependency-free embeddings from hashed word and character n-grams"""
+
+    name = "hashed n-grams"
+    # Only near-verbatim repeats (typos, punctuation, contractions) score this high
+    default_threshold = 0.75
+
+    def __init__(self, dimensions=1024):
+        self.dimensions = dimensions
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in _features(text):
+                vectors[row, zlib.crc32(feature.encode("utf-8")) % self.dimensions] += 1.0
+        # Sublinear counts so repeated words do not dominate
+        vectors = np.sqrt(vectors)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class SentenceEncoder:
+    """sentence-transformers model on CPU, loaded on first use"""
+
+    default_threshold = 0.85
+
+    def __init__(self, model_name=DEFAULT_ENCODER):
+        self.name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def encode(self, texts):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.name, device="cpu")
+        return self._model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+class SemanticCache:
+    """Nearest-neighbour cache over prompt embeddings with LRU replacement"""
+
+    def __init__(self, encoder, max_entries=1024, threshold=None):
+        self.encoder = encoder
+        self.max_entries = max(1, int(max_entries))
+        self.threshold = threshold if threshold is not None else encoder.default_threshold
+        self._lock = threading.Lock()
+        # Rows [0, count) are live; the matrix is allocated once the embedding size is known
+        self._matrix = None
+        self._keys = []
+        self._results = []
+        self._negated = []
+        self._last_used = []
+        self._sizes = []
+        self._rows = {}
+        self._bytes = 0
+        self._clock = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.hits = 0
+        self.misses = 0
+
+    def _tick(self):
+        # Caller holds the lock
+        self._clock += 1
+        return self._clock
+
+    def lookup(self, prompt):
+        """Return (similarity, cached_prompt, result) for the nearest match above threshold, or None"""
+        started = time.perf_counter()
+        vector = self.encoder.encode([prompt])[0]
+        negated = _negated(prompt)
+        with self._lock:
+            match = None
+            if self._keys:
+                scores = self._matrix[:len(self._keys)] @ vector
+                row = int(np.argmax(scores))
+                score = float(scores[row])
+                if score >= self.threshold and self._negated[row] == negated:
+                    self._last_used[row] = self._tick()
+                    match = (score, self._keys[row], self._results[row])
+            if match is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._latencies.append(time.perf_counter() - started)
+        return match
+
+    def get(self, prompt):
+        """Cached result for the nearest similar prompt, or None"""
+        match = self.lookup(prompt)
+        return match[2] if match is not None else None
+
+    def put(self, prompt, result):
+        """Store a result under a prompt, replacing the least recently used row when full"""
+        if not result:
+            return
+        key = normalize_prompt(prompt)
+        vector = self.encoder.encode([prompt])[0]
+        size = approx_size(key) + approx_size(result) + vector.nbytes
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            row = self._rows.get(key)
+            if row is None and len(self._keys) < self.max_entries:
+                row = len(self._keys)
+                for column in (self._keys, self._results, self._negated, self._last_used, self._sizes):
+                    column.append(None)
+                self._sizes[row] = 0
+            elif row is None:
+                row = int(np.argmin(self._last_used))
+                del self._rows[self._keys[row]]
+            self._bytes += size - self._sizes[row]
+            self._rows[key] = row
+            self._matrix[row] = vector
+            self._keys[row] = key
+            self._results[row] = result
+            self._negated[row] = _negated(prompt)
+            self._last_used[row] = self._tick()
+            self._sizes[row] = size
+
+    def shrink(self, keep_fraction):
+        """Keep only the most recently used keep_fraction of the entries"""
+        with self._lock:
+            keep = int(len(self._keys) * keep_fraction)
+            order = sorted(range(len(self._keys)), key=lambda row: self._last_used[row], reverse=True)[:keep]
+            if self._matrix is not None:
+                self._matrix[:len(order)] = self._matrix[order]
+            self._keys = [self._keys[row] for row in order]
+            self._results = [self._results[row] for row in order]
+            self._negated = [self._negated[row] for row in order]
+            self._last_used = [self._last_used[row] for row in order]
+            self._sizes = [self._sizes[row] for row in order]
+            self._rows = {key: row for row, key in enumerate(self._keys)}
+            self._bytes = sum(self._sizes)
+
+    def approx_bytes(self):
+        """Approximate memory held by the cached prompts, results and vectors"""
+        with self._lock:
+            return self._bytes
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        with self._lock:
+            self._keys, self._results, self._negated, self._last_used, self._sizes = [], [], [], [], []
+            self._rows = {}
+            self._bytes = 0
+            self._latencies.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Snapshot of size, hit rate and lookup latency for display"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            ordered = sorted(self._latencies)
+            return {
+                "encoder": self.encoder.name,
+                "entries": len(self._keys),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "lookup_p50_ms": ordered[len(ordered) // 2] * 1000 if ordered else 0.0,
+                "lookup_p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000 if ordered else 0.0,
+                "approx_bytes": self._bytes,
+            }
+
+
+def build_encoder(name=None):
+    """sentence-transformers encoder when installed, else hashed n-grams (TONEPILOT_SEMANTIC_ENCODER)"""
+    name = name or os.getenv("TONEPILOT_SEMANTIC_ENCODER", DEFAULT_ENCODER)
+    if name != "hashed":
+        try:
+            import sentence_transformers  # noqa: F401
+            return SentenceEncoder(name)
+        except ImportError:
+            pass
+    return HashedEncoder()
+
+
+def build_semantic_cache():
+    """Semantic cache when TONEPILOT_SEMANTIC_CACHE=1, else None"""
+    if os.getenv("TONEPILOT_SEMANTIC_CACHE", "0") != "1":
+        return None
+    return SemanticCache(
+        build_encoder(),
+        max_entries=int(os.getenv("TONEPILOT_SEMANTIC_CACHE_SIZE", "1024")),
+        threshold=float(os.environ["TONEPILOT_SEMANTIC_THRESHOLD"]) if os.getenv("TONEPILOT_SEMANTIC_THRESHOLD") else None,
+    )
@@ -0,0 +1,36 @@
+"""
+Bounded per-session history of generated results.
+
+Entries keep only what the results view renders (rounded emotion scores, active traits,
+the prompt instruction and the response), so a session stays at a few KB however long
+it runs, and earlier results can be shown again without recomputing them.
+"""
+
+import os
+
+from result_cache import normalize_prompt
+
+DEFAULT_HISTORY_SIZE = 5
+
+
+def compact_result(prompt, result):
+    """History entry for a result, dropping fields the results view never shows"""
+    return {
+        "prompt": prompt,
+        "input_tags": {tag: round(float(score), 3) for tag, score in (result.get("input_tags") or {}).items()},
+        "response_tags": {trait: True for trait, active in (result.get("response_tags") or {}).items() if active},
+        "final_prompt": result.get("final_prompt"),
+        "response_text": result.get("response_text") or "",
+    }
+
+
+def add_entry(history, prompt, result, limit=DEFAULT_HISTORY_SIZE):
+    """New history with this result first; an older entry for the same prompt is replaced"""
+    key = normalize_prompt(prompt)
+    entries = [entry for entry in history if normalize_prompt(entry["prompt"]) != key]
+    return [compact_result(prompt, result)] + entries[:max(0, limit - 1)]
+
+
+def history_size():
+    """How many results each session keeps (TONEPILOT_HISTORY_SIZE)"""
+    return max(1, int(os.getenv("TONEPILOT_HISTORY_SIZE", str(DEFAULT_HISTORY_SIZE))))
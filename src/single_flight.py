@@ -0,0 +1,88 @@
+"""
+Single-flight request coalescing.
+
+When several sessions submit the same prompt at the same moment, the first caller does the
+work and every concurrent duplicate waits on that caller's future instead of running the
+engine again. Keys are only held while the work is in flight; finished results live in the
+result caches.
+"""
+
+import threading
+from concurrent.futures import Future
+
+
+class FlightAborted(RuntimeError):
+    """Raised to waiting duplicates when the leading request stopped before finishing"""
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def begin(self, key):
+        """Return (future, is_leader); only the leader must call finish() or fail()"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def finish(self, key, future, result):
+        with self._lock:
+            self._calls.pop(key, None)
+        future.set_result(result)
+
+    def fail(self, key, future, error):
+        with self._lock:
+            self._calls.pop(key, None)
+        future.set_exception(error)
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn once for all concurrent callers with the same key and share its result"""
+        future, leader = self.begin(key)
+        if not leader:
+            try:
+                return future.result()
+            except FlightAborted:
+                # The leader was a stream whose viewer left; do the work directly
+                return fn(*args, **kwargs)
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.fail(key, future, e)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    def stream(self, key, future, chunks):
+        """Yield a leader's chunks, resolving the future with the joined text at the end"""
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+            self.finish(key, future, "".join(parts))
+        except Exception as e:
+            self.fail(key, future, e)
+            raise
+        finally:
+            # The viewer navigated away mid-stream: release the duplicates
+            if not future.done():
+                self.fail(key, future, FlightAborted("The original request stopped before its response finished"))
+
+    def stats(self):
+        """Leader and coalesced counts; coalesced is the number of generations saved"""
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
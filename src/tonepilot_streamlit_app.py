@@ -1,8 +1,27 @@
 import streamlit as st
-import time
 import random
 import os
 
+from api_server import serve_api_from_env
+from assets import build_stylesheet, ensure_static_assets, logo_html
+from engine_loader import EngineLoader, warmup_enabled
+from gemini_client import GeminiError
+from generation import build_generator
+from generation_router import GenerationRouter
+from load_shedder import build_load_shedder
+from memory_guard import MemoryBudgetExceeded, approx_size, build_memory_budget, model_size_bytes
+from metrics import build_metrics, instrument_engine
+from micro_batcher import build_batcher
+from model_server import ModelServerClient, ModelServerError, RemoteCache, RemoteEngine, model_server_path
+from pipeline import StageUnavailable, TonePilotPipeline, build_engine, run_local_batch
+from replay_engine import build_replay_engine, recording_enabled
+from result_cache import build_result_cache
+from result_store import build_result_store, warm_count
+from samples import all_sample_prompts, load_sample_results
+from semantic_cache import build_semantic_cache
+from session_history import add_entry, history_size
+from worker_pool import QueueFull, build_local_pool, build_remote_pool
+
 # Load environment variables from .env file
 try:
     from dotenv import load_dotenv
@@ -14,36 +33,14 @@ except ImportError:
 except Exception as e:
     st.warning(f"⚠️ Could not load .env file: {str(e)}")
 
-# Function to encode background image (cloud optimized)
-@st.cache_data(ttl=3600)  # Cache for 1 hour to prevent memory buildup
-def get_background_image():
-    """Load and encode background image as base64 (cloud optimized)"""
-    import base64
+# Build served image assets once per process (referenced by URL, never inlined)
+@st.cache_resource
+def get_static_assets():
+    """Get URLs of the background and logo served from app/static"""
     try:
-        # Cloud-optimized path detection
-        if RUNNING_ON_CLOUD:
-            possible_paths = ["src/background.png"]  # Simplified for cloud
-        else:
-            possible_paths = ["src/background.png", "background.png"]
-        
-        for path in possible_paths:
-            try:
-                if os.path.exists(path):
-                    file_size = os.path.getsize(path)
-                    # More conservative size limit for cloud
-                    max_size = 3 * 1024 * 1024 if RUNNING_ON_CLOUD else 5 * 1024 * 1024
-                    if file_size > max_size:
-                        return None
-                    
-                    with open(path, "rb") as img_file:
-                        encoded = base64.b64encode(img_file.read()).decode()
-                        return f"data:image/png;base64,{encoded}"
-            except (OSError, IOError):
-                # Skip files that can't be read (common on cloud)
-                continue
-        return None
+        return ensure_static_assets(os.path.dirname(os.path.abspath(__file__)))
     except Exception as e:
-        return None
+        return {"background": None, "logo": None}
 
 # Set Streamlit page configuration with modern options
 st.set_page_config(
@@ -65,493 +62,221 @@ if RUNNING_ON_CLOUD:
     # Reduce file watching on cloud to prevent inotify issues
     os.environ['STREAMLIT_SERVER_FILE_WATCHER_TYPE'] = 'none'
 
-# Get background image
-background_image = get_background_image()
-
-# Modern CSS styling with improved responsiveness and better colors
-st.markdown("""
-<style>
-/* Content container with optimized styling for performance */
-.main .block-container {
-    background: rgba(0, 0, 0, 0.7);
-    border-radius: 15px;
-    padding: 2rem;
-    margin-top: 1rem;
-    box-shadow: 0 4px 20px rgba(0, 0, 0, 0.3);
-    backdrop-filter: blur(8px);
-    border: 1px solid rgba(255, 255, 255, 0.2);
-    color: #ffffff;
-}
-
-/* Mobile-optimized styles with dark theme */
-@media (max-width: 768px) {
-    .main .block-container {
-        background: rgba(255, 255, 255, 0.95);
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin-top: 0.5rem;
-        box-shadow: 0 4px 20px rgba(255, 255, 255, 0.1);
-        border: 1px solid rgba(255, 255, 255, 0.2);
-    }
-    
-    .main-title {
-        font-size: 2rem !important;
-        margin-bottom: 0.25rem !important;
-    }
-    
-    .main-subtitle {
-        font-size: 1.5rem !important;
-        margin-top: -0.5rem !important;
-        margin-bottom: 0.25rem !important;
-    }
-    
-    .header-container {
-        margin-bottom: 0.25rem !important;
-    }
-    
-    .stButton > button {
-        height: 2.5rem !important;
-        min-height: 2.5rem !important;
-        font-size: 0.9rem !important;
-        padding: 0.4rem 0.8rem !important;
-        background: linear-gradient(135deg, #06b6d4, #0891b2) !important;
-        border: 1px solid #0284c7 !important;
-        color: white !important;
-    }
-    
-    .stTextArea > div > div > textarea {
-        border-radius: 8px !important;
-        font-size: 14px !important;
-    }
-}
-
-/* Ultra-sleek mobile styles for very small screens */
-@media (max-width: 480px) {
-    .main .block-container {
-        background: rgba(255, 255, 255, 0.98);
-        border-radius: 15px;
-        padding: 1.25rem;
-        margin-top: 0.5rem;
-        box-shadow: 0 6px 25px rgba(255, 255, 255, 0.15);
-        border: 1px solid rgba(255, 255, 255, 0.3);
-    }
-    
-    .main-title {
-        font-size: 1.75rem !important;
-    }
-    
-    .main-subtitle {
-        font-size: 1.75rem !important;
-        line-height: 1.3 !important;
-    }
-    
-    .stButton > button {
-        height: 2.25rem !important;
-        font-size: 0.85rem !important;
-        padding: 0.3rem 0.6rem !important;
-        background: linear-gradient(135deg, #06b6d4, #0891b2) !important;
-        border: 1px solid #0284c7 !important;
-        color: white !important;
-    }
-}
-.main-title {
-    text-align: center;
-    color: #ffffff !important;
-    font-size: 3rem;
-    font-weight: 700;
-    margin-bottom: 0.5rem;
-    background: linear-gradient(90deg, #2dd4bf, #06b6d4);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-    background-clip: text;
-}
-.main-subtitle {
-    text-align: center;
-    color: #ffffff !important;
-    font-size: 2.5rem;
-    margin-bottom: 0.5rem;
-    margin-top: -1rem;
-    font-weight: 600;
-    background: linear-gradient(135deg, #2563eb, #06b6d4);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-    background-clip: text;
-    line-height: 1.1;
-}
-.header-container {
-    display: flex;
-    flex-direction: column;
-    align-items: center;
-    justify-content: center;
-    text-align: center;
-    width: 100%;
-    margin-bottom: 0.25rem;
-    padding-bottom: 0rem;
-}
-.logo-wrapper {
-    display: flex;
-    justify-content: center;
-    align-items: center;
-    margin-bottom: 0rem;
-    margin-top: 0rem;
-    width: 100%;
-    text-align: center;
-}
-.logo-wrapper img {
-    display: block;
-    margin: 0 auto;
-    filter: brightness(1.1) contrast(1.1) saturate(0.9);
-    border-radius: 12px;
-    box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-}
-.centered-emoji {
-    font-size: 4rem;
-    margin-bottom: 0rem;
-    margin-top: 0rem;
-    text-align: center;
-    width: 100%;
-    display: block;
-    filter: drop-shadow(2px 2px 4px rgba(0,0,0,0.1));
-}
-.stButton > button {
-    border-radius: 12px;
-    font-weight: 600;
-    transition: all 0.3s ease;
-    height: 2.75rem;
-    min-height: 2.75rem;
-    padding: 0.5rem 1rem;
-    white-space: nowrap;
-    display: flex;
-    align-items: center;
-    justify-content: center;
-    background: linear-gradient(135deg, #e0f2fe, #b3e5fc);
-    border: 1px solid #0891b2;
-    color: #0c4a6e;
-    box-shadow: 0 2px 4px rgba(8, 145, 178, 0.2);
-}
-.stButton > button:hover {
-    background: linear-gradient(135deg, #b3e5fc, #81d4fa);
-    box-shadow: 0 4px 8px rgba(8, 145, 178, 0.3);
-    transform: translateY(-1px);
-    border-color: #0284c7;
-}
-.stTextArea > div > div > textarea {
-    border-radius: 12px;
-    font-size: 16px;
-}
-.result-section {
-    margin-top: 1rem;
-    padding: 1.5rem;
-    border-radius: 12px;
-    background: #fafafa;
-    border: 1px solid #e5e7eb;
-}
-.metric-card {
-    background: white;
-}
-
-/* AGGRESSIVE TEXT FORCING - OVERRIDE ALL STREAMLIT DEFAULTS */
-* {
-    color: #ffffff !important;
-}
-
-body, html, div, p, span, h1, h2, h3, h4, h5, h6, label {
-    color: #ffffff !important;
-}
-
-.stApp, .stApp *, .main *, .block-container * {
-    color: #ffffff !important;
-}
-
-.stMarkdown, .stMarkdown *, .stMarkdown h1, .stMarkdown h2, .stMarkdown h3, .stMarkdown h4, .stMarkdown h5, .stMarkdown h6 {
-    color: #ffffff !important;
-}
-
-.stMarkdown p, .stMarkdown span, .stMarkdown div, .stMarkdown li {
-    color: #ffffff !important;
-}
-
-/* Force all text elements */
-[data-testid="stMarkdownContainer"], [data-testid="stMarkdownContainer"] * {
-    color: #ffffff !important;
-}
-
-/* Input and form styling - keep readable */
-.stTextInput > div > div > input, .stTextArea > div > div > textarea {
-    color: #1f2937 !important;
-    background-color: rgba(255, 255, 255, 0.95) !important;
-}
-
-.stSelectbox label, .stTextInput label, .stTextArea label {
-    color: #ffffff !important;
-}
-
-/* Button text override - dark text for light button backgrounds */
-.stButton > button, .stButton > button * {
-    color: #1f2937 !important;
-}
-
-/* Links */
-a, .stMarkdown a {
-    color: #60a5fa !important;
-    text-decoration: underline;
-}
-
-/* Sidebar styling */
-.css-1d391kg, .css-1d391kg p, .css-1d391kg span {
-    color: #ffffff !important;
-}
-
-/* Code block styling for mobile - fix white background issue */
-@media (max-width: 768px) {
-    .stCodeBlock, .stCodeBlock > div {
-        background-color: rgba(0, 0, 0, 0.8) !important;
-        border: 1px solid rgba(255, 255, 255, 0.2) !important;
-    }
-    
-    .stCodeBlock code, .stCodeBlock pre {
-        color: #ffffff !important;
-        background-color: transparent !important;
-    }
-    
-    /* Also fix any text areas or code elements */
-    pre, code {
-        background-color: rgba(0, 0, 0, 0.8) !important;
-        color: #ffffff !important;
-        border: 1px solid rgba(255, 255, 255, 0.2) !important;
-    }
-}
-    padding: 1rem;
-    border-radius: 8px;
-    box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-    margin: 0.5rem 0;
-}
-/* Fix for expander behavior - auto close after selection */
-.streamlit-expanderHeader {
-    background-color: transparent !important;
-}
-/* Remove extra white space */
-.block-container {
-    padding-top: 0.25rem;
-    padding-bottom: 0.5rem;
-}
-/* Center the entire app content */
-.main .block-container {
-    max-width: 800px;
-    margin: 0 auto;
-}
-/* Force image centering */
-.stImage {
-    display: flex;
-    justify-content: center;
-    align-items: center;
-    width: 100%;
-}
-.stImage > div {
-    display: flex;
-    justify-content: center;
-    align-items: center;
-    width: 100%;
-}
-</style>
-""", unsafe_allow_html=True)
-
-# Add background image if available with mobile optimization
-if background_image:
-    st.markdown(f"""
-    <style>
-    /* Desktop background with WHITE text for dark background */
-    .stApp {{
-        background: url('{background_image}');
-        background-size: cover;
-        background-position: center;
-        background-repeat: no-repeat;
-        background-attachment: fixed;
-        min-height: 100vh;
-        color: #ffffff;
-    }}
-    
-    /* Desktop text styling - WHITE for dark background */
-    @media (min-width: 769px) {{
-        .stApp {{
-            color: #ffffff !important;
-        }}
-        .stMarkdown, .stMarkdown p, .stMarkdown h1, .stMarkdown h2, .stMarkdown h3 {{
-            color: #ffffff !important;
-        }}
-        .stSelectbox label, .stTextInput label, .stTextArea label {{
-            color: #ffffff !important;
-        }}
-    }}
-    
-    /* ONLY mobile gets black background */
-    @media (max-width: 768px) {{
-        .stApp {{
-            background: linear-gradient(135deg, #000000, #1a1a1a) !important;
-            background-attachment: scroll !important;
-            color: #ffffff !important;
-        }}
-    }}
-    
-    /* Deep black for very small screens */
-    @media (max-width: 480px) {{
-        .stApp {{
-            background: #000000 !important;
-            color: #ffffff !important;
-        }}
-    }}
-    
-    </style>
-    
-    <script>
-    if (window.innerWidth <= 768) {{
-        document.body.classList.add('mobile-device');
-        // Disable animations on mobile for better performance
-        document.documentElement.style.setProperty('--animation-duration', '0s');
-        
-        // Send mobile detection to Streamlit
-        window.parent.postMessage({{
-            type: 'streamlit:setComponentValue',
-            value: {{mobile_detected: true}}
-        }}, '*');
-    }}
-    </script>
-    """, unsafe_allow_html=True)
-else:
-    # Fallback styling when no background image is available
-    st.markdown("""
-    <style>
-    /* Desktop fallback - dark theme to match */
-    .stApp {
-        background: linear-gradient(135deg, #1e293b, #0f172a);
-        min-height: 100vh;
-        color: #ffffff;
-    }
-    
-    /* Desktop text styling for fallback */
-    @media (min-width: 769px) {
-        .stApp {
-            color: #ffffff !important;
-        }
-        .stMarkdown, .stMarkdown p, .stMarkdown h1, .stMarkdown h2, .stMarkdown h3 {
-            color: #ffffff !important;
-        }
-        .stSelectbox label, .stTextInput label, .stTextArea label {
-            color: #ffffff !important;
-        }
-    }
-    
-    /* ONLY mobile gets black theme */
-    @media (max-width: 768px) {
-        .stApp {
-            background: linear-gradient(135deg, #000000, #1a1a1a) !important;
-            color: #ffffff !important;
-        }
-    }
-    
-    @media (max-width: 480px) {
-        .stApp {
-            background: #000000 !important;
-            color: #ffffff !important;
-        }
-    }
-    </style>
-    """, unsafe_allow_html=True)
+# Per-stage latency histograms shared by every session
+@st.cache_resource
+def get_metrics():
+    """Get the process-wide stage latency metrics (and start its exporters)"""
+    return build_metrics()
+
+# Several app processes can share one engine and cache through a model server (see model_server.py)
+@st.cache_resource
+def get_model_server():
+    """Get the client for the shared model server (None when this process loads its own engine)"""
+    path = model_server_path()
+    return ModelServerClient(path) if path else None
+
+# Shared engine loader - every caller joins the same in-flight load
+@st.cache_resource
+def get_engine_loader():
+    """Get the process-wide TonePilot engine loader"""
+    model_server = get_model_server()
+    if model_server is not None:
+        return EngineLoader(lambda: RemoteEngine(model_server))
+    return EngineLoader(lambda: instrument_engine(build_engine(), get_metrics()))
+
+# Opt-in warm-up: build the engine in the background as soon as the server serves its first page
+if warmup_enabled():
+    get_engine_loader().start()
+
+# Get background and logo URLs
+static_assets = get_static_assets()
+background_image = static_assets.get("background")
+
+# Modern CSS styling lives in theme.css - minified once per process and inlined on each rerun
+@st.cache_resource
+def get_stylesheet(background_urls):
+    """Get the minified theme stylesheet (with background rules)"""
+    css_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "theme.css")
+    return build_stylesheet(css_path, background_urls)
+
+# Rendered on every full rerun (Streamlit drops elements a rerun skips). Inlined because
+# app/static serves .css as text/plain with nosniff, so a <link> to it would not apply.
+st.markdown(f"<style>{get_stylesheet(background_image)}</style>", unsafe_allow_html=True)
 
 # Initialize session state 
-if 'user_input' not in st.session_state:
-    st.session_state.user_input = ""
+if 'input_text' not in st.session_state:
+    st.session_state.input_text = ""
 if 'last_result' not in st.session_state:
     st.session_state.last_result = None
+if 'history' not in st.session_state:
+    st.session_state.history = []
 
 # App header with perfectly aligned logo and title
 st.markdown('<div class="header-container">', unsafe_allow_html=True)
 
-try:
-    possible_paths = [
-        "src/logo.png",
-        "./src/logo.png", 
-        "logo.png",
-        os.path.join("src", "logo.png"),
-        os.path.join(os.path.dirname(__file__), "logo.png")
-    ]
-    
-    logo_loaded = False
-    for path in possible_paths:
-        if os.path.exists(path):
-            st.markdown('<div class="logo-wrapper">', unsafe_allow_html=True)
-            # Use columns to center the image
-            col1, col2, col3 = st.columns([1, 1, 1])
-            with col2:
-                st.image(path, width=200, use_container_width=False)
-            st.markdown('</div>', unsafe_allow_html=True)
-            logo_loaded = True
-            break
-    
-    if not logo_loaded:
-        st.markdown('<div class="centered-emoji">🧠🤖</div>', unsafe_allow_html=True)
-        
-except Exception as e:
+logo_urls = static_assets.get("logo")
+if logo_urls:
+    st.markdown(f'<div class="logo-wrapper">{logo_html(logo_urls)}</div>', unsafe_allow_html=True)
+else:
     st.markdown('<div class="centered-emoji">🧠🤖</div>', unsafe_allow_html=True)
 
 # Title and subtitle in the same container for perfect alignment
 st.markdown('<p class="main-subtitle">Open-Source AI library for Emotionally Aware Human-like Responses</p>', unsafe_allow_html=True)
 st.markdown('</div>', unsafe_allow_html=True)
 
-# Initialize TonePilot engine with simple, effective caching
-@st.cache_resource
+# Initialize TonePilot engine through the shared loader (waits on a warm-up in progress)
 def get_tonepilot_engine():
-    """Get cached TonePilot engine - only loads once per session"""
-    try:
-        from tonepilot.core.tonepilot import TonePilotEngine
-        # Simple initialization without complex memory management that breaks caching
-        engine = TonePilotEngine(mode='gemini', respond=True)
-        return engine
-    except Exception as e:
-        # Return None if initialization fails - let calling code handle errors
+    """Get the TonePilot engine (local stages only), or None if it failed to load"""
+    # Response generation runs as a separate remote stage, see get_generator()
+    return get_engine_loader().get()
+
+@st.cache_resource
+def get_generator():
+    """Get the cached response generator, routed across every configured backend (None if there are none)"""
+    return build_generator()
+
+# Process-wide caches shared by every session
+@st.cache_resource
+def get_result_cache():
+    """Get the shared full-result cache (LRU + TTL)"""
+    if get_model_server() is not None:
+        return RemoteCache(get_model_server(), "result")
+    return build_result_cache()
+
+@st.cache_resource
+def get_prompt_cache():
+    """Get the shared local-stage cache for tags and prompts (LRU + TTL)"""
+    if get_model_server() is not None:
+        return RemoteCache(get_model_server(), "prompt")
+    return build_result_cache()
+
+@st.cache_resource
+def get_semantic_cache():
+    """Get the shared near-duplicate prompt cache (None unless TONEPILOT_SEMANTIC_CACHE=1)"""
+    if get_model_server() is not None:
+        # The model server consults its own semantic cache behind its prompt cache
         return None
+    return build_semantic_cache()
 
-def initialize_tonepilot():
-    """Initialize TonePilot with proper error handling but simple caching"""
-    # Check for API key first
-    api_key = os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY')
-    if not api_key:
-        return None, "No API key found! Please set GOOGLE_API_KEY or GEMINI_API_KEY in your environment variables"
-    
-    # Get cached engine
-    engine = get_tonepilot_engine()
-    
-    if engine is None:
-        return None, "TonePilot library not available. Install with: pip install tonepilot"
-    
-    return engine, "TonePilot engine initialized successfully!"
+@st.cache_resource
+def get_memory_budget():
+    """Get the process memory budget, which sheds the shared caches first when exceeded"""
+    caches = [get_result_cache(), get_prompt_cache()]
+    if get_semantic_cache() is not None:
+        caches.append(get_semantic_cache())
+    return build_memory_budget(caches=caches)
+
+@st.cache_resource
+def get_model_size():
+    """Bytes of model weights held by the loaded engine (call only once it is ready)"""
+    return model_size_bytes(get_engine_loader().get())
+
+@st.cache_resource
+def get_result_store():
+    """Get the on-disk result store that survives restarts (None when disabled)"""
+    if get_model_server() is not None:
+        # The model server owns the store, so frontends never write it twice
+        return None
+    return build_result_store()
+
+# Bounded worker pools so concurrent sessions queue instead of contending on the engine
+@st.cache_resource
+def get_local_pool():
+    """Get the shared worker pool for the local tagging stages"""
+    return build_local_pool()
+
+@st.cache_resource
+def get_remote_pool():
+    """Get the shared worker pool for remote response generation"""
+    return build_remote_pool()
+
+@st.cache_resource
+def get_batcher():
+    """Get the shared micro-batcher for the tagging stage (None when batching is off)"""
+    return build_batcher(lambda texts: run_local_batch(get_tonepilot_engine(), texts), pool=get_local_pool())
+
+# Mobile sample responses (recorded in src/data/demo_responses.jsonl, no model needed)
+@st.cache_resource
+def get_replay_engine():
+    """Get the offline replay engine that serves demo mode results"""
+    return build_replay_engine()
+
+@st.cache_resource
+def get_sample_results():
+    """Get the precomputed sample prompt results shipped with the app (see samples.py)"""
+    return load_sample_results()
+
+@st.cache_resource
+def get_load_shedder():
+    """Get the shared controller that degrades full-mode requests under load"""
+    return build_load_shedder(local_pool=get_local_pool(), remote_pool=get_remote_pool())
+
+@st.cache_resource
+def get_pipeline():
+    """Get the shared two-stage TonePilot pipeline"""
+    pipeline = TonePilotPipeline(
+        get_engine=get_tonepilot_engine,
+        get_generator=get_generator,
+        prompt_cache=get_prompt_cache(),
+        result_cache=get_result_cache(),
+        local_pool=get_local_pool(),
+        remote_pool=get_remote_pool(),
+        batcher=get_batcher(),
+        recorder=get_replay_engine() if recording_enabled() else None,
+        store=get_result_store(),
+        metrics=get_metrics(),
+        semantic_cache=get_semantic_cache(),
+    )
+    # Popular prompts from earlier runs are served from memory straight away
+    pipeline.warm_from_store(warm_count())
+    # Opt-in HTTP/JSON API on the same engine and caches (see api_server.py)
+    serve_api_from_env(pipeline)
+    return pipeline
 
 # Add cache clearing and memory management in sidebar
-with st.sidebar:
-    st.markdown("---")
-    st.markdown("### 🛠️ App Controls")
-    
-    # Mobile mode toggle
-    mobile_mode = st.toggle("📱 Mobile Mode (Demo Only)", 
-                           value=st.session_state.get('mobile_mode', False),
-                           help="Enable to use pre-written responses instead of loading the full model")
-    st.session_state.mobile_mode = mobile_mode
-    
-    if mobile_mode:
-        st.info("🚀 **Mobile Mode Active:** Using sample responses for faster performance!")
+@st.fragment
+def render_sidebar():
+    """Sidebar controls and cache info - interacting here reruns only the sidebar"""
+    # Prompt-only toggle skips the remote generation stage entirely
+    prompt_only = st.toggle("🧾 Prompt Only (No AI Response)",
+                            value=st.session_state.get('prompt_only', False),
+                            help="Only run emotion tagging and prompt building locally - no network call")
+    st.session_state.prompt_only = prompt_only
+    
+    # Streaming writes the AI response token-by-token as it is generated
+    stream_response = st.toggle("⚡ Stream AI Response",
+                                value=st.session_state.get('stream_response', True),
+                                help="Show the response as it is generated instead of waiting for all of it")
+    st.session_state.stream_response = stream_response
     
     if st.button("🗑️ Clear Cache & Restart"):
-        get_tonepilot_engine.clear()
-        get_background_image.clear()
+        get_engine_loader.clear()
+        get_static_assets.clear()
+        get_stylesheet.clear()
         st.cache_data.clear()
         st.cache_resource.clear()
         # Clear session state to free memory
         for key in list(st.session_state.keys()):
-            if key not in ['user_input', 'mobile_mode']:  # Keep user input and mobile mode
+            if key not in ['input_text', 'mobile_mode']:  # Keep user input and mobile mode
                 del st.session_state[key]
         st.success("Cache cleared! Please refresh the page.")
         st.rerun()
     
+    # Clicking reruns this fragment - Generate no longer refreshes the stats below
+    st.button("🔄 Refresh Stats")
+    
+    if st.button("🧹 Clear Result Cache"):
+        try:
+            get_result_cache().clear()
+            get_prompt_cache().clear()
+        except ModelServerError as e:
+            st.warning(f"🔌 {e}")
+        if get_semantic_cache() is not None:
+            get_semantic_cache().clear()
+        # Otherwise the next lookup would refill the memory cache from disk
+        if get_result_store() is not None:
+            get_result_store().clear()
+        st.success("Result cache cleared!")
 
         
     # Cache status and memory info
@@ -564,14 +289,124 @@ with st.sidebar:
     else:
         st.markdown("🖥️ Mode: Full AI Model")
     
+    model_server = get_model_server()
+    server_reachable = True
+    if model_server is not None:
+        try:
+            server_status = model_server.ping()
+            st.markdown(f"🔌 Engine and caches: shared model server at `{model_server.path}`")
+        except ModelServerError:
+            server_reachable = False
+            st.warning(f"🔌 Model server at `{model_server.path}` is unreachable - cache stats are unavailable and "
+                       "new prompts get demo responses until it is back.")
     if RUNNING_ON_CLOUD:
         st.markdown("☁️ Environment: Streamlit Cloud")
         st.markdown("🔧 File watching: Disabled")
     else:
         st.markdown("💻 Environment: Local")
         
-    st.markdown("🖼️ Background: Auto-cached (1hr)")
-    st.markdown("🧠 AI Model: Cached when used")
+    st.markdown("🖼️ Images: Served from app/static (cached by URL)")
+    engine_loader = get_engine_loader()
+    engine_status = engine_loader.status()
+    if model_server is not None:
+        # The frontend's RemoteEngine is ready at once; what matters is the server's own engine
+        engine_status = server_status.get("engine", "ready") if server_reachable else "unreachable"
+    if engine_status == "warming":
+        st.markdown("🧠 AI Model: ⏳ Warming up...")
+    elif engine_status == "ready" and model_server is not None:
+        try:
+            weights = f"{get_model_size() / 1024 ** 2:.0f} MB weights"
+        except ModelServerError:
+            weights = "size unavailable"
+        st.markdown(f"🧠 AI Model: ✅ Ready on the model server ({weights})")
+    elif engine_status == "ready":
+        st.markdown(f"🧠 AI Model: ✅ Ready (loaded in {engine_loader.duration_seconds:.1f}s, {get_model_size() / 1024 ** 2:.0f} MB weights)")
+    elif engine_status == "unreachable":
+        st.markdown("🧠 AI Model: 🔌 Model server unreachable")
+    elif engine_status == "failed":
+        st.markdown("🧠 AI Model: ❌ Failed to load")
+    else:
+        st.markdown("🧠 AI Model: Loads on first use")
+    
+    memory_stats = get_memory_budget().stats()
+    if memory_stats["budget_bytes"]:
+        st.markdown(f"🧮 Memory: {memory_stats['rss_bytes'] / 1024 ** 2:.0f}/{memory_stats['budget_bytes'] / 1024 ** 2:.0f} MB ({memory_stats['usage']:.0%} of budget)")
+        st.progress(min(1.0, memory_stats["usage"]))
+    else:
+        st.markdown(f"🧮 Memory: {memory_stats['rss_bytes'] / 1024 ** 2:.0f} MB (no budget set)")
+    st.markdown(f"🗃️ Caches: {memory_stats['cache_bytes'] / 1024:.0f} KB · This session: {approx_size(dict(st.session_state)) / 1024:.0f} KB")
+    shed_stats = get_load_shedder().stats()
+    tier_labels = {"full": "🟢 Full AI", "tags_only": "🟡 Tags only", "canned": "🟠 Demo responses"}
+    st.markdown(f"🚦 Load tier: {tier_labels[shed_stats['tier']]} · {shed_stats['in_flight']} in flight")
+    if memory_stats["sheds"] or memory_stats["rejections"]:
+        st.markdown(f"♻️ Caches shed {memory_stats['sheds']}× · {memory_stats['rejections']} requests paused")
+    
+    try:
+        cache_stats = get_result_cache().stats()
+        prompt_stats = get_prompt_cache().stats()
+    except ModelServerError:
+        # Remote caches: the rest of the sidebar still renders while the server is down
+        cache_stats = prompt_stats = None
+        st.markdown("📦 Caches: 🔌 unavailable while the model server is unreachable")
+    if cache_stats is not None:
+        st.markdown(f"📦 Results: {cache_stats['entries']}/{cache_stats['max_entries']} cached")
+        st.markdown(f"🎯 Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} ({cache_stats['hit_rate']:.0%} hit rate)")
+    result_store = get_result_store()
+    if result_store is not None:
+        store_stats = result_store.stats()
+        st.markdown(f"🗄️ Disk store: {store_stats['entries']}/{store_stats['max_entries']} results ({store_stats['size_bytes'] / 1024:.0f} KB)")
+    if prompt_stats is not None:
+        st.markdown(f"🧾 Prompts: {prompt_stats['entries']}/{prompt_stats['max_entries']} cached ({prompt_stats['hit_rate']:.0%} hit rate)")
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is not None:
+        semantic_stats = semantic_cache.stats()
+        st.markdown(f"🧲 Similar prompts: {semantic_stats['entries']}/{semantic_stats['max_entries']} · "
+                    f"{semantic_stats['hit_rate']:.0%} hit rate · p95 lookup {semantic_stats['lookup_p95_ms']:.1f} ms")
+    flight_stats = get_pipeline().single_flight.stats()
+    st.markdown(f"🔗 Duplicate requests merged: {flight_stats['coalesced']} runs saved")
+    for pool_stats in (get_local_pool().stats(), get_remote_pool().stats()):
+        st.markdown(f"⚙️ {pool_stats['name'].title()} workers: {pool_stats['running']}/{pool_stats['workers']} busy · {pool_stats['queued']} queued")
+    generator = get_generator()
+    if isinstance(generator, GenerationRouter):
+        for backend in generator.stats():
+            state = "🟢" if backend["available"] else "🔴"
+            latency = f"{backend['latency_ms']:.0f} ms" if backend["latency_ms"] is not None else "not measured"
+            role = " (fallback)" if backend["fallback"] else ""
+            st.markdown(f"{state} {backend['name']}{role}: {latency} · {backend['error_rate']:.0%} errors · {backend['calls']} calls")
+        clients = generator.clients()
+    else:
+        client = getattr(generator, "client", None)
+        clients = [client] if client is not None else []
+    for client in clients:
+        client_stats = client.stats()
+        st.markdown(f"🌐 {client.name} calls: {client_stats['calls']} · {client_stats['retries']} retries · "
+                    f"{client_stats['hedged']} hedged · {client_stats['connections_reused']} reused connections")
+    batcher = get_batcher()
+    if batcher is not None:
+        batch_stats = batcher.stats()
+        st.markdown(f"📊 Batches: {batch_stats['batches']} · avg size {batch_stats['avg_batch_size']:.1f}")
+        with st.expander("Batch histograms"):
+            st.markdown("**Batch size**")
+            st.json(batch_stats["batch_size_histogram"])
+            st.markdown("**Wait time (ms, upper bound)**")
+            st.json(batch_stats["wait_ms_histogram"])
+    
+    # Admin: where the seconds of a Generate actually go
+    with st.expander("🛡️ Admin: Stage Latency"):
+        metrics = get_metrics()
+        stage_summary = metrics.summary()
+        if stage_summary:
+            st.dataframe(
+                [{"stage": stage, "count": s["count"], "p50 ms": round(s["p50_ms"], 1),
+                  "p95 ms": round(s["p95_ms"], 1), "p99 ms": round(s["p99_ms"], 1)}
+                 for stage, s in stage_summary.items()],
+                hide_index=True,
+                use_container_width=True,
+            )
+            st.download_button("⬇️ Prometheus metrics", metrics.prometheus_text(),
+                               file_name="tonepilot_metrics.prom", mime="text/plain")
+        else:
+            st.caption("No requests timed yet - press Generate to collect stage timings.")
     
     st.markdown("**Performance Tips:**")
     if RUNNING_ON_CLOUD:
@@ -590,27 +425,20 @@ with st.sidebar:
     st.markdown("- Sample responses for demo")
     st.markdown("- Optimized buttons for dark theme")
 
-# Mobile sample responses (pre-written to avoid loading model)
-MOBILE_SAMPLE_RESPONSES = {
-    "I'm feeling overwhelmed with my workload and don't know how to prioritize my tasks.": {
-        "input_tags": {"overwhelmed": 0.85, "stressed": 0.72, "anxious": 0.68},
-        "response_tags": {"empathetic_listener": True, "nurturing_teacher": True, "supportive": True},
-        "final_prompt": "Respond with deep empathy and understanding. Acknowledge their feelings of being overwhelmed and provide gentle, practical guidance for prioritization. Use a warm, supportive tone that makes them feel heard and validated.",
-        "response_text": "I can really hear how overwhelmed you're feeling right now, and that's completely understandable. When everything feels urgent, it's natural to feel paralyzed about where to start.\n\nLet's take this step by step together. First, take a deep breath - you've got this. Try writing down all your tasks, then ask yourself: 'What absolutely must be done today?' Focus on just 2-3 priority items.\n\nRemember, you don't have to tackle everything at once. Sometimes the most productive thing you can do is give yourself permission to do less, but do it well. You're handling more than you realize, and it's okay to take things one task at a time."
-    },
-    "I just got a promotion at work and I'm excited but also nervous about the new responsibilities.": {
-        "input_tags": {"excited": 0.78, "nervous": 0.65, "anticipatory": 0.71},
-        "response_tags": {"confident_mentor": True, "encouraging": True, "celebratory": True},
-        "final_prompt": "Respond with enthusiasm for their promotion while acknowledging their nervousness. Provide confident, encouraging guidance that builds their self-belief. Use an uplifting, mentoring tone.",
-        "response_text": "Congratulations! This is such exciting news, and you should be incredibly proud of this achievement. The fact that you were chosen for this promotion says everything about your capabilities and potential.\n\nThose nervous butterflies? They're completely normal and actually a good sign - they show you care and want to succeed. Every great leader has felt exactly what you're feeling right now.\n\nYou already have the skills that got you here, and now you'll develop even more. Trust in the process, be patient with yourself as you learn, and remember - your organization believes in you, and so do I. You're going to do amazing things in this new role!"
-    },
-    "I had a disagreement with my friend and I'm not sure how to approach them about it.": {
-        "input_tags": {"conflicted": 0.73, "uncertain": 0.68, "concerned": 0.65},
-        "response_tags": {"diplomatic_advisor": True, "thoughtful": True, "relationship_focused": True},
-        "final_prompt": "Provide thoughtful, diplomatic advice for resolving the friendship conflict. Focus on understanding, communication, and preserving the relationship. Use a caring but wise tone.",
-        "response_text": "Friendship disagreements can feel really heavy on the heart, and it's clear you value this relationship deeply. The fact that you're thinking carefully about how to approach this shows what a caring friend you are.\n\nWhen you're ready, consider reaching out with something simple like, 'I've been thinking about our conversation, and I really value our friendship. Could we talk?' Sometimes the hardest part is just taking that first step.\n\nApproach the conversation with curiosity rather than being right. Listen to understand their perspective, share yours openly, and remember that good friends can disagree and still care deeply for each other. This might even strengthen your bond in the long run."
-    }
-}
+with st.sidebar:
+    st.markdown("---")
+    st.markdown("### 🛠️ App Controls")
+    
+    # Mobile mode changes the whole page, so it stays outside the sidebar fragment
+    mobile_mode = st.toggle("📱 Mobile Mode (Demo Only)", 
+                           value=st.session_state.get('mobile_mode', False),
+                           help="Enable to use pre-written responses instead of loading the full model")
+    st.session_state.mobile_mode = mobile_mode
+    
+    if mobile_mode:
+        st.info("🚀 **Mobile Mode Active:** Using sample responses for faster performance!")
+    
+    render_sidebar()
 
 # Function to detect mobile device
 def is_mobile_device():
@@ -623,184 +451,269 @@ def is_mobile_device():
     except:
         return False
 
-# Memory-optimized sample prompts (reduced size for cloud deployment)
-SAMPLE_PROMPTS = {
-    "Personal Growth": [
-        "I'm feeling overwhelmed with my workload and don't know how to prioritize my tasks.",
-        "I received constructive feedback at work and I'm unsure how to implement the changes.",
-        "How do I stop procrastinating and stay focused while working from home?",
-        "I'm trying to learn a new skill but I keep getting frustrated with my progress."
-        "I am missing my friends and old school, I am feeling lonely"
-    ],
-    "Relationships": [
-        "I had a disagreement with my friend and I'm not sure how to approach them about it.",
-        "I just had a huge fight with my partner and I am feeling really sad and lonely",
-        "I want to have a difficult conversation with my family about boundaries.",
-        "What are some emotionally intelligent ways to handle passive-aggressive coworkers?",
-        "Can you help me come up with a unique birthday message for my best friend?"
-    ],
-    "Career & Goals": [
-        "I am scared of loosing my job because of AI",
-        "I just got a promotion at work and I'm excited but also nervous about the new responsibilities.",
-        "I'm considering a career change but I'm worried about the financial implications.",
-        "Suggest a few side hustle ideas for someone good at writing and tech."
-    ],
-    "Health & Lifestyle": [
-        "I'm struggling to find motivation to exercise regularly and stay healthy.",
-        "What are some high-protein vegetarian foods I can add to my diet?",
-        "Give me a 3-day meal plan for healthy weight loss with Indian vegetarian recipes.",
-        "Why do I get muscle soreness two days after a workout instead of the next day?"
-    ],
-    "Creative & Learning": [
-        "Explain the concept of transformers in AI in simple, beginner-friendly terms.",
-        "Can you generate some creative Instagram captions for travel photos?",
-        "I just moved to a new city and I'm feeling lonely and disconnected.",
-        "How do I become more creative, can you help me?"
-    ]
-}
-
 # Mobile mode indicator
 mobile_mode = st.session_state.get('mobile_mode', False)
 if mobile_mode:
     st.success("📱 **Mobile Demo Mode Active** - Using optimized sample responses for better performance! Toggle off in sidebar to use full AI model.")
 
-# User input section with better layout
-st.markdown('<div style="margin-top: 0.5rem;"><h3 style="margin-bottom: 0.25rem;">💭 Enter Your Prompt</h3></div>', unsafe_allow_html=True)
-user_input = st.text_area(
-    "What's on your mind?", 
-    height=120, 
-    value=st.session_state.user_input, 
-    key="input_text",
-    placeholder="Type your thoughts, questions, or scenarios here..."
-)
-
-
-
-# Action buttons with improved spacing
-col1, col2, col3 = st.columns([1, 2, 1])
-
-with col2:
-    subcol1, subcol2 = st.columns(2)
-    
-    with subcol1:
-        if st.button("🎲 Random Sample", type="secondary", use_container_width=True):
-            # Include mobile sample prompts if mobile mode is enabled
-            mobile_mode = st.session_state.get('mobile_mode', False)
-            if mobile_mode:
-                mobile_prompts = list(MOBILE_SAMPLE_RESPONSES.keys())
-                all_prompts = [prompt for prompts in SAMPLE_PROMPTS.values() for prompt in prompts] + mobile_prompts
-            else:
-                all_prompts = [prompt for prompts in SAMPLE_PROMPTS.values() for prompt in prompts]
-            
-            random_prompt = random.choice(all_prompts)
-            st.session_state.user_input = random_prompt
-            st.rerun()
-    
-    with subcol2:
-        generate_button = st.button("🚀 Generate", type="secondary", use_container_width=True)
+# Random Sample runs as a button callback, before the text area is drawn again
+def pick_random_sample():
+    """Put a random sample prompt into the text area"""
+    all_prompts = all_sample_prompts()
+    # Include the curated mobile prompts (never recorded user prompts) if mobile mode is enabled
+    if st.session_state.get('mobile_mode', False):
+        all_prompts = all_prompts + get_replay_engine().prompts()
+    st.session_state.input_text = random.choice(all_prompts)
+
+# User input section - typing and Random Sample rerun only this fragment
+@st.fragment
+def render_prompt_input():
+    """Prompt text area and the Random Sample button"""
+    st.markdown('<div style="margin-top: 0.5rem;"><h3 style="margin-bottom: 0.25rem;">💭 Enter Your Prompt</h3></div>', unsafe_allow_html=True)
+    st.text_area(
+        "What's on your mind?", 
+        height=120, 
+        key="input_text",
+        placeholder="Type your thoughts, questions, or scenarios here..."
+    )
+    
+    # Action buttons with improved spacing
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        st.button("🎲 Random Sample", type="secondary", use_container_width=True, on_click=pick_random_sample)
+
+render_prompt_input()
+
+# Result rendering shared by demo mode and both pipeline stages
+def render_local_results(result):
+    """Render detected emotions, personality traits and the generated prompt"""
+    with get_metrics().span("render"):
+        st.markdown("---")
+        
+        # Emotion Analysis
+        st.markdown("### 🏷️ Detected Emotions")
+        emotion_tags = result.get("input_tags") or {}
+        
+        if emotion_tags:
+            # Display emotions in a grid
+            emotion_cols = st.columns(min(3, len(emotion_tags)))
+            for i, (emotion, score) in enumerate(emotion_tags.items()):
+                with emotion_cols[i % 3]:
+                    st.metric(
+                        label=emotion.replace('_', ' ').title(),
+                        value=f"{score:.1%}",
+                        delta=None
+                    )
+                    st.progress(float(score))
+
+        # Personality Traits
+        st.markdown("### 🎭 Response Personality")
+        personality_tags = result.get("response_tags") or {}
+        active_traits = [trait for trait, active in personality_tags.items() if active]
+        
+        if active_traits:
+            trait_cols = st.columns(min(4, len(active_traits)))
+            for i, trait in enumerate(active_traits):
+                with trait_cols[i % 4]:
+                    st.success(f"✨ {trait.replace('_', ' ').title()}")
+
+        # Generated Prompt
+        st.markdown("### 🧾 Generated Prompt Instruction")
+        if result.get("final_prompt"):
+            st.code(result.get("final_prompt"), language="text")
+
+def render_response(response_text):
+    """Render the AI response section"""
+    with get_metrics().span("render"):
+        st.markdown("### 💬 AI Response")
+        if response_text:
+            st.markdown(response_text)
+
+def show_stage_error(error):
+    """Explain why a pipeline stage could not run and suggest alternatives"""
+    message = str(error)
+    st.error(f"❌ {message}")
+    if "API key" in message:
+        st.info("💡 For Streamlit Cloud: Go to your app settings → Secrets → Add your API key")
+        st.info("💡 Turn on **Prompt Only** in the sidebar to get tags and prompts without an API key.")
+    st.info("💡 **Try Mobile Mode** in the sidebar for a demo without requiring API keys!")
+
+def queue_position_notice(placeholder):
+    """Callback for the worker pools that shows this session's queue position"""
+    def on_wait(position):
+        if position:
+            placeholder.info(f"⏳ Waiting for a free worker... position {position} in queue")
+        else:
+            placeholder.empty()
+    return on_wait
+
+def show_processing_error(error):
+    """Show an engine failure, pointing to Mobile Mode for memory problems"""
+    if isinstance(error, QueueFull):
+        st.warning(f"⏳ {error}")
+        return
+    if isinstance(error, (MemoryBudgetExceeded, MemoryError)):
+        st.error(f"❌ {str(error) or 'Memory limit exceeded.'} Try Mobile Mode in the sidebar for instant demo responses.")
+        return
+    if isinstance(error, GeminiError):
+        if error.retryable:
+            st.warning(f"⏳ The AI response service is busy or unreachable right now ({error}). Please try again in a moment.")
+        else:
+            st.error(f"❌ AI response failed: {error}")
+        st.info("💡 Turn on **Prompt Only** in the sidebar to get tags and prompts without calling Gemini.")
+        return
+    if isinstance(error, ModelServerError):
+        st.error(f"❌ {error}. Try Mobile Mode in the sidebar for instant demo responses.")
+        return
+    st.error(f"❌ Processing Error: {error}")
 
 # Processing and results
-if generate_button:
+def run_generate(user_input):
+    """Run the prompt through demo mode or the pipeline and render the results"""
+    st.session_state.last_result = None
     if user_input.strip():
         # Check if mobile mode is enabled
         mobile_mode = st.session_state.get('mobile_mode', False)
-        
+    
         if mobile_mode:
-            # Use pre-written sample responses for mobile
-            with st.spinner("🤖 TonePilot is analyzing your input..."):
-                time.sleep(1)  # Small delay for realistic feel
-                
-                # Check if input matches any sample responses
-                result = None
-                for sample_input, sample_result in MOBILE_SAMPLE_RESPONSES.items():
-                    if user_input.lower() in sample_input.lower() or sample_input.lower() in user_input.lower():
-                        result = sample_result
-                        break
-                
-                # If no match, create a generic response
-                if not result:
-                    result = {
-                        "input_tags": {"curious": 0.65, "thoughtful": 0.58, "engaged": 0.72},
-                        "response_tags": {"supportive": True, "informative": True, "encouraging": True},
-                        "final_prompt": "Respond with warmth and understanding. Provide thoughtful, encouraging guidance that shows empathy and offers practical support.",
-                        "response_text": "Thank you for sharing that with me. I can sense the thoughtfulness behind your words, and I appreciate you opening up about this.\n\nWhile everyone's situation is unique, what often helps is taking a step back and approaching things with both compassion for yourself and curiosity about what might work best for you. Sometimes the answers we're looking for are already within us - we just need the right space and support to discover them.\n\nRemember, it's okay to take things one step at a time. You don't have to have all the answers right now. What matters is that you're being thoughtful about your situation and seeking understanding."
-                    }
-                
-                st.session_state.last_result = result
-                
-        else:
-            # Initialize TonePilot for full mode
-            engine, message = initialize_tonepilot()
+            # Replay recorded results for mobile - instant unless TONEPILOT_REPLAY_DELAY is set
+            result = get_replay_engine().run(user_input)
+            st.session_state.last_result = result
+        
+            render_local_results(result)
+            render_response(result.get("response_text"))
             
-            if not engine:
-                st.error(f"❌ {message}")
-                if "API key" in message:
-                    st.info("💡 For Streamlit Cloud: Go to your app settings → Secrets → Add your API key")
-                st.info("💡 **Try Mobile Mode** in the sidebar for a demo without requiring API keys!")
+        else:
+            pipeline = get_pipeline()
+            prompt_only = st.session_state.get('prompt_only', False)
+        
+            # Sample prompts were precomputed at build time, other repeats come from the result cache
+            result = get_sample_results().get(user_input)
+            served_from = "⚡ Precomputed sample result"
+            if result and not (prompt_only or result.get("response_text")):
                 result = None
+            server_down = False
+            if result is None and not prompt_only:
+                try:
+                    result = pipeline.cached_result(user_input)
+                except ModelServerError:
+                    # Engine and caches are unreachable, so only the demo responses are left
+                    server_down = True
+                served_from = "⚡ Served from result cache"
+        
+            if result:
+                st.session_state.last_result = result
+                st.caption(served_from)
+                render_local_results(result)
+                if not prompt_only:
+                    render_response(result.get("response_text"))
             else:
-                # Process with progress indication
-                with st.spinner("🤖 TonePilot is analyzing your input..."):
-                    try:
-                        result = engine.run(user_input)
-                        st.session_state.last_result = result
-                        
-                    except MemoryError as e:
-                        st.error("❌ Memory limit exceeded. Try Mobile Mode in the sidebar for better performance.")
-                        result = None
-                    except Exception as e:
-                        error_msg = str(e)
-                        if "memory" in error_msg.lower() or "oom" in error_msg.lower():
-                            st.error("❌ Memory issue detected. Try Mobile Mode in the sidebar for better performance.")
-                        else:
-                            st.error(f"❌ Processing Error: {error_msg}")
-                        result = None
+                # Under heavy load new requests are degraded instead of queueing for the full engine
+                shedder = get_load_shedder()
+                tier = "canned" if server_down else shedder.choose()
+                if tier == "canned":
+                    result = get_replay_engine().run(user_input)
+                    st.session_state.last_result = result
+                    if server_down:
+                        st.warning("🔌 The TonePilot model server is unreachable - showing a demo response instead of running the AI model.")
+                    else:
+                        st.warning("🚦 TonePilot is very busy right now - showing a demo response instead of running the AI model.")
+                    render_local_results(result)
+                    render_response(result.get("response_text"))
+                else:
+                    skip_remote = prompt_only or tier == "tags_only"
+                    if tier == "tags_only" and not prompt_only:
+                        st.info("🚦 AI responses are slow right now - showing emotions and the prompt only. Try again shortly for a full response.")
+                    # Local stage: tags and prompt are ready in milliseconds, show them right away
+                    local = None
+                    queue_notice = st.empty()
+                    if get_engine_loader().status() == "warming":
+                        queue_notice.info("⏳ TonePilot engine is warming up - your request will run as soon as it is ready.")
+                    # Only the local stage counts as in flight; generation load shows up in its latency
+                    with shedder.track(), st.spinner("🤖 TonePilot is analyzing your input..."):
+                        try:
+                            # Sheds caches or refuses the request before the container runs out of memory
+                            get_memory_budget().admit()
+                            local = pipeline.run_local(user_input, on_wait=queue_position_notice(queue_notice))
+                            st.session_state.last_result = local
+                        except StageUnavailable as e:
+                            show_stage_error(e)
+                        except Exception as e:
+                            show_processing_error(e)
+                    queue_notice.empty()
             
-            # Display results with improved layout - no extra white space
-            if result:
-                st.markdown("---")
-                
-                # Emotion Analysis
-                st.markdown("### 🏷️ Detected Emotions")
-                emotion_tags = result.get("input_tags", {})
+                    if local:
+                        render_local_results(local)
                 
-                if emotion_tags:
-                    # Display emotions in a grid
-                    emotion_cols = st.columns(min(3, len(emotion_tags)))
-                    for i, (emotion, score) in enumerate(emotion_tags.items()):
-                        with emotion_cols[i % 3]:
-                            st.metric(
-                                label=emotion.replace('_', ' ').title(),
-                                value=f"{score:.1%}",
-                                delta=None
-                            )
-                            st.progress(float(score))
-
-                # Personality Traits
-                st.markdown("### 🎭 Response Personality")
-                personality_tags = result.get("response_tags", {})
-                active_traits = [trait for trait, active in personality_tags.items() if active]
-                
-                if active_traits:
-                    trait_cols = st.columns(min(4, len(active_traits)))
-                    for i, trait in enumerate(active_traits):
-                        with trait_cols[i % 4]:
-                            st.success(f"✨ {trait.replace('_', ' ').title()}")
-
-                # Generated Prompt
-                st.markdown("### 🧾 Generated Prompt Instruction")
-                if result.get("final_prompt"):
-                    st.code(result.get("final_prompt"), language="text")
-
-                # AI Response
-                st.markdown("### 💬 AI Response")
-                if result.get("response_text"):
-                    st.markdown(result.get("response_text"))
-            else:
-                st.error("❌ No result returned from TonePilot")
+                        # Remote stage: only now pay for the Gemini round trip
+                        if not skip_remote and st.session_state.get('stream_response', True):
+                            st.markdown("### 💬 AI Response")
+                            try:
+                                with shedder.measure():
+                                    stream = pipeline.stream_remote(user_input, local, on_wait=queue_position_notice(queue_notice))
+                                    st.write_stream(stream)
+                                result = stream.result
+                                st.session_state.last_result = result
+                                st.session_state.last_timings = {
+                                    "first_token_seconds": stream.first_token_seconds,
+                                    "total_seconds": stream.total_seconds,
+                                }
+                                if stream.first_token_seconds is not None:
+                                    st.caption(f"⏱️ First token: {stream.first_token_seconds:.2f}s · Total: {stream.total_seconds:.2f}s")
+                            except StageUnavailable as e:
+                                show_stage_error(e)
+                            except Exception as e:
+                                show_processing_error(e)
+                        elif not skip_remote:
+                            with st.spinner("💬 Generating AI response..."):
+                                try:
+                                    with shedder.measure():
+                                        result = pipeline.run_remote(user_input, local, on_wait=queue_position_notice(queue_notice))
+                                    st.session_state.last_result = result
+                                except StageUnavailable as e:
+                                    show_stage_error(e)
+                                except Exception as e:
+                                    show_processing_error(e)
+                            if result:
+                                render_response(result.get("response_text"))
     else:
         st.warning("⚠️ Please enter some text before generating.")
 
+# Generate and its results rerun on their own, without the header, input or sidebar
+@st.fragment
+def render_results():
+    """Generate button, then the new result or the one picked from this session's history"""
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        generate_button = st.button("🚀 Generate", type="secondary", use_container_width=True)
+    history = st.session_state.history
+    if generate_button:
+        user_input = st.session_state.input_text
+        run_generate(user_input)
+        if st.session_state.last_result:
+            history = add_entry(history, user_input, st.session_state.last_result, history_size())
+            st.session_state.history = history
+            st.session_state.history_index = 0
+    elif history:
+        # Any other rerun shows the selected result again from session state, nothing is recomputed
+        index = min(st.session_state.get("history_index", 0), len(history) - 1)
+        entry = history[index]
+        st.caption(f"🕘 Result for: {entry['prompt']}")
+        render_local_results(entry)
+        if entry["response_text"]:
+            render_response(entry["response_text"])
+    
+    if len(history) > 1:
+        st.selectbox(
+            "🕘 Recent results",
+            list(range(len(history))),
+            key="history_index",
+            format_func=lambda i: history[i]["prompt"] if len(history[i]["prompt"]) <= 60 else history[i]["prompt"][:57] + "...",
+            help="Show an earlier result from this session without generating it again",
+        )
+
+render_results()
+
 # Footer with modern styling
 st.markdown("---")
 footer_cols = st.columns([1, 1, 1])
@@ -825,4 +738,11 @@ with st.sidebar:
         import tonepilot
         st.markdown(f"**TonePilot**: {tonepilot.__version__}")
     except:
-        st.markdown("**TonePilot**: Not available") 
\ No newline at end of file
+        st.markdown("**TonePilot**: Not available") 
+    sample_results = get_sample_results()
+    if not sample_results.built:
+        st.markdown("**Sample results**: Not built (run `python src/samples.py`)")
+    elif sample_results.is_stale():
+        st.markdown(f"**Sample results**: ⚠️ Stale - built for TonePilot {sample_results.tonepilot_version}, rebuild with `python src/samples.py`")
+    else:
+        st.markdown(f"**Sample results**: ✅ {len(sample_results.results)} precomputed ({sample_results.created})")
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+Bounded worker pools for the TonePilot pipeline stages.
+Every session submits work here instead of running the engine on its own script thread,
+so concurrency is capped and callers can see where they are in the queue.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+_STREAM_DONE = object()
+
+
+class QueueFull(RuntimeError):
+    """Raised when a pool has no free worker or queue slot (backpressure)"""
+
+
+class Job:
+    """Handle for a submitted task with queue-position reporting"""
+
+    def __init__(self, pool, ticket, future):
+        self.pool = pool
+        self.ticket = ticket
+        self.future = future
+
+    def position(self):
+        """1-based position in the queue, or 0 once a worker has picked the job up"""
+        return self.pool.position(self.ticket)
+
+    def result(self, on_wait=None, poll_seconds=0.1):
+        """Wait for the result, calling on_wait(position) while still queued"""
+        while True:
+            try:
+                return self.future.result(timeout=poll_seconds if on_wait else None)
+            except FutureTimeout:
+                on_wait(self.position())
+
+
+class WorkerPool:
+    """Thread pool with a bounded queue, rejecting work once it is full"""
+
+    def __init__(self, name, max_workers, max_queue):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=f"tonepilot-{name}")
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._waiting = []
+        self._next_ticket = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) and return a Job, or raise QueueFull"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise QueueFull(f"TonePilot is busy ({self.name} queue full). Please try again in a moment.")
+        with self._lock:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._waiting.append(ticket)
+
+        def task():
+            with self._lock:
+                self._waiting.remove(ticket)
+                self.running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                self._slots.release()
+
+        return Job(self, ticket, self._executor.submit(task))
+
+    def run(self, fn, *args, on_wait=None, **kwargs):
+        """Submit and wait for the result in one call"""
+        return self.submit(fn, *args, **kwargs).result(on_wait=on_wait)
+
+    def stream(self, iter_fn, *args, on_wait=None, **kwargs):
+        """Run a chunk generator on a worker and yield its chunks on the caller's thread"""
+        chunks = queue.Queue()
+
+        def produce():
+            try:
+                for chunk in iter_fn(*args, **kwargs):
+                    chunks.put(chunk)
+            except BaseException as e:
+                chunks.put(e)
+            finally:
+                chunks.put(_STREAM_DONE)
+
+        job = self.submit(produce)
+        while True:
+            try:
+                item = chunks.get(timeout=0.1 if on_wait else None)
+            except queue.Empty:
+                on_wait(job.position())
+                continue
+            if item is _STREAM_DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def position(self, ticket):
+        """1-based queue position of a ticket, 0 if it is running or finished"""
+        with self._lock:
+            try:
+                return self._waiting.index(ticket) + 1
+            except ValueError:
+                return 0
+
+    def stats(self):
+        """Snapshot of pool load for display"""
+        with self._lock:
+            return {
+                "name": self.name,
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "queued": len(self._waiting),
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+def split_torch_threads(workers):
+    """Give each of `workers` concurrent engine calls an equal share of torch's CPU threads"""
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+
+
+def build_local_pool():
+    """Pool for the CPU-bound tagging stages, one worker by default
+
+    A single engine.run already uses every core through torch's intra-op threads, so more
+    workers only help when torch is given fewer threads each. engine.run is also not
+    guaranteed to be thread-safe: the Hugging Face pipelines inside TonePilotEngine share
+    one tokenizer and model, which concurrent calls can trip over. Raise
+    TONEPILOT_LOCAL_WORKERS only after checking your engine tolerates it; concurrent
+    sessions are better served by batching (TONEPILOT_BATCH_WAIT_MS).
+    """
+    workers = max(1, int(os.getenv("TONEPILOT_LOCAL_WORKERS", "1")))
+    if workers > 1:
+        split_torch_threads(workers)
+    return WorkerPool("local", workers, int(os.getenv("TONEPILOT_MAX_QUEUE", "64")))
+
+
+def build_remote_pool():
+    """Pool for the network-bound generation stage, many calls in flight at once"""
+    workers = int(os.getenv("TONEPILOT_REMOTE_WORKERS", "16"))
+    return WorkerPool("remote", workers, int(os.getenv("TONEPILOT_MAX_QUEUE", "64")))
@@ -0,0 +1,8 @@
+"""
+The app modules live in src/ and import each other as top-level modules, like `streamlit run`.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,63 @@
+import json
+
+import batch_cli
+from fake_engine import FakeTonePilotEngine
+from generation import FakeGenerator
+
+TEXTS = ["I lost my keys again", "My sister is getting married", "", "I passed my exam"]
+
+
+class FlakyGenerator(FakeGenerator):
+    """Fails for one prompt until healed"""
+
+    def __init__(self, failing_text):
+        super().__init__(delay_seconds=0)
+        self.failing_text = failing_text
+
+    def generate(self, final_prompt, user_input, response_length=None):
+        if user_input == self.failing_text:
+            raise TimeoutError("upstream timed out")
+        return super().generate(final_prompt, user_input, response_length)
+
+
+def run(tmp_path, monkeypatch, generator, *extra):
+    monkeypatch.setattr(batch_cli, "build_engine", FakeTonePilotEngine)
+    monkeypatch.setattr(batch_cli, "build_generator", lambda: generator)
+    source = tmp_path / "messages.jsonl"
+    source.write_text("".join(json.dumps({"text": text}) + "\n" for text in TEXTS), encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+    batch_cli.run_batch(batch_cli.parse_args([str(source), "-o", str(output), "--workers", "2", *extra]))
+    rows = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    checkpoint = json.loads((tmp_path / "results.jsonl.ckpt").read_text(encoding="utf-8"))
+    return rows, checkpoint
+
+
+def test_failed_records_are_checkpointed_and_retried_on_resume(tmp_path, monkeypatch):
+    generator = FlakyGenerator(TEXTS[1])
+    rows, checkpoint = run(tmp_path, monkeypatch, generator)
+    assert [row["text"] for row in rows] == TEXTS
+    assert rows[1]["error"] == "upstream timed out"
+    # Empty input can never succeed, so it is not queued for a retry
+    assert checkpoint["failed"] == [1]
+
+    generator.failing_text = None
+    rows, checkpoint = run(tmp_path, monkeypatch, generator, "--resume")
+
+    assert [row["text"] for row in rows] == TEXTS
+    assert "error" not in rows[1] and rows[1]["response_text"]
+    assert rows[2]["error"] == "empty text"
+    assert checkpoint == {"records_done": 4, "output_bytes": (tmp_path / "results.jsonl").stat().st_size, "failed": []}
+
+
+def test_resume_continues_after_the_checkpoint(tmp_path, monkeypatch):
+    generator = FlakyGenerator(None)
+    (tmp_path / "results.jsonl").write_text(json.dumps({"id": 0, "text": TEXTS[0]}) + "\n{partial", encoding="utf-8")
+    first_line = len(json.dumps({"id": 0, "text": TEXTS[0]})) + 1
+    (tmp_path / "results.jsonl.ckpt").write_text(json.dumps({"records_done": 1, "output_bytes": first_line}), encoding="utf-8")
+
+    rows, checkpoint = run(tmp_path, monkeypatch, generator, "--resume")
+
+    # The first row is kept as written, the partial line is dropped and the rest are processed
+    assert rows[0] == {"id": 0, "text": TEXTS[0]}
+    assert [row["text"] for row in rows] == TEXTS
+    assert checkpoint["records_done"] == 4 and checkpoint["failed"] == []
@@ -0,0 +1,41 @@
+import pytest
+
+from demo_index import DemoIndex
+from replay_engine import DEFAULT_REPLAY_PATH, ReplayEngine
+
+WORKLOAD = "I'm feeling overwhelmed with my workload and don't know how to prioritize my tasks."
+PROMOTION = "I just got a promotion at work and I'm excited but also nervous about the new responsibilities."
+FRIEND = "I had a disagreement with my friend and I'm not sure how to approach them about it."
+
+
+@pytest.fixture(scope="module")
+def index():
+    # The curated Mobile Mode prompts, with the default threshold
+    return DemoIndex({prompt: prompt for prompt in ReplayEngine(DEFAULT_REPLAY_PATH).prompts()})
+
+
+@pytest.mark.parametrize("paraphrase, canned", [
+    ("My workload is overwhelming and I can't prioritize my tasks", WORKLOAD),
+    ("I'm overwhelmed at work, too many tasks", WORKLOAD),
+    ("I got promoted at work and I'm nervous about new responsibilities", PROMOTION),
+    ("Got a promotion! Excited but nervous", PROMOTION),
+    ("I had an argument with my friend and need to approach them", FRIEND),
+])
+def test_paraphrase_matches_its_canned_prompt(index, paraphrase, canned):
+    assert index.best_match(paraphrase) == canned
+
+
+@pytest.mark.parametrize("unrelated", [
+    "I need help with my tax return and I don't know where to start",
+    "How do I file my taxes this year?",
+    "Can you recommend a good pizza place?",
+    "What's the weather like today?",
+    "Tell me a joke about cats",
+])
+def test_unrelated_prompt_gets_no_match(index, unrelated):
+    assert index.best_match(unrelated) is None
+
+
+def test_stopword_only_prompt_still_embeds():
+    index = DemoIndex({"how are you": "greeting", "file my taxes": "taxes"})
+    assert index.best_match("How are you?") == "greeting"
@@ -0,0 +1,55 @@
+import pytest
+
+from fake_gemini_server import start_fake_gemini
+from gemini_client import GeminiClient, GeminiError
+from generation import GeminiGenerator
+
+PROMPT = "Respond as a supportive voice.\nUser: I lost my keys\nAssistant:"
+
+
+@pytest.fixture
+def fake_gemini():
+    server = start_fake_gemini()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client(server, **kwargs):
+    # Retry-After from the fake server is capped by backoff_max, keeping retries instant
+    return GeminiClient(server.base_url, "fake", backoff_base=0.001, backoff_max=0.001, **kwargs)
+
+
+def test_generate_and_stream_reuse_pooled_connections(fake_gemini):
+    generator = GeminiGenerator("fake", client=client(fake_gemini))
+
+    text = generator.generate(PROMPT, "I lost my keys")
+    streamed = "".join(generator.stream(PROMPT, "I lost my keys"))
+
+    assert text == streamed == "Thank you for sharing that. (fake Gemini) Respond as a supportive voice."
+    stats = generator.client.stats()
+    assert stats["connections_opened"] == 1 and stats["connections_reused"] == 1
+
+
+def test_transient_errors_are_retried_then_reported(fake_gemini):
+    fake_gemini.fail_rate = 1.0
+    generator = GeminiGenerator("fake", client=client(fake_gemini, max_retries=2))
+
+    with pytest.raises(GeminiError) as error:
+        generator.generate(PROMPT, "I lost my keys")
+
+    assert error.value.status in (429, 503) and error.value.retryable
+    assert fake_gemini.requests == 3
+    stats = generator.client.stats()
+    assert (stats["calls"], stats["retries"], stats["failures"]) == (1, 2, 1)
+
+
+def test_unreachable_server_is_a_retryable_error(fake_gemini):
+    base_url = fake_gemini.base_url
+    fake_gemini.shutdown()
+    fake_gemini.server_close()
+    unreachable = GeminiClient(base_url, "fake", max_retries=0)
+
+    with pytest.raises(GeminiError) as error:
+        unreachable.post("/models/fake:generateContent", {})
+    assert error.value.retryable and error.value.status is None
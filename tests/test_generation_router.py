@@ -0,0 +1,82 @@
+import pytest
+
+from generation import FakeGenerator
+from generation_router import GenerationRouter
+
+
+class FailingGenerator:
+    """Raises on every call, optionally after streaming some text"""
+
+    def __init__(self, chunks_before_failure=0):
+        self.chunks_before_failure = chunks_before_failure
+        self.calls = 0
+
+    def generate(self, final_prompt, user_input, response_length=None):
+        self.calls += 1
+        raise ConnectionError("backend down")
+
+    def stream(self, final_prompt, user_input, response_length=None):
+        self.calls += 1
+        for _ in range(self.chunks_before_failure):
+            yield "partial "
+        raise ConnectionError("backend down")
+
+
+class NamedGenerator(FakeGenerator):
+    def __init__(self, name):
+        super().__init__(delay_seconds=0)
+        self.name = name
+        self.calls = 0
+
+    def generate(self, final_prompt, user_input, response_length=None):
+        self.calls += 1
+        return self.name
+
+
+def test_failed_backend_falls_through_to_the_next():
+    broken, healthy = FailingGenerator(), NamedGenerator("healthy")
+    router = GenerationRouter([("broken", broken, False), ("healthy", healthy, False)])
+
+    assert router.generate("prompt", "text") == "healthy"
+    stats = {backend["name"]: backend for backend in router.stats()}
+    assert stats["broken"]["failures"] == 1 and stats["healthy"]["calls"] == 1
+
+
+def test_fallback_backend_only_runs_once_every_other_backend_failed():
+    local = NamedGenerator("local")
+    router = GenerationRouter([("local", local, True), ("remote", NamedGenerator("remote"), False)])
+    assert router.generate("prompt", "text") == "remote"
+    assert local.calls == 0
+
+    router = GenerationRouter([("local", local, True), ("remote", FailingGenerator(), False)])
+    assert router.generate("prompt", "text") == "local"
+
+
+def test_backend_cools_down_after_repeated_failures():
+    broken, local = FailingGenerator(), NamedGenerator("local")
+    router = GenerationRouter([("broken", broken, False), ("local", local, True)],
+                              max_failures=2, cooldown_seconds=60)
+    for _ in range(5):
+        assert router.generate("prompt", "text") == "local"
+
+    # Tried before the fallback until the second failure opens its cool-down
+    assert broken.calls == 2
+    assert [backend["available"] for backend in router.stats()] == [False, True]
+
+
+def test_every_backend_failing_raises_the_last_error():
+    router = GenerationRouter([("a", FailingGenerator(), False), ("b", FailingGenerator(), False)])
+    with pytest.raises(ConnectionError):
+        router.generate("prompt", "text")
+
+
+def test_stream_only_falls_through_before_the_first_chunk():
+    router = GenerationRouter([("silent", FailingGenerator(), False), ("healthy", FakeGenerator(0), False)])
+    assert "".join(router.stream("prompt", "text")).startswith("Thank you")
+
+    router = GenerationRouter([("partial", FailingGenerator(chunks_before_failure=1), False),
+                               ("healthy", FakeGenerator(0), False)])
+    chunks = router.stream("prompt", "text")
+    assert next(chunks) == "partial "
+    with pytest.raises(ConnectionError):
+        list(chunks)
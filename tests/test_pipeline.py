@@ -0,0 +1,140 @@
+import threading
+import time
+
+from fake_engine import FakeTonePilotEngine
+from generation import FakeGenerator
+from pipeline import TonePilotPipeline
+from semantic_cache import HashedEncoder, SemanticCache
+
+ORIGINAL = "I am scared of loosing my job because of AI"
+PARAPHRASE = "I am scared of losing my job because of AI"
+
+
+def semantic_pipeline():
+    engine = FakeTonePilotEngine()
+    cache = SemanticCache(HashedEncoder(), threshold=0.5)
+    return engine, TonePilotPipeline(get_engine=lambda: engine, semantic_cache=cache)
+
+
+def test_semantic_hit_rebuilds_the_prompt_for_the_new_text():
+    engine, pipeline = semantic_pipeline()
+    original = pipeline.run_local(ORIGINAL)
+    engine.run = None  # a semantic hit must not run the engine again
+
+    local = pipeline.run_local(PARAPHRASE)
+
+    assert pipeline.semantic_cache.hits == 1
+    assert local["input_text"] == PARAPHRASE
+    assert f"User: {PARAPHRASE}\n" in local["final_prompt"]
+    assert ORIGINAL not in local["final_prompt"]
+    assert local["response_tags"] == original["response_tags"]
+    assert local["response_weights"] == original["response_weights"]
+
+
+def test_semantic_hit_in_a_batch_rebuilds_the_prompt_too():
+    _, pipeline = semantic_pipeline()
+    pipeline.run_local(ORIGINAL)
+
+    [local] = pipeline.run_local_many([PARAPHRASE])
+
+    assert local["input_text"] == PARAPHRASE
+    assert ORIGINAL not in local["final_prompt"]
+
+
+def test_semantic_neighbour_never_serves_a_full_result():
+    _, pipeline = semantic_pipeline()
+    pipeline.run_local(ORIGINAL)
+    pipeline.store_result(ORIGINAL, dict(FakeTonePilotEngine().run(ORIGINAL), response_text="For the original"))
+
+    assert pipeline.cached_result(PARAPHRASE) is None
+
+
+class CountingEngine(FakeTonePilotEngine):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def run(self, input_text):
+        self.calls += 1
+        return super().run(input_text)
+
+
+class BlockingGenerator(FakeGenerator):
+    """Holds every call until released, counting how many were made"""
+
+    def __init__(self):
+        super().__init__(delay_seconds=0)
+        self.calls = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def stream(self, final_prompt, user_input, response_length=None):
+        self.calls += 1
+        self.entered.set()
+        self.release.wait(5)
+        yield from super().stream(final_prompt, user_input, response_length)
+
+
+def test_prompt_cache_skips_the_engine_for_repeated_prompts():
+    engine = CountingEngine()
+    pipeline = TonePilotPipeline(get_engine=lambda: engine)
+
+    first = pipeline.run_local("I lost my keys")
+    again = pipeline.run_local("  i LOST my keys ")
+
+    assert again == first
+    assert engine.calls == 1
+    assert pipeline.prompt_cache.stats()["hits"] == 1
+
+
+def test_full_results_are_cached_and_prompt_only_runs_never_see_them():
+    generator = FakeGenerator(delay_seconds=0)
+    pipeline = TonePilotPipeline(get_engine=FakeTonePilotEngine, get_generator=lambda: generator)
+
+    result = pipeline.run("I lost my keys")
+    generator.generate = None  # a cached result must not generate again
+
+    assert pipeline.run("I lost my keys") == result
+    assert "response_text" not in pipeline.run("I lost my keys", respond=False)
+
+
+def test_concurrent_identical_prompts_share_one_generation():
+    generator = BlockingGenerator()
+    pipeline = TonePilotPipeline(get_engine=FakeTonePilotEngine, get_generator=lambda: generator)
+    local = pipeline.run_local("I lost my keys")
+    results = []
+
+    def run():
+        results.append(pipeline.run_remote("I lost my keys", local))
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    threads[0].start()
+    generator.entered.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while pipeline.single_flight.stats()["coalesced"] < 2:
+        time.sleep(0.001)
+    generator.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert generator.calls == 1
+    assert len(results) == 3 and all(result == results[0] for result in results)
+
+
+def test_streamed_response_is_cached_only_once_complete():
+    generator = FakeGenerator(delay_seconds=0)
+    pipeline = TonePilotPipeline(get_engine=FakeTonePilotEngine, get_generator=lambda: generator)
+    local = pipeline.run_local("I lost my keys")
+
+    chunks = iter(pipeline.stream_remote("I lost my keys", local))
+    next(chunks)
+    chunks.close()  # the viewer left mid-stream
+    assert pipeline.cached_result("I lost my keys") is None
+    assert pipeline.single_flight.stats()["in_flight"] == 0
+
+    stream = pipeline.stream_remote("I lost my keys", local)
+    text = "".join(stream)
+    assert text == generator.generate(local["final_prompt"], "I lost my keys")
+    assert pipeline.cached_result("I lost my keys") == dict(local, response_text=text)
+    assert stream.first_token_seconds is not None
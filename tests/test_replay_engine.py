@@ -0,0 +1,33 @@
+import json
+
+from replay_engine import ReplayEngine
+
+CURATED = {"prompt": "How do I ask my boss for a raise?", "result": {"response_text": "curated"}}
+USER_PROMPT = "My neighbour's dog barks all night and I can't sleep"
+
+
+def replay_engine(tmp_path):
+    path = tmp_path / "demo_responses.jsonl"
+    path.write_text(json.dumps(CURATED) + "\n", encoding="utf-8")
+    record_path = tmp_path / "cache" / "recorded_responses.jsonl"
+    return path, record_path, ReplayEngine(str(path), record_path=str(record_path))
+
+
+def test_recordings_go_to_the_record_file_not_the_curated_one(tmp_path):
+    path, record_path, engine = replay_engine(tmp_path)
+
+    engine.record(USER_PROMPT, {"response_text": "live"})
+
+    assert path.read_text(encoding="utf-8") == json.dumps(CURATED) + "\n"
+    assert USER_PROMPT in record_path.read_text(encoding="utf-8")
+    assert engine.run(USER_PROMPT)["response_text"] == "live"
+
+
+def test_random_sample_prompts_exclude_recordings(tmp_path):
+    path, record_path, engine = replay_engine(tmp_path)
+    engine.record(USER_PROMPT, {"response_text": "live"})
+
+    reloaded = ReplayEngine(str(path), record_path=str(record_path))
+
+    assert engine.prompts() == reloaded.prompts() == [CURATED["prompt"]]
+    assert reloaded.run(USER_PROMPT)["response_text"] == "live"
@@ -0,0 +1,42 @@
+import result_store
+from result_store import ResultStore
+
+
+def test_reads_buffer_access_updates_until_a_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, "ACCESS_FLUSH_SECONDS", 3600)
+    store = ResultStore(str(tmp_path / "results.sqlite3"), namespace="test")
+    store.put("popular prompt", {"response_text": "a"})
+    store.put("quiet prompt", {"response_text": "b"})
+    statements = []
+    store._connection().set_trace_callback(statements.append)
+
+    for _ in range(3):
+        assert store.get("Popular prompt ") == {"response_text": "a"}
+
+    assert not [sql for sql in statements if sql.startswith("UPDATE")]
+    # Reading the ranking flushes the buffered hits first
+    assert [prompt for prompt, _ in store.most_popular(2)] == ["popular prompt", "quiet prompt"]
+    hits = store._connection().execute("SELECT hits FROM results WHERE prompt = 'popular prompt'").fetchone()[0]
+    assert hits == 3
+
+
+def test_access_updates_flush_once_enough_keys_are_pending(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, "ACCESS_FLUSH_COUNT", 2)
+    monkeypatch.setattr(result_store, "ACCESS_FLUSH_SECONDS", 3600)
+    store = ResultStore(str(tmp_path / "results.sqlite3"))
+    for prompt in ("one", "two"):
+        store.put(prompt, {"response_text": prompt})
+        store.get(prompt)
+
+    assert store._pending_access == {}
+    assert store._connection().execute("SELECT SUM(hits) FROM results").fetchone()[0] == 2
+
+
+def test_clear_drops_pending_updates(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite3"))
+    store.put("prompt", {"response_text": "a"})
+    store.get("prompt")
+    store.clear()
+
+    store.flush_access()
+    assert store.get("prompt") is None
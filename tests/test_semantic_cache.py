@@ -0,0 +1,51 @@
+from semantic_cache import HashedEncoder, SemanticCache
+
+TAGS = {"response_tags": {"supportive": True}}
+
+
+def cache(**kwargs):
+    return SemanticCache(HashedEncoder(), **kwargs)
+
+
+def test_typo_matches_and_unrelated_prompt_misses():
+    semantic = cache()
+    semantic.put("I am scared of loosing my job because of AI", TAGS)
+
+    assert semantic.get("I am scared of losing my job because of AI") == TAGS
+    assert semantic.get("What should I cook for dinner tonight?") is None
+    assert (semantic.hits, semantic.misses) == (1, 1)
+
+
+def test_negation_must_agree():
+    semantic = cache(threshold=0.5)
+    semantic.put("I am happy with my new job", TAGS)
+
+    assert semantic.get("I am not happy with my new job") is None
+    assert semantic.get("I am happy with my new job!") == TAGS
+
+
+def test_full_cache_replaces_the_least_recently_used_row():
+    semantic = cache(max_entries=2)
+    semantic.put("my dog ran away this morning", {"n": 1})
+    semantic.put("my exam results came out today", {"n": 2})
+    semantic.get("my dog ran away this morning")
+
+    semantic.put("my landlord raised the rent again", {"n": 3})
+
+    assert semantic.get("my exam results came out today") is None
+    assert semantic.get("my dog ran away this morning") == {"n": 1}
+    assert semantic.stats()["entries"] == 2
+
+
+def test_shrink_keeps_the_most_recently_used_entries():
+    semantic = cache()
+    prompts = [f"prompt number {word} about my week" for word in ("one", "two", "three", "four")]
+    for n, prompt in enumerate(prompts):
+        semantic.put(prompt, {"n": n})
+    before = semantic.approx_bytes()
+
+    semantic.shrink(0.5)
+
+    assert semantic.stats()["entries"] == 2
+    assert semantic.approx_bytes() < before
+    assert semantic.get(prompts[3]) == {"n": 3}
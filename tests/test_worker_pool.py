@@ -0,0 +1,26 @@
+import threading
+
+import pytest
+
+from worker_pool import QueueFull, WorkerPool, build_local_pool
+
+
+def test_local_pool_defaults_to_one_worker(monkeypatch):
+    monkeypatch.delenv("TONEPILOT_LOCAL_WORKERS", raising=False)
+    assert build_local_pool().max_workers == 1
+
+
+def test_full_pool_rejects_work():
+    pool = WorkerPool("test", max_workers=1, max_queue=1)
+    started, release = threading.Event(), threading.Event()
+    running = pool.submit(lambda: started.set() or release.wait())
+    started.wait()
+    queued = pool.submit(lambda: "done")
+
+    with pytest.raises(QueueFull):
+        pool.submit(lambda: None)
+    assert queued.position() == 1
+
+    release.set()
+    assert running.result() and queued.result() == "done"
+    assert pool.stats()["rejected"] == 1